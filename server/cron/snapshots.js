@@ -1,10 +1,12 @@
 import cron from 'node-cron';
+import fs from 'fs';
+import path from 'path';
 import { shopifyService } from '../services/shopify.js';
 import { metaService } from '../services/meta.js';
 import { googleAdsService } from '../services/google.js';
 import { klaviyoService } from '../services/klaviyo.js';
 import { ga4Service } from '../services/ga4.js';
-import { saveSnapshot, logSync, getAllActiveShops } from '../db/database.js';
+import { saveSnapshot, logSync, getAllActiveShops, saveForecastAccuracy } from '../db/database.js';
 
 const services = {
   shopify: shopifyService,
@@ -139,6 +141,29 @@ async function syncSource(shopDomain, shopAccessToken, sourceName, service) {
   }
 }
 
+// Written by the ML service (prediction_log.export_forecast_accuracy), one JSON row per line
+const FORECAST_EXPORT_DIR = path.join(process.cwd(), 'data', 'forecast_exports');
+
+export function importForecastAccuracyExports(dir = FORECAST_EXPORT_DIR) {
+  if (!fs.existsSync(dir)) return 0;
+
+  let imported = 0;
+  for (const file of fs.readdirSync(dir).filter(name => name.endsWith('.ndjson')).sort()) {
+    const filePath = path.join(dir, file);
+    try {
+      const rows = fs.readFileSync(filePath, 'utf8')
+        .split('\n')
+        .filter(line => line.trim())
+        .map(line => JSON.parse(line));
+      imported += saveForecastAccuracy(rows);
+      fs.unlinkSync(filePath);
+    } catch (error) {
+      console.error(`[Cron] Failed to import forecast export ${file}:`, error.message);
+    }
+  }
+  return imported;
+}
+
 export function startCronJobs() {
   // Run daily at midnight
   cron.schedule('0 0 * * *', async () => {
@@ -204,6 +229,14 @@ export function startCronJobs() {
     }
   });
 
+  // Import forecast rows exported by the ML service
+  cron.schedule('*/5 * * * *', () => {
+    const imported = importForecastAccuracyExports();
+    if (imported > 0) {
+      console.log(`[Cron] Imported ${imported} forecast accuracy rows`);
+    }
+  });
+
   console.log('[Cron] Cron jobs started');
 }
 
@@ -835,6 +835,19 @@ export function getDataCoverage(shopDomain) {
   return coverage;
 }
 
+// --- Forecast accuracy (per-shop) ---
+export function saveForecastAccuracy(rows) {
+  const db = getDB();
+  rows.forEach(row => {
+    db.run(
+      `INSERT INTO forecast_accuracy (shop_domain, metric, forecast_date, horizon_days, predicted, method)
+       VALUES (?, ?, ?, ?, ?, ?)`,
+      [row.shop_domain, row.metric, row.forecast_date, row.horizon_days, row.predicted, row.method]
+    );
+  });
+  return rows.length;
+}
+
 // --- Sync log (per-shop) ---
 export function logSync(shopDomain, source, status, recordsSynced = 0, errorMessage = null) {
   const db = getDB();
@@ -0,0 +1,397 @@
+"""
+Slay Season Prediction Engine - Load Test
+Open-loop traffic against the ML API with per-endpoint throughput, latency percentiles and error rates
+
+Usage (from server/ml):
+    python -m benchmarks.load_test [--rate 50] [--duration 30] [--url http://localhost:8000]
+                                   [--mix creative-fatigue=4,customer-prediction=3,...]
+                                   [--history 30] [--batch-items 10] [--save report.json]
+                                   [--compare baseline.json]
+
+Without --url the FastAPI app is driven in-process through ASGI, so no
+server has to be running (background loops started at startup are skipped).
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+REPORT_SCHEMA = 1
+
+PLATFORMS = ('facebook', 'instagram', 'google', 'tiktok')
+CATEGORIES = ('fashion', 'electronics', 'home_garden', 'beauty', 'sports', 'general')
+BENCHMARK_CATEGORIES = ('conversion_rate', 'aov', 'customer_retention', 'roas', 'lifetime_value')
+
+DEFAULT_MIX = {
+    'creative-fatigue': 4,
+    'budget-optimization': 2,
+    'customer-prediction': 4,
+    'product-velocity': 3,
+    'cross-merchant-intelligence': 1,
+    'batch-predictions': 1
+}
+
+def _dates(history: int, end: datetime) -> List[str]:
+    return [(end - timedelta(days=history - 1 - d)).strftime('%Y-%m-%d') for d in range(history)]
+
+class PayloadFactory:
+    """Realistic request bodies per endpoint, sized by history length and batch items"""
+    
+    def __init__(self, history: int = 30, batch_items: int = 10, seed: int = 42):
+        self.history = history
+        self.batch_items = batch_items
+        self.rng = np.random.default_rng(seed)
+        self.today = datetime(2024, 6, 1)
+        self.builders: Dict[str, Callable[[], Dict[str, Any]]] = {
+            'creative-fatigue': self.creative_fatigue,
+            'budget-optimization': self.budget_optimization,
+            'customer-prediction': self.customer_prediction,
+            'product-velocity': self.product_velocity,
+            'cross-merchant-intelligence': self.cross_merchant,
+            'batch-predictions': self.batch_predictions
+        }
+    
+    def creative_fatigue(self) -> Dict[str, Any]:
+        rng = self.rng
+        n = self.history
+        base_ctr = rng.uniform(0.01, 0.04)
+        decay = rng.uniform(0.0, 0.03)
+        ctr = base_ctr * np.exp(-decay * np.arange(n)) * rng.normal(1, 0.05, n)
+        cpm = rng.uniform(5, 20) * (1 + decay * np.arange(n)) * rng.normal(1, 0.05, n)
+        impressions = rng.integers(1_000, 50_000, n)
+        
+        return {
+            'creative_id': f"creative_{rng.integers(1_000_000)}",
+            'platform': str(rng.choice(PLATFORMS)),
+            'current_metrics': {
+                'ctr': float(ctr[-1]), 'cpm': float(cpm[-1]),
+                'frequency': float(rng.uniform(1, 5)), 'audience_size': float(rng.integers(10_000, 2_000_000))
+            },
+            'historical_data': [
+                {
+                    'date': date, 'ctr': float(ctr[d]), 'cpm': float(cpm[d]),
+                    'impressions': int(impressions[d]), 'spend': float(impressions[d] * cpm[d] / 1000),
+                    'frequency': float(1 + d * 0.05), 'engagement_rate': float(ctr[d] * 1.5)
+                }
+                for d, date in enumerate(_dates(n, self.today))
+            ]
+        }
+    
+    def budget_optimization(self) -> Dict[str, Any]:
+        rng = self.rng
+        n = self.history
+        spend = rng.uniform(100, 5_000) * rng.normal(1, 0.1, n).clip(0.5)
+        roas = rng.uniform(1.0, 5.0) * rng.normal(1, 0.15, n).clip(0.3)
+        
+        return {
+            'current_spend': float(spend[-1] * 30),
+            'current_revenue': float(spend[-1] * roas[-1] * 30),
+            'historical_performance': [
+                {'date': date, 'spend': float(spend[d]), 'revenue': float(spend[d] * roas[d]),
+                 'platform': str(PLATFORMS[d % 3])}
+                for d, date in enumerate(_dates(n, self.today))
+            ]
+        }
+    
+    def _customer(self) -> Dict[str, Any]:
+        rng = self.rng
+        orders = max(1, int(rng.integers(1, self.history + 1)))
+        gaps = rng.gamma(2.0, 15.0, orders).astype(int) + 1
+        days_ago = np.cumsum(gaps[::-1])[::-1]
+        
+        return {
+            'customer_id': f"customer_{rng.integers(10_000_000)}",
+            'purchase_history': [
+                {'date': (self.today - timedelta(days=int(d))).strftime('%Y-%m-%d'),
+                 'amount': float(round(rng.gamma(2.0, 40.0), 2))}
+                for d in days_ago
+            ],
+            'behavior_data': {
+                'email_opens_30d': int(rng.integers(0, 15)),
+                'website_visits_30d': int(rng.integers(0, 30)),
+                'product_views_30d': int(rng.integers(0, 60)),
+                'cart_abandonment_rate': float(rng.uniform(0, 0.8))
+            }
+        }
+    
+    def customer_prediction(self) -> Dict[str, Any]:
+        return self._customer()
+    
+    def product_velocity(self) -> Dict[str, Any]:
+        rng = self.rng
+        n = self.history
+        units = rng.poisson(rng.uniform(1, 40) * (1 + rng.uniform(-0.02, 0.02) * np.arange(n)).clip(0.1))
+        
+        return {
+            'product_id': f"sku_{rng.integers(1_000_000)}",
+            'product_data': {
+                'category': str(rng.choice(CATEGORIES)),
+                'price': float(round(rng.uniform(5, 300), 2)),
+                'inventory': int(rng.integers(0, 5_000)),
+                'days_since_launch': int(rng.integers(7, 1_000)),
+                'units_sold_30d': int(units[-30:].sum()),
+                'sales_history': [
+                    {'date': date, 'units_sold': int(units[d])} for d, date in enumerate(_dates(n, self.today))
+                ]
+            }
+        }
+    
+    def cross_merchant(self) -> Dict[str, Any]:
+        rng = self.rng
+        return {
+            'merchant_profile': {
+                'monthly_orders': int(rng.integers(10, 50_000)),
+                'avg_order_value': float(rng.uniform(20, 400)),
+                'profit_margin': float(rng.uniform(0.05, 0.6)),
+                'conversion_rate': float(rng.uniform(0.005, 0.06)),
+                'aov': float(rng.uniform(20, 400)),
+                'customer_retention': float(rng.uniform(0.1, 0.7)),
+                'roas': float(rng.uniform(1, 8)),
+                'lifetime_value': float(rng.uniform(50, 2_000))
+            },
+            'benchmark_categories': list(BENCHMARK_CATEGORIES)
+        }
+    
+    def batch_predictions(self) -> Dict[str, Any]:
+        return {
+            'creative_data': self.creative_fatigue(),
+            'budget_data': self.budget_optimization(),
+            'customer_data': [self._customer() for _ in range(self.batch_items)],
+            'product_data': [self.product_velocity() for _ in range(self.batch_items)],
+            'merchant_profile': self.cross_merchant()
+        }
+    
+    def build(self, endpoint: str) -> Dict[str, Any]:
+        return self.builders[endpoint]()
+
+def parse_mix(text: Optional[str]) -> Dict[str, float]:
+    """'creative-fatigue=4,customer-prediction=1' -> weights (default: DEFAULT_MIX)"""
+    
+    if not text:
+        return dict(DEFAULT_MIX)
+    
+    mix = {}
+    for part in text.split(','):
+        endpoint, _, weight = part.partition('=')
+        endpoint = endpoint.strip().lstrip('/')
+        if endpoint not in DEFAULT_MIX:
+            raise ValueError(f"Unknown endpoint in mix: {endpoint}")
+        mix[endpoint] = float(weight or 1)
+    return mix
+
+def _summarize(latencies: List[float], errors: int, statuses: Dict[str, int], duration: float) -> Dict[str, Any]:
+    values = np.asarray(latencies) * 1000
+    requests = len(values)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'error_rate': errors / requests if requests else 0.0,
+        'throughput_rps': (requests - errors) / duration if duration > 0 else 0.0,
+        'latency_ms': {
+            'mean': float(values.mean()) if requests else None,
+            'p50': float(np.percentile(values, 50)) if requests else None,
+            'p95': float(np.percentile(values, 95)) if requests else None,
+            'p99': float(np.percentile(values, 99)) if requests else None,
+            'max': float(values.max()) if requests else None
+        },
+        'status_codes': dict(sorted(statuses.items()))
+    }
+
+async def run_load(rate: float = 50.0, duration: float = 30.0, mix: Optional[Dict[str, float]] = None,
+                   url: Optional[str] = None, history: int = 30, batch_items: int = 10,
+                   max_inflight: int = 1000, timeout: float = 30.0, seed: int = 42) -> Dict[str, Any]:
+    """
+    Drive the API with Poisson arrivals at a fixed rate, independent of response times
+    
+    Latency is measured from each request's scheduled arrival, so a slow
+    server shows up as queueing delay instead of silently lowering the
+    offered load. Arrivals that find max_inflight requests outstanding are
+    counted as client_dropped rather than delayed.
+    
+    Returns:
+        Report with the run configuration, totals and per-endpoint results
+    """
+    
+    mix = mix or dict(DEFAULT_MIX)
+    endpoints = list(mix)
+    weights = np.array([mix[e] for e in endpoints], dtype=float)
+    weights /= weights.sum()
+    
+    rng = np.random.default_rng(seed)
+    n_arrivals = int(rng.poisson(rate * duration))
+    offsets = np.sort(rng.uniform(0, duration, n_arrivals))
+    choices = rng.choice(len(endpoints), n_arrivals, p=weights)
+    
+    # Bodies are built and encoded up front so the generator doesn't steal time from the app
+    factory = PayloadFactory(history, batch_items, seed)
+    bodies = [json.dumps(factory.build(endpoints[c])).encode() for c in choices]
+    
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=timeout,
+                                   limits=httpx.Limits(max_connections=max_inflight))
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://loadtest',
+                                   timeout=timeout)
+    
+    results: Dict[str, Dict[str, Any]] = {
+        e: {'latencies': [], 'errors': 0, 'statuses': {}} for e in endpoints
+    }
+    inflight = 0
+    client_dropped = 0
+    
+    async def send(endpoint: str, body: bytes, scheduled: float):
+        nonlocal inflight
+        result = results[endpoint]
+        try:
+            response = await client.post(f"/{endpoint}", content=body,
+                                         headers={'Content-Type': 'application/json'})
+            status = str(response.status_code)
+            if response.status_code >= 400:
+                result['errors'] += 1
+        except Exception as e:
+            status = type(e).__name__
+            result['errors'] += 1
+        finally:
+            inflight -= 1
+        result['latencies'].append(time.perf_counter() - scheduled)
+        result['statuses'][status] = result['statuses'].get(status, 0) + 1
+    
+    tasks = []
+    started = time.perf_counter()
+    async with client:
+        for offset, choice, body in zip(offsets, choices, bodies):
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if inflight >= max_inflight:
+                client_dropped += 1
+                continue
+            inflight += 1
+            tasks.append(asyncio.create_task(send(endpoints[choice], body, started + offset)))
+        await asyncio.gather(*tasks)
+    elapsed = max(time.perf_counter() - started, duration)
+    
+    per_endpoint = {
+        e: _summarize(r['latencies'], r['errors'], r['statuses'], elapsed) for e, r in results.items()
+    }
+    all_latencies = [latency for r in results.values() for latency in r['latencies']]
+    all_statuses: Dict[str, int] = {}
+    for r in results.values():
+        for status, count in r['statuses'].items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    
+    return {
+        'schema': REPORT_SCHEMA,
+        'generated_at': datetime.now().isoformat(),
+        'config': {
+            'target': url or 'in-process',
+            'rate_rps': rate,
+            'duration_s': duration,
+            'mix': {e: float(w) for e, w in zip(endpoints, weights)},
+            'history': history,
+            'batch_items': batch_items,
+            'max_inflight': max_inflight,
+            'seed': seed
+        },
+        'elapsed_s': elapsed,
+        'client_dropped': client_dropped,
+        'total': _summarize(all_latencies, sum(r['errors'] for r in results.values()), all_statuses, elapsed),
+        'endpoints': per_endpoint
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Per-endpoint change between two saved reports
+    
+    Returns:
+        {endpoint: {metric: {'baseline', 'current', 'change'}}} for the
+        latency percentiles, throughput and error rate; change is relative
+        (current / baseline - 1) for latency and throughput, absolute for
+        the error rate
+    """
+    
+    if baseline.get('schema') != current.get('schema'):
+        raise ValueError("Reports were written by different load test versions")
+    
+    def delta(before: Optional[float], after: Optional[float], relative: bool = True) -> Dict[str, Any]:
+        change = None
+        if before is not None and after is not None:
+            change = (after / before - 1) if relative and before else (after - before)
+        return {'baseline': before, 'current': after, 'change': change}
+    
+    rows = {}
+    for endpoint in ['total', *sorted(set(baseline['endpoints']) | set(current['endpoints']))]:
+        before = baseline['total'] if endpoint == 'total' else baseline['endpoints'].get(endpoint)
+        after = current['total'] if endpoint == 'total' else current['endpoints'].get(endpoint)
+        if before is None or after is None:
+            rows[endpoint] = {'missing_in': 'baseline' if before is None else 'current'}
+            continue
+        
+        rows[endpoint] = {
+            **{q: delta(before['latency_ms'][q], after['latency_ms'][q]) for q in ('p50', 'p95', 'p99')},
+            'throughput_rps': delta(before['throughput_rps'], after['throughput_rps']),
+            'error_rate': delta(before['error_rate'], after['error_rate'], relative=False)
+        }
+    
+    config_changes = {
+        key: {'baseline': baseline['config'].get(key), 'current': value}
+        for key, value in current['config'].items() if baseline['config'].get(key) != value
+    }
+    return {'config_changes': config_changes, 'endpoints': rows}
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Fixed-width table of a report's per-endpoint results"""
+    
+    def ms(value: Optional[float]) -> str:
+        return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+    
+    lines = [f"{'endpoint':<30}{'reqs':>7}{'rps':>9}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}"]
+    rows = [*report['endpoints'].items(), ('total', report['total'])]
+    for endpoint, stats in rows:
+        latency = stats['latency_ms']
+        lines.append(
+            f"{endpoint:<30}{stats['requests']:>7}{stats['throughput_rps']:>9.1f}"
+            f"{stats['error_rate'] * 100:>7.1f}{ms(latency['p50'])}{ms(latency['p95'])}{ms(latency['p99'])}"
+        )
+    if report.get('client_dropped'):
+        lines.append(f"client dropped {report['client_dropped']} arrivals (max in-flight reached)")
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=float, default=50.0, help="arrivals per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds of arrivals")
+    parser.add_argument('--url', default=None, help="server to target (default: in-process app)")
+    parser.add_argument('--mix', default=None, help="endpoint=weight,... (default: all endpoints)")
+    parser.add_argument('--history', type=int, default=30, help="days or orders per history")
+    parser.add_argument('--batch-items', type=int, default=10, help="customers and products per batch request")
+    parser.add_argument('--max-inflight', type=int, default=1000)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', default=None, help="write the JSON report here")
+    parser.add_argument('--compare', default=None, help="saved report to compare against")
+    args = parser.parse_args()
+    
+    report = asyncio.run(run_load(
+        args.rate, args.duration, parse_mix(args.mix), args.url, args.history,
+        args.batch_items, args.max_inflight, args.timeout, args.seed
+    ))
+    print(format_report(report))
+    
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    
+    if args.compare:
+        with open(args.compare) as f:
+            print(json.dumps(compare(json.load(f), report), indent=2))
+
+if __name__ == "__main__":
+    main()
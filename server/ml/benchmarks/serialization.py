@@ -0,0 +1,149 @@
+"""
+Slay Season Prediction Engine - Serialization Benchmark
+Times request validation and response rendering for a 1,000-item /batch-predictions payload
+
+Usage (from server/ml):
+    python -m benchmarks.serialization [--items 1000] [--history 24] [--repeats 5]
+"""
+
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+
+import numpy as np
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from main import BatchPredictionRequest, CustomerPredictionRequest, PredictionResponse
+from models.customer_purchase import CustomerPurchasePredictor
+from utils.responses import ORJSONResponse
+
+def _best_of(fn: Callable[[], Any], repeats: int) -> float:
+    """Fastest of several runs, in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+def build_payloads(n_items: int, history: int, seed: int = 42) -> Dict[str, bytes]:
+    """The same customers as row-format and columnar request bodies"""
+    
+    rng = np.random.default_rng(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows, columns = [], []
+    
+    for i in range(n_items):
+        # Customers differ in cadence, recency and basket size
+        cycle_days = rng.gamma(2.0, 15.0) + 3
+        gaps = rng.gamma(4.0, cycle_days / 4.0, history)
+        ages = np.round(np.cumsum(gaps)[::-1] - gaps[0] + rng.integers(0, 120)).astype(int)
+        dates = [(today - timedelta(days=int(d))).strftime('%Y-%m-%d') for d in ages]
+        amounts = np.round(rng.gamma(2.0, rng.uniform(10, 80), history), 2).tolist()
+        behavior = {'email_opens_30d': int(rng.integers(0, 10)), 'website_visits_30d': int(rng.integers(0, 20))}
+        
+        rows.append({
+            'customer_id': f'c{i}',
+            'purchase_history': [{'date': d, 'amount': a} for d, a in zip(dates, amounts)],
+            'behavior_data': behavior
+        })
+        columns.append({
+            'customer_id': f'c{i}',
+            'purchase_columns': {'dates': dates, 'amounts': amounts},
+            'behavior_data': behavior
+        })
+    
+    return {
+        'rows': orjson.dumps({'customer_data': rows}),
+        'columns': orjson.dumps({'customer_data': columns})
+    }
+
+def build_response(payload: bytes) -> Dict[str, Any]:
+    """
+    The /batch-predictions response for a row-format payload
+    
+    Each customer goes through the rule-based customer predictor, as
+    /customer-prediction serves it without a model, so predictions,
+    confidences and explanations vary the way real responses do.
+    """
+    
+    predictor = CustomerPurchasePredictor()
+    predictions = []
+    for customer in orjson.loads(payload)['customer_data']:
+        result = predictor.predict_next_purchase(
+            customer['customer_id'], customer['purchase_history'], customer['behavior_data'], use_model=False
+        )
+        predictions.append(PredictionResponse(
+            prediction=f"Customer will reorder in {result['days_to_purchase']} days",
+            confidence_score=result['confidence'],
+            explanation=result['explanation'],
+            recommended_actions=result['actions'],
+            timestamp=datetime.now(),
+            model_version=predictor.model_version,
+            tier=result.get('tier')
+        ))
+    
+    return {
+        'predictions': {'customer_predictions': predictions},
+        'generated_at': datetime.now(),
+        'summary': "Generated 1 prediction types"
+    }
+
+def run(n_items: int = 1000, history: int = 24, repeats: int = 5) -> Dict[str, Any]:
+    """
+    Benchmark the previous and current request/response paths
+    
+    Returns:
+        Timings (ms) and payload sizes (bytes) for each path
+    """
+    
+    payloads = build_payloads(n_items, history)
+    response = build_response(payloads['rows'])
+    generic = TypeAdapter(Dict[str, Any])
+    
+    def validate_generic():
+        # Previous endpoint: untyped dict body, then one model per customer
+        body = generic.validate_json(payloads['rows'])
+        return [CustomerPredictionRequest(**c) for c in body['customer_data']]
+    
+    default_body = JSONResponse(jsonable_encoder(response)).body
+    orjson_body = ORJSONResponse(response).body
+    
+    return {
+        'items': n_items,
+        'history_length': history,
+        'request_bytes': {name: len(body) for name, body in payloads.items()},
+        'validation_ms': {
+            'untyped_rows': _best_of(validate_generic, repeats),
+            'typed_rows': _best_of(lambda: BatchPredictionRequest.model_validate_json(payloads['rows']), repeats),
+            'typed_columns': _best_of(lambda: BatchPredictionRequest.model_validate_json(payloads['columns']), repeats)
+        },
+        'response_ms': {
+            'jsonable_encoder': _best_of(lambda: JSONResponse(jsonable_encoder(response)), repeats),
+            'orjson': _best_of(lambda: ORJSONResponse(response), repeats),
+            'orjson_gzip': _best_of(lambda: gzip.compress(ORJSONResponse(response).body, compresslevel=6), repeats)
+        },
+        'response_bytes': {
+            'json': len(default_body),
+            'orjson': len(orjson_body),
+            'orjson_gzip': len(gzip.compress(orjson_body, compresslevel=6))
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--history', type=int, default=24, help="purchases per customer")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    
+    print(json.dumps(run(args.items, args.history, args.repeats), indent=2))
+
+if __name__ == "__main__":
+    main()
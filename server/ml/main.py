@@ -3,12 +3,18 @@ Slay Season Prediction Engine - Main API
 Advanced ML predictions that give merchants a competitive edge
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Union
+import pandas as pd
 import uvicorn
+import asyncio
 import logging
+import math
+import time
 from datetime import datetime, timedelta
 import os
 
@@ -18,6 +24,22 @@ from models.budget_optimizer import BudgetOptimizer
 from models.customer_purchase import CustomerPurchasePredictor
 from models.product_velocity import ProductVelocityPredictor
 from models.cross_merchant import CrossMerchantIntelligence
+from utils.frame_cache import frame_cache
+from utils.single_flight import single_flight
+from utils.admission import AdmissionRejected, admission_controller
+from utils.drift_monitor import drift_monitor
+from utils.prediction_log import FORECAST_METRICS, prediction_log
+from utils.tiering import tier_selector
+from utils.results_store import ResultsStore
+from utils.responses import ORJSONResponse
+from settings import Settings
+from schemas import (
+    AccountHistory, CatalogSales, PerformanceHistory, PurchaseHistory, SalesHistory
+)
+from precompute import (
+    PrecomputePipeline, create_merchant_source, iter_merchant_profiles, model_versions,
+    refresh_predictors, run_merchant_predictions
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -38,40 +60,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Large batch responses are gzipped for clients that accept it
+if Settings.RESPONSE_GZIP_ENABLED:
+    app.add_middleware(GZipMiddleware, minimum_size=Settings.RESPONSE_GZIP_MIN_BYTES)
+
 # Initialize prediction models
-creative_predictor = CreativeFatiguePredictor()
-budget_optimizer = BudgetOptimizer()
-customer_predictor = CustomerPurchasePredictor()
-product_predictor = ProductVelocityPredictor()
-merchant_intelligence = CrossMerchantIntelligence()
+# Endpoints look predictors up per request so the model watcher can swap in
+# new versions atomically; in-flight requests keep the instance they started with
+predictors = {
+    "creative_fatigue": CreativeFatiguePredictor(),
+    "budget_optimization": BudgetOptimizer(),
+    "customer_prediction": CustomerPurchasePredictor(),
+    "product_velocity": ProductVelocityPredictor(),
+    "cross_merchant": CrossMerchantIntelligence()
+}
+
+# Precomputed predictions store and background pipeline, opened at startup
+precompute_config = Settings.get_precompute_config()
+merchant_source = create_merchant_source(precompute_config)
+results_store: Optional[ResultsStore] = None
+precompute_pipeline: Optional[PrecomputePipeline] = None
 
 # Pydantic models for API requests
+# Each history can be sent as rows or, validated much faster, as typed columns
 class CreativeFatigueRequest(BaseModel):
     creative_id: str
     platform: str
     current_metrics: Dict[str, float]
-    historical_data: List[Dict[str, Any]]
+    historical_data: List[Dict[str, Any]] = []
+    history_columns: Optional[PerformanceHistory] = None
+    
+    def history(self) -> List[Dict[str, Any]]:
+        return self.history_columns.to_records() if self.history_columns else self.historical_data
+
+class CreativeAccountRequest(BaseModel):
+    platform: str = "facebook"
+    creatives: List[Dict[str, Any]] = []  # Long format: one row per creative per day
+    creative_columns: Optional[AccountHistory] = None
+    
+    def account_data(self) -> Union[pd.DataFrame, List[Dict[str, Any]]]:
+        return self.creative_columns.to_frame() if self.creative_columns else self.creatives
 
 class BudgetOptimizationRequest(BaseModel):
     current_spend: float
     current_revenue: float
-    historical_performance: List[Dict[str, Any]]
+    historical_performance: List[Dict[str, Any]] = []
+    performance_columns: Optional[PerformanceHistory] = None
+    constraints: Optional[Dict[str, Any]] = None
+    
+    def history(self) -> List[Dict[str, Any]]:
+        return self.performance_columns.to_records() if self.performance_columns else self.historical_performance
+
+class BudgetPortfolioRequest(BaseModel):
+    total_budget: float
+    campaigns: List[Dict[str, Any]]
     constraints: Optional[Dict[str, Any]] = None
 
 class CustomerPredictionRequest(BaseModel):
     customer_id: str
-    purchase_history: List[Dict[str, Any]]
+    purchase_history: List[Dict[str, Any]] = []
+    purchase_columns: Optional[PurchaseHistory] = None
     behavior_data: Optional[Dict[str, Any]] = None
+    
+    def history(self) -> List[Dict[str, Any]]:
+        return self.purchase_columns.to_records() if self.purchase_columns else self.purchase_history
 
 class ProductVelocityRequest(BaseModel):
     product_id: str
     product_data: Dict[str, Any]
+    sales_columns: Optional[SalesHistory] = None  # Replaces product_data['sales_history']
     market_data: Optional[List[Dict[str, Any]]] = None
+    
+    def product(self) -> Dict[str, Any]:
+        if self.sales_columns is None:
+            return self.product_data
+        return {**self.product_data, 'sales_history': self.sales_columns.to_records()}
+
+class ProductCatalogRequest(BaseModel):
+    products: List[Dict[str, Any]]
+    sales: List[Dict[str, Any]] = []  # Long format: product_id, date, units_sold
+    sales_columns: Optional[CatalogSales] = None
+    market_data: Optional[List[Dict[str, Any]]] = None
+    
+    def sales_data(self) -> Union[pd.DataFrame, List[Dict[str, Any]]]:
+        return self.sales_columns.to_frame() if self.sales_columns else self.sales
 
 class CrossMerchantRequest(BaseModel):
     merchant_profile: Dict[str, Any]
     benchmark_categories: List[str]
 
+class BatchPredictionRequest(BaseModel):
+    creative_data: Optional[CreativeFatigueRequest] = None
+    budget_data: Optional[BudgetOptimizationRequest] = None
+    customer_data: Optional[List[CustomerPredictionRequest]] = None
+    product_data: Optional[List[ProductVelocityRequest]] = None
+    merchant_profile: Optional[CrossMerchantRequest] = None
+
 # Response models
 class PredictionResponse(BaseModel):
     prediction: Any
@@ -79,6 +163,8 @@ class PredictionResponse(BaseModel):
     explanation: str
     recommended_actions: List[str]
     timestamp: datetime
+    model_version: Optional[str] = None
+    tier: Optional[str] = None  # model | rule_based | fallback
 
 @app.get("/")
 async def root():
@@ -88,40 +174,250 @@ async def root():
         "status": "operational",
         "endpoints": [
             "/creative-fatigue",
+            "/creative-fatigue/account",
             "/budget-optimization", 
+            "/budget-optimization/portfolio",
             "/customer-prediction",
             "/product-velocity",
+            "/product-velocity/catalog",
             "/cross-merchant-intelligence",
+            "/merchants/{merchant_id}/predictions",
+            "/precompute/run",
+            "/archetypes/refit",
+            "/models/retrain-status",
             "/health"
         ]
     }
 
+async def _precompute_loop():
+    """Refresh precomputed predictions for all active merchants on an interval"""
+    interval = precompute_config["interval"].total_seconds()
+    while True:
+        try:
+            await run_in_threadpool(precompute_pipeline.run)
+        except Exception as e:
+            logger.error(f"Scheduled precompute failed: {e}")
+        await asyncio.sleep(interval)
+
+def refit_archetypes() -> Dict[str, Any]:
+    """Refit the merchant archetype clusters on every active merchant's profile"""
+    batches = iter_merchant_profiles(merchant_source, Settings.get_archetype_config()["batch_size"])
+    return predictors["cross_merchant"].fit_archetypes(batches)
+
+async def _archetype_refit_loop():
+    """Refit merchant archetypes on an interval (nightly by default)"""
+    interval = Settings.get_archetype_config()["refit_interval"].total_seconds()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(refit_archetypes)
+        except Exception as e:
+            logger.error(f"Scheduled archetype refit failed: {e}")
+
+async def _model_watch_loop():
+    """Swap in newly published model versions without a restart"""
+    interval = Settings.get_model_config()["watch_interval"].total_seconds()
+    while True:
+        try:
+            swapped = await run_in_threadpool(refresh_predictors, predictors)
+            for name, version in swapped.items():
+                logger.info(f"Swapped in {name} model version {version}")
+        except Exception as e:
+            logger.error(f"Model refresh failed: {e}")
+        await asyncio.sleep(interval)
+
+async def _drift_check_loop():
+    """Compare live model inputs with their training histograms on an interval"""
+    interval = Settings.get_drift_config()["check_interval"].total_seconds()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            reports = await run_in_threadpool(drift_monitor.check_all)
+            for name, report in reports.items():
+                if report and report["drifted_features"]:
+                    logger.info(f"{name} inputs drifted: {report['drifted_features']}")
+        except Exception as e:
+            logger.error(f"Drift check failed: {e}")
+
+@app.on_event("startup")
+async def start_precompute():
+    global results_store, precompute_pipeline
+    results_store = ResultsStore(precompute_config["results_path"])
+    precompute_pipeline = PrecomputePipeline(
+        merchant_source,
+        results_store,
+        workers=precompute_config["workers"],
+        chunk_size=precompute_config["chunk_size"]
+    )
+    if precompute_config["enabled"]:
+        asyncio.create_task(_precompute_loop())
+        logger.info("Scheduled prediction precompute started")
+
+@app.on_event("startup")
+async def start_archetype_refit():
+    if Settings.get_archetype_config()["refit_enabled"]:
+        asyncio.create_task(_archetype_refit_loop())
+
+@app.on_event("startup")
+async def start_model_watcher():
+    asyncio.create_task(_model_watch_loop())
+
+@app.on_event("startup")
+async def start_drift_checks():
+    if drift_monitor.enabled:
+        asyncio.create_task(_drift_check_loop())
+
+@app.on_event("startup")
+async def start_prediction_log():
+    prediction_log.start()
+
+@app.on_event("shutdown")
+async def stop_prediction_log():
+    await run_in_threadpool(prediction_log.stop)
+
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now(),
         "models_loaded": {
-            "creative_fatigue": creative_predictor.is_ready(),
-            "budget_optimizer": budget_optimizer.is_ready(),
-            "customer_prediction": customer_predictor.is_ready(),
-            "product_velocity": product_predictor.is_ready(),
-            "cross_merchant": merchant_intelligence.is_ready()
-        }
+            "creative_fatigue": predictors["creative_fatigue"].is_ready(),
+            "budget_optimizer": predictors["budget_optimization"].is_ready(),
+            "customer_prediction": predictors["customer_prediction"].is_ready(),
+            "product_velocity": predictors["product_velocity"].is_ready(),
+            "cross_merchant": predictors["cross_merchant"].is_ready()
+        },
+        "model_versions": model_versions(predictors),
+        "frame_cache": frame_cache.stats(),
+        "coalescing": single_flight.stats(),
+        "admission": admission_controller.stats(),
+        "tiers": tier_selector.stats(),
+        "drift": drift_monitor.stats(),
+        "prediction_log": prediction_log.stats(),
+        "precompute": precompute_pipeline.last_run if precompute_pipeline else None
     }
 
+def request_deadline(
+    budget_ms: Optional[float] = Header(None, alias=Settings.get_admission_config()["deadline_header"])
+) -> float:
+    """Absolute deadline for a request, from the client's latency budget header"""
+    return admission_controller.deadline(budget_ms)
+
+# Request / result fields identifying the predicted entity
+ENTITY_FIELDS = ("creative_id", "customer_id", "product_id")
+
+def log_prediction(endpoint: str, request: BaseModel, predictor, inputs: str, latency_ms: float, result: Any):
+    """
+    Queue prediction log records (never blocks; dropped when the log is backed up)
+    
+    Bulk results (a list of dicts or a DataFrame) get one record per row,
+    with that row's entity, value, confidence and tier.
+    """
+    
+    metric = FORECAST_METRICS.get(endpoint)
+    # Results without a tier come from the model only when one is trained
+    default_tier = "model" if getattr(predictor, "is_trained", True) else "rule_based"
+    
+    if isinstance(result, dict):
+        entity_id = next(
+            (getattr(request, field) for field in ENTITY_FIELDS if hasattr(request, field)),
+            None
+        )
+        prediction_log.log(
+            endpoint, entity_id, inputs, predictor.model_version, result.get("tier") or default_tier,
+            latency_ms, result.get(metric[0]) if metric else None, result.get("confidence")
+        )
+        return
+    
+    rows = result if isinstance(result, pd.DataFrame) else pd.DataFrame(result)
+    if rows.empty:
+        return
+    
+    def column(name: Optional[str], default: Any) -> List[Any]:
+        if name in rows.columns:
+            return rows[name].astype(object).where(rows[name].notna(), default).tolist()
+        return [default] * len(rows)
+    
+    entity_column = next((field for field in ENTITY_FIELDS if field in rows.columns), None)
+    for entity_id, value, confidence, tier in zip(
+        column(entity_column, None), column(metric[0] if metric else None, None),
+        column("confidence", None), column("tier", default_tier)
+    ):
+        prediction_log.log(
+            endpoint, None if entity_id is None else str(entity_id), inputs, predictor.model_version,
+            tier, latency_ms, value, confidence
+        )
+
+async def serve_prediction(endpoint: str, request: BaseModel, deadline: float, predictor,
+                           method, *args, rule_tier: bool = True):
+    """
+    Run a prediction through tier selection, request coalescing and admission control
+    
+    For predictors with a rule-based tier (method accepts use_model), the tier
+    selector picks the model only when its p95 latency fits the time left and
+    its circuit breaker is closed. Identical concurrent requests for the same
+    tier share one admission decision and one computation. If the queue cannot
+    answer before the deadline, the rule-based tier answers instead; without
+    one, or when even that would be late, the request is rejected with 503.
+    Every answered request is appended to the prediction log.
+    """
+    
+    received = time.monotonic()
+    inputs = await run_in_threadpool(single_flight.request_key, request)
+    tier = tier_selector.select(endpoint, deadline - time.monotonic()) if rule_tier else 'model'
+    
+    def engine(use_model: bool):
+        async def run():
+            started = time.monotonic()
+            if not rule_tier:
+                return await run_in_threadpool(method, *args)
+            
+            result = await run_in_threadpool(method, *args, use_model=use_model)
+            served = result.get('tier')
+            engine_tier = served if served in ('model', 'rule_based') else ('model' if use_model else 'rule_based')
+            tier_selector.record(endpoint, engine_tier, time.monotonic() - started)
+            return result
+        return run
+    
+    try:
+        result = await single_flight.run(
+            endpoint, [predictor.model_version, tier, inputs],
+            lambda: admission_controller.run(
+                endpoint, deadline, engine(tier == 'model'), engine(False) if rule_tier else None
+            )
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    
+    if rule_tier:
+        tier_selector.served(endpoint, result.get('tier'))
+    latency_ms = (time.monotonic() - received) * 1000
+    if isinstance(result, dict):
+        log_prediction(endpoint, request, predictor, inputs, latency_ms, result)
+    else:
+        # One record per row: keep large catalogs off the event loop
+        await run_in_threadpool(log_prediction, endpoint, request, predictor, inputs, latency_ms, result)
+    return result
+
 @app.post("/creative-fatigue", response_model=PredictionResponse)
-async def predict_creative_fatigue(request: CreativeFatigueRequest):
+async def predict_creative_fatigue(request: CreativeFatigueRequest, deadline: float = Depends(request_deadline)):
     """
     Predict when ad creative will hit fatigue
     Returns: Days until fatigue + confidence score
     """
     try:
-        result = creative_predictor.predict_fatigue(
+        predictor = predictors["creative_fatigue"]
+        result = await serve_prediction(
+            "/creative-fatigue", request, deadline, predictor,
+            predictor.predict_fatigue,
             request.creative_id,
             request.platform,
             request.current_metrics,
-            request.historical_data
+            request.history()
         )
         
         return PredictionResponse(
@@ -129,23 +425,58 @@ async def predict_creative_fatigue(request: CreativeFatigueRequest):
             confidence_score=result['confidence'],
             explanation=result['explanation'],
             recommended_actions=result['actions'],
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            model_version=predictor.model_version,
+            tier=result.get('tier')
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Creative fatigue prediction failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/creative-fatigue/account", response_class=ORJSONResponse)
+async def predict_account_creative_fatigue(request: CreativeAccountRequest, deadline: float = Depends(request_deadline)):
+    """
+    Score fatigue for every creative in an ad account
+    Returns: Creatives ranked by fatigue risk
+    """
+    try:
+        predictor = predictors["creative_fatigue"]
+        results = await serve_prediction(
+            "/creative-fatigue/account", request, deadline, predictor,
+            predictor.batch_predict_account,
+            request.account_data(),
+            request.platform,
+            rule_tier=False
+        )
+        
+        return ORJSONResponse({
+            "predictions": results,
+            "generated_at": datetime.now(),
+            "model_version": predictor.model_version,
+            "summary": f"Scored {len(results)} creatives"
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Account creative fatigue scoring failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/budget-optimization", response_model=PredictionResponse)
-async def optimize_budget(request: BudgetOptimizationRequest):
+async def optimize_budget(request: BudgetOptimizationRequest, deadline: float = Depends(request_deadline)):
     """
     Recommend optimal budget allocation
     Returns: Budget changes + expected revenue impact
     """
     try:
-        result = budget_optimizer.optimize(
+        predictor = predictors["budget_optimization"]
+        result = await serve_prediction(
+            "/budget-optimization", request, deadline, predictor,
+            predictor.optimize,
             request.current_spend,
             request.current_revenue,
-            request.historical_performance,
+            request.history(),
             request.constraints
         )
         
@@ -154,22 +485,58 @@ async def optimize_budget(request: BudgetOptimizationRequest):
             confidence_score=result['confidence'],
             explanation=result['explanation'],
             recommended_actions=result['actions'],
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            model_version=predictor.model_version,
+            tier=result.get('tier')
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Budget optimization failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/budget-optimization/portfolio", response_class=ORJSONResponse)
+async def optimize_budget_portfolio(request: BudgetPortfolioRequest, deadline: float = Depends(request_deadline)):
+    """
+    Allocate a total budget across all campaigns
+    Returns: Per-campaign spend + expected revenue impact
+    """
+    try:
+        predictor = predictors["budget_optimization"]
+        result = await serve_prediction(
+            "/budget-optimization/portfolio", request, deadline, predictor,
+            predictor.optimize_portfolio,
+            request.campaigns,
+            request.total_budget,
+            request.constraints,
+            rule_tier=False
+        )
+        
+        # Coalesced callers share the result, so copy before annotating
+        return ORJSONResponse({
+            **result,
+            "generated_at": datetime.now(),
+            "model_version": predictor.model_version
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Portfolio budget optimization failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/customer-prediction", response_model=PredictionResponse)
-async def predict_customer_purchase(request: CustomerPredictionRequest):
+async def predict_customer_purchase(request: CustomerPredictionRequest, deadline: float = Depends(request_deadline)):
     """
     Predict when customer will make next purchase
     Returns: Purchase probability + timing prediction
     """
     try:
-        result = customer_predictor.predict_next_purchase(
+        predictor = predictors["customer_prediction"]
+        result = await serve_prediction(
+            "/customer-prediction", request, deadline, predictor,
+            predictor.predict_next_purchase,
             request.customer_id,
-            request.purchase_history,
+            request.history(),
             request.behavior_data
         )
         
@@ -178,22 +545,29 @@ async def predict_customer_purchase(request: CustomerPredictionRequest):
             confidence_score=result['confidence'],
             explanation=result['explanation'],
             recommended_actions=result['actions'],
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            model_version=predictor.model_version,
+            tier=result.get('tier')
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Customer prediction failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/product-velocity", response_model=PredictionResponse)
-async def predict_product_velocity(request: ProductVelocityRequest):
+async def predict_product_velocity(request: ProductVelocityRequest, deadline: float = Depends(request_deadline)):
     """
     Predict product trend velocity
     Returns: Expected demand change + trend direction
     """
     try:
-        result = product_predictor.predict_velocity(
+        predictor = predictors["product_velocity"]
+        result = await serve_prediction(
+            "/product-velocity", request, deadline, predictor,
+            predictor.predict_velocity,
             request.product_id,
-            request.product_data,
+            request.product(),
             request.market_data
         )
         
@@ -202,22 +576,59 @@ async def predict_product_velocity(request: ProductVelocityRequest):
             confidence_score=result['confidence'],
             explanation=result['explanation'],
             recommended_actions=result['actions'],
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            model_version=predictor.model_version,
+            tier=result.get('tier')
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Product velocity prediction failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/product-velocity/catalog", response_class=ORJSONResponse)
+async def predict_catalog_velocity(request: ProductCatalogRequest, deadline: float = Depends(request_deadline)):
+    """
+    Predict velocity for every product in a catalog
+    Returns: One velocity prediction per product
+    """
+    try:
+        predictor = predictors["product_velocity"]
+        results = await serve_prediction(
+            "/product-velocity/catalog", request, deadline, predictor,
+            predictor.predict_catalog,
+            request.products,
+            request.sales_data(),
+            request.market_data,
+            rule_tier=False
+        )
+        
+        return ORJSONResponse({
+            "predictions": results.to_dict(orient="records"),
+            "generated_at": datetime.now(),
+            "model_version": predictor.model_version,
+            "summary": f"Scored {len(results)} products"
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Catalog velocity prediction failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/cross-merchant-intelligence", response_model=PredictionResponse)
-async def cross_merchant_insights(request: CrossMerchantRequest):
+async def cross_merchant_insights(request: CrossMerchantRequest, deadline: float = Depends(request_deadline)):
     """
     Provide cross-merchant intelligence and benchmarks
     Returns: Comparative insights + opportunity recommendations
     """
     try:
-        result = merchant_intelligence.get_insights(
+        predictor = predictors["cross_merchant"]
+        result = await serve_prediction(
+            "/cross-merchant-intelligence", request, deadline, predictor,
+            predictor.get_insights,
             request.merchant_profile,
-            request.benchmark_categories
+            request.benchmark_categories,
+            rule_tier=False
         )
         
         return PredictionResponse(
@@ -225,15 +636,88 @@ async def cross_merchant_insights(request: CrossMerchantRequest):
             confidence_score=result['confidence'],
             explanation=result['explanation'],
             recommended_actions=result['actions'],
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            model_version=predictor.model_version,
+            tier=result.get('tier')
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Cross-merchant intelligence failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/merchants/{merchant_id}/predictions", response_class=ORJSONResponse)
+async def get_merchant_predictions(merchant_id: str):
+    """
+    Serve precomputed predictions for a merchant
+    Recomputes on demand only when results are missing or stale
+    """
+    try:
+        record = results_store.get_results(merchant_id)
+        versions = model_versions(predictors)
+        data_version = merchant_source.data_version(merchant_id)
+        ttl = Settings.get_prediction_config()["cache_ttl"]
+        
+        if record and not ResultsStore.is_stale(record, ttl, data_version, versions):
+            return ORJSONResponse({**record, "source": "precomputed"})
+        
+        merchant_data = merchant_source.load_merchant_data(merchant_id)
+        if merchant_data is None:
+            if record:
+                return ORJSONResponse({**record, "source": "precomputed", "stale": True})
+            raise HTTPException(status_code=404, detail=f"No data for merchant {merchant_id}")
+        
+        enabled = Settings.get_prediction_config()["enabled_predictions"]
+        with frame_cache.request_scope():
+            results = await run_in_threadpool(
+                run_merchant_predictions, predictors, merchant_data, enabled
+            )
+        results_store.save_results(merchant_id, results, versions, data_version)
+        
+        return ORJSONResponse({**results_store.get_results(merchant_id), "source": "recomputed"})
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Merchant predictions failed for {merchant_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/precompute/run")
+async def run_precompute():
+    """Trigger a precompute pass for all active merchants"""
+    try:
+        return await run_in_threadpool(precompute_pipeline.run)
+    except Exception as e:
+        logger.error(f"Precompute run failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/archetypes/refit")
+async def run_archetype_refit():
+    """Refit the merchant archetype clusters now instead of waiting for the nightly run"""
+    try:
+        return await run_in_threadpool(refit_archetypes)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Archetype refit failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/models/retrain-status")
+async def retrain_status(check: bool = False):
+    """
+    Retrain signal per model from input drift, for the retraining job to poll
+    Models retrain when drift or age calls for it instead of on a fixed schedule
+    """
+    if check:
+        await run_in_threadpool(drift_monitor.check_all)
+    return {
+        "models": drift_monitor.retrain_decisions(list(predictors)),
+        "timestamp": datetime.now()
+    }
+
 # Batch prediction endpoint
-@app.post("/batch-predictions")
-async def batch_predictions(merchant_data: Dict[str, Any]):
+@app.post("/batch-predictions", response_class=ORJSONResponse)
+async def batch_predictions(request: BatchPredictionRequest, deadline: float = Depends(request_deadline)):
     """
     Get all predictions for a merchant in one call
     Optimized for dashboard integration
@@ -241,42 +725,44 @@ async def batch_predictions(merchant_data: Dict[str, Any]):
     try:
         predictions = {}
         
-        # Run all predictions if data is available
-        if "creative_data" in merchant_data:
-            predictions["creative_fatigue"] = await predict_creative_fatigue(
-                CreativeFatigueRequest(**merchant_data["creative_data"])
-            )
-            
-        if "budget_data" in merchant_data:
-            predictions["budget_optimization"] = await optimize_budget(
-                BudgetOptimizationRequest(**merchant_data["budget_data"])
-            )
-            
-        if "customer_data" in merchant_data:
-            predictions["customer_predictions"] = [
-                await predict_customer_purchase(
-                    CustomerPredictionRequest(**customer)
-                ) for customer in merchant_data["customer_data"]
-            ]
-            
-        if "product_data" in merchant_data:
-            predictions["product_velocity"] = [
-                await predict_product_velocity(
-                    ProductVelocityRequest(**product)
-                ) for product in merchant_data["product_data"]
-            ]
-            
-        if "merchant_profile" in merchant_data:
-            predictions["cross_merchant"] = await cross_merchant_insights(
-                CrossMerchantRequest(**merchant_data["merchant_profile"])
-            )
+        # Histories shared between predictors are parsed once per request
+        with frame_cache.request_scope():
+            # Run all predictions if data is available
+            if request.creative_data is not None:
+                predictions["creative_fatigue"] = await predict_creative_fatigue(
+                    request.creative_data, deadline
+                )
+                
+            if request.budget_data is not None:
+                predictions["budget_optimization"] = await optimize_budget(
+                    request.budget_data, deadline
+                )
+                
+            if request.customer_data is not None:
+                predictions["customer_predictions"] = [
+                    await predict_customer_purchase(customer, deadline)
+                    for customer in request.customer_data
+                ]
+                
+            if request.product_data is not None:
+                predictions["product_velocity"] = [
+                    await predict_product_velocity(product, deadline)
+                    for product in request.product_data
+                ]
+                
+            if request.merchant_profile is not None:
+                predictions["cross_merchant"] = await cross_merchant_insights(
+                    request.merchant_profile, deadline
+                )
             
-        return {
+        return ORJSONResponse({
             "predictions": predictions,
             "generated_at": datetime.now(),
             "summary": f"Generated {len(predictions)} prediction types"
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Batch predictions failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
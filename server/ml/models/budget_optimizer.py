@@ -7,6 +7,7 @@ Uses advanced ML to find the sweet spot between spend and returns
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.linear_model import SGDRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import cross_val_score
 from scipy.optimize import minimize_scalar
@@ -16,6 +17,13 @@ from typing import Dict, List, Any, Optional, Tuple
 import joblib
 import os
 
+from utils.data_processor import DataProcessor
+from utils.hyperparameters import get_hyperparameters
+from utils.incremental import load_fitted_scaler
+from utils.model_registry import model_registry
+from utils.training_matrix import build_feature_matrix, reports_peak_memory, scale_in_place
+from settings import Settings
+
 logger = logging.getLogger(__name__)
 
 class BudgetOptimizer:
@@ -32,6 +40,7 @@ class BudgetOptimizer:
         self.roi_model = None
         self.scaler = StandardScaler()
         self.is_trained = False
+        self.model_version = None
         self.platform_efficiency = {
             'facebook': 1.0,
             'google': 1.1,    # Slightly better ROI historically
@@ -44,11 +53,21 @@ class BudgetOptimizer:
         return self.is_trained or self._load_pretrained_model()
     
     def _load_pretrained_model(self) -> bool:
-        """Load pre-trained model if available"""
+        """Load the current registry version, falling back to the legacy model file"""
         try:
+            bundle = model_registry.load('budget_optimization')
+            if bundle is not None:
+                self.roi_model = bundle.artifacts['model']
+                self.scaler = bundle.artifacts['scaler']
+                self.model_version = bundle.version
+                self.is_trained = True
+                logger.info(f"Loaded budget optimization model version {bundle.version}")
+                return True
+            
             model_path = "models/budget_optimizer_model.joblib"
             if os.path.exists(model_path):
                 self.roi_model = joblib.load(model_path)
+                self.model_version = 'legacy'
                 self.is_trained = True
                 logger.info("Loaded pre-trained budget optimization model")
                 return True
@@ -58,7 +77,8 @@ class BudgetOptimizer:
     
     def optimize(self, current_spend: float, current_revenue: float,
                 historical_performance: List[Dict[str, Any]], 
-                constraints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                constraints: Optional[Dict[str, Any]] = None,
+                use_model: bool = True) -> Dict[str, Any]:
         """
         Optimize budget allocation for maximum ROI
         
@@ -67,9 +87,10 @@ class BudgetOptimizer:
             current_revenue: Current revenue from that spend
             historical_performance: Performance data over time
             constraints: Budget constraints and limits
+            use_model: False serves the rule-based tier even if a model is loaded
             
         Returns:
-            Optimization recommendations with confidence scores
+            Optimization recommendations with confidence scores and the serving tier
         """
         
         try:
@@ -82,9 +103,15 @@ class BudgetOptimizer:
             )
             
             # Find optimal budget range
-            optimal_spend, expected_revenue = self._find_optimal_spend(
-                features, current_spend, current_revenue, constraints
-            )
+            tier = 'model' if self.is_trained and use_model else 'rule_based'
+            if tier == 'model':
+                optimal_spend, expected_revenue = self._find_optimal_spend(
+                    features, current_spend, current_revenue, constraints
+                )
+            else:
+                optimal_spend, expected_revenue = self._rule_based_optimization(
+                    current_spend, current_revenue, constraints
+                )
             
             # Calculate confidence based on data quality
             confidence = self._calculate_confidence(historical_performance, features)
@@ -118,12 +145,13 @@ class BudgetOptimizer:
                 'confidence': confidence,
                 'risk_level': risk_level,
                 'explanation': explanation,
-                'actions': actions
+                'actions': actions,
+                'tier': tier
             }
             
         except Exception as e:
             logger.error(f"Budget optimization failed: {e}")
-            return self._fallback_optimization(current_spend, current_revenue)
+            return {**self._fallback_optimization(current_spend, current_revenue), 'tier': 'fallback'}
     
     def _extract_optimization_features(self, current_spend: float, 
                                      current_revenue: float,
@@ -142,8 +170,7 @@ class BudgetOptimizer:
                 0.5   # Medium confidence
             ]).reshape(1, -1)
         
-        df = pd.DataFrame(historical_data)
-        df = df.sort_values('date')
+        df = DataProcessor.process_historical_data(historical_data)
         
         # Calculate moving averages and trends
         df['spend_ma7'] = df['spend'].rolling(7).mean()
@@ -300,7 +327,7 @@ class BudgetOptimizer:
         
         # Stable performance = higher confidence
         if len(historical_data) >= 7:
-            df = pd.DataFrame(historical_data)
+            df = DataProcessor.process_historical_data(historical_data)
             roi_variance = df['revenue'].var() / df['spend'].var() if df['spend'].var() > 0 else 1
             stability_factor = min(1.0, 1.0 / (1.0 + roi_variance))
             base_confidence *= stability_factor
@@ -398,6 +425,277 @@ class BudgetOptimizer:
             ]
         }
     
+    def optimize_portfolio(self, campaigns: List[Dict[str, Any]], total_budget: float,
+                           constraints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Allocate a total budget across many campaigns at once
+        
+        Each campaign gets a concave response curve revenue = a * spend^b fitted
+        on its history; the allocation equalizes marginal ROI across campaigns
+        (KKT conditions) subject to per-campaign min/max spend.
+        
+        Args:
+            campaigns: Campaigns with campaign_id, platform, current_spend,
+                current_revenue, historical_performance (spend/revenue rows)
+                and optional min_spend / max_spend
+            total_budget: Budget to distribute across all campaigns
+            constraints: Optional min_marginal_roi below which spend is withheld
+            
+        Returns:
+            Per-campaign allocations with expected revenue and marginal ROI
+        """
+        
+        try:
+            if not campaigns or total_budget <= 0:
+                return self._fallback_portfolio(campaigns, total_budget)
+            
+            scale, elasticity, fitted = self._fit_response_curves(campaigns)
+            
+            current_spend = np.array([float(c.get('current_spend', 0) or 0) for c in campaigns])
+            current_revenue = np.array([float(c.get('current_revenue', 0) or 0) for c in campaigns])
+            min_spend = np.array([float(c.get('min_spend', 0) or 0) for c in campaigns])
+            max_spend = np.array([
+                float(c['max_spend']) if c.get('max_spend') is not None
+                else (current_spend[i] * 3.0 if current_spend[i] > 0 else total_budget)
+                for i, c in enumerate(campaigns)
+            ])
+            max_spend = np.maximum(max_spend, min_spend)
+            
+            min_marginal_roi = (constraints or {}).get('min_marginal_roi')
+            allocation, marginal_roi, status = self._solve_allocation(
+                scale, elasticity, min_spend, max_spend, total_budget, min_marginal_roi
+            )
+            
+            expected_revenue = scale * np.power(allocation, elasticity)
+            total_expected = float(expected_revenue.sum())
+            total_current = float(current_revenue.sum())
+            allocated = float(allocation.sum())
+            
+            allocations = []
+            by_platform: Dict[str, Dict[str, float]] = {}
+            for i, campaign in enumerate(campaigns):
+                platform = str(campaign.get('platform', 'unknown')).lower()
+                allocations.append({
+                    'campaign_id': campaign.get('campaign_id', f'campaign_{i}'),
+                    'platform': platform,
+                    'current_spend': current_spend[i],
+                    'optimal_spend': allocation[i],
+                    'budget_change': allocation[i] - current_spend[i],
+                    'expected_revenue': expected_revenue[i],
+                    'expected_roi': expected_revenue[i] / allocation[i] if allocation[i] > 0 else 0.0,
+                    'marginal_roi': marginal_roi[i],
+                    'elasticity': elasticity[i],
+                    'curve_fitted': bool(fitted[i]),
+                    'at_min': bool(np.isclose(allocation[i], min_spend[i])),
+                    'at_max': bool(np.isclose(allocation[i], max_spend[i]))
+                })
+                platform_totals = by_platform.setdefault(platform, {'spend': 0.0, 'expected_revenue': 0.0})
+                platform_totals['spend'] += allocation[i]
+                platform_totals['expected_revenue'] += expected_revenue[i]
+            
+            allocations.sort(key=lambda a: a['budget_change'], reverse=True)
+            confidence = min(0.95, 0.4 + 0.5 * float(fitted.mean()))
+            
+            return {
+                'total_budget': total_budget,
+                'allocated_budget': allocated,
+                'unallocated_budget': max(0.0, total_budget - allocated),
+                'current_revenue': total_current,
+                'expected_revenue': total_expected,
+                'revenue_increase': (total_expected - total_current) / total_current if total_current > 0 else 0.0,
+                'expected_roi': total_expected / allocated if allocated > 0 else 0.0,
+                'status': status,
+                'allocations': allocations,
+                'by_platform': by_platform,
+                'confidence': confidence,
+                'explanation': self._generate_portfolio_explanation(allocations, status, total_expected, total_current),
+                'actions': self._generate_portfolio_actions(allocations, status),
+                # Fitted response curves, not the trained model
+                'tier': 'rule_based'
+            }
+            
+        except Exception as e:
+            logger.error(f"Portfolio budget optimization failed: {e}")
+            return self._fallback_portfolio(campaigns, total_budget)
+    
+    def _fit_response_curves(self, campaigns: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Fit log(revenue) = log(a) + b * log(spend) for every campaign in one pass
+        
+        Campaigns with fewer than 3 usable points (or no spend variation) keep
+        the default elasticity and are anchored on their current spend/revenue.
+        """
+        
+        n_campaigns = len(campaigns)
+        default_elasticity = 0.7
+        
+        index, spend, revenue = [], [], []
+        for i, campaign in enumerate(campaigns):
+            for row in campaign.get('historical_performance') or []:
+                index.append(i)
+                spend.append(row.get('spend', 0) or 0)
+                revenue.append(row.get('revenue', 0) or 0)
+        
+        index = np.asarray(index, dtype=np.int64)
+        spend = np.asarray(spend, dtype=float)
+        revenue = np.asarray(revenue, dtype=float)
+        usable = (spend > 0) & (revenue > 0)
+        index, log_s, log_r = index[usable], np.log(spend[usable]), np.log(revenue[usable])
+        
+        n = np.bincount(index, minlength=n_campaigns).astype(float)
+        sx = np.bincount(index, weights=log_s, minlength=n_campaigns)
+        sy = np.bincount(index, weights=log_r, minlength=n_campaigns)
+        sxx = np.bincount(index, weights=log_s * log_s, minlength=n_campaigns)
+        sxy = np.bincount(index, weights=log_s * log_r, minlength=n_campaigns)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denominator = n * sxx - sx ** 2
+            slope = (n * sxy - sx * sy) / denominator
+            intercept = (sy - slope * sx) / n
+        
+        fitted = (n >= 3) & (denominator > 1e-9 * np.maximum(n * n, 1)) & np.isfinite(slope)
+        # Keep curves concave (diminishing returns) and responsive
+        elasticity = np.where(fitted, np.clip(slope, 0.1, 0.95), default_elasticity)
+        
+        current_spend = np.array([float(c.get('current_spend', 0) or 0) for c in campaigns])
+        current_revenue = np.array([float(c.get('current_revenue', 0) or 0) for c in campaigns])
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Clipped fits are re-anchored at the mean log point so the curve still passes through the data
+            fitted_scale = np.exp((sy - elasticity * sx) / n)
+            anchored_scale = current_revenue / np.power(current_spend, elasticity)
+            mean_roi = np.where(n > 0, np.exp(sy / n) / np.exp(sx / n), 0.0)
+        
+        fallback_scale = np.where((current_spend > 0) & (current_revenue > 0), anchored_scale, mean_roi)
+        scale = np.where(fitted, fitted_scale, fallback_scale)
+        scale = np.nan_to_num(scale, nan=0.0, posinf=0.0)
+        
+        return scale, elasticity, fitted
+    
+    def _solve_allocation(self, scale: np.ndarray, elasticity: np.ndarray,
+                          min_spend: np.ndarray, max_spend: np.ndarray, total_budget: float,
+                          min_marginal_roi: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, str]:
+        """
+        Equalize marginal ROI a*b*s^(b-1) = lambda across campaigns
+        
+        Spend at a given lambda is clip((lambda / (a*b))^(1/(b-1)), min, max),
+        which decreases monotonically in lambda, so lambda is found by
+        vectorized bisection in log space.
+        """
+        
+        def marginal(spend: np.ndarray) -> np.ndarray:
+            with np.errstate(divide='ignore'):
+                return scale * elasticity * np.power(np.maximum(spend, 1e-9), elasticity - 1)
+        
+        def spend_at(log_lambda: float) -> np.ndarray:
+            with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+                unconstrained = np.exp((log_lambda - np.log(scale * elasticity)) / (elasticity - 1))
+            unconstrained = np.where(scale > 0, unconstrained, 0.0)
+            return np.clip(np.nan_to_num(unconstrained, posinf=np.inf), min_spend, max_spend)
+        
+        if min_spend.sum() >= total_budget:
+            allocation = min_spend * (total_budget / min_spend.sum()) if min_spend.sum() > 0 else min_spend
+            return allocation, marginal(allocation), 'budget_below_minimums'
+        
+        if max_spend.sum() <= total_budget and min_marginal_roi is None:
+            return max_spend.copy(), marginal(max_spend), 'all_campaigns_at_max'
+        
+        active = scale > 0
+        if not active.any():
+            return min_spend.copy(), marginal(min_spend), 'no_response_data'
+        
+        log_high = float(np.log(marginal(min_spend)[active].max()) + 1.0)
+        log_low = float(np.log(max(marginal(max_spend)[active].min(), 1e-12)) - 1.0)
+        
+        for _ in range(100):
+            mid = 0.5 * (log_low + log_high)
+            if spend_at(mid).sum() > total_budget:
+                log_low = mid
+            else:
+                log_high = mid
+        
+        status = 'optimal'
+        log_lambda = log_high
+        if min_marginal_roi is not None and min_marginal_roi > 0 and log_lambda < np.log(min_marginal_roi):
+            # Stop spending where an extra dollar returns less than the floor
+            log_lambda = float(np.log(min_marginal_roi))
+            status = 'marginal_roi_floor'
+        
+        allocation = spend_at(log_lambda)
+        if status == 'optimal':
+            # Hand rounding slack to campaigns that still have headroom
+            slack = total_budget - allocation.sum()
+            headroom = np.where(active, max_spend - allocation, 0.0)
+            if slack > 0 and headroom.sum() > 0:
+                allocation = allocation + headroom * min(1.0, slack / headroom.sum())
+        
+        return allocation, marginal(allocation), status
+    
+    def _generate_portfolio_explanation(self, allocations: List[Dict[str, Any]], status: str,
+                                        expected_revenue: float, current_revenue: float) -> str:
+        """Generate human-readable explanation of a portfolio allocation"""
+        
+        if status == 'budget_below_minimums':
+            return "Total budget is below the sum of campaign minimums. Minimums were scaled down proportionally."
+        if status == 'all_campaigns_at_max':
+            return "Budget covers every campaign's maximum spend. All campaigns are funded at their caps."
+        
+        increases = sum(1 for a in allocations if a['budget_change'] > 0)
+        decreases = sum(1 for a in allocations if a['budget_change'] < 0)
+        change = (expected_revenue - current_revenue) / current_revenue if current_revenue > 0 else 0.0
+        
+        return (f"Shifting budget toward {increases} campaigns and away from {decreases} equalizes marginal ROI "
+                f"across the portfolio, for an expected revenue change of {change:+.0%}.")
+    
+    def _generate_portfolio_actions(self, allocations: List[Dict[str, Any]], status: str) -> List[str]:
+        """Generate actionable recommendations for a portfolio allocation"""
+        
+        actions = []
+        
+        for allocation in allocations[:3]:
+            if allocation['budget_change'] > 50:
+                actions.append(f"Increase {allocation['campaign_id']} by ${allocation['budget_change']:.0f}")
+        
+        for allocation in sorted(allocations, key=lambda a: a['budget_change'])[:3]:
+            if allocation['budget_change'] < -50:
+                actions.append(f"Reduce {allocation['campaign_id']} by ${abs(allocation['budget_change']):.0f}")
+        
+        if status == 'marginal_roi_floor':
+            actions.append("Hold back remaining budget: extra spend falls below the marginal ROI floor")
+        
+        actions.extend([
+            "Shift budget in 25% steps and re-fit curves after 7 days",
+            "Collect more spend variation on campaigns without fitted curves"
+        ])
+        
+        return actions
+    
+    def _fallback_portfolio(self, campaigns: List[Dict[str, Any]], total_budget: float) -> Dict[str, Any]:
+        """Fallback when portfolio optimization fails: keep current spend"""
+        
+        campaigns = campaigns or []
+        
+        return {
+            'total_budget': total_budget,
+            'allocated_budget': sum(float(c.get('current_spend', 0) or 0) for c in campaigns),
+            'unallocated_budget': 0.0,
+            'current_revenue': sum(float(c.get('current_revenue', 0) or 0) for c in campaigns),
+            'expected_revenue': sum(float(c.get('current_revenue', 0) or 0) for c in campaigns),
+            'revenue_increase': 0.0,
+            'expected_roi': 0.0,
+            'status': 'fallback',
+            'allocations': [],
+            'by_platform': {},
+            'confidence': 0.3,
+            'explanation': "Limited data available. Keeping current campaign budgets.",
+            'actions': [
+                "Collect spend and revenue history per campaign",
+                "Test small budget shifts between campaigns"
+            ],
+            'tier': 'fallback'
+        }
+    
+    @reports_peak_memory
     def train_model(self, training_data: List[Dict[str, Any]]) -> Dict[str, float]:
         """Train the budget optimization model"""
         
@@ -410,34 +708,36 @@ class BudgetOptimizer:
                 return {'error': 'insufficient_data'}
             
             # Create and train model
-            self.roi_model = GradientBoostingRegressor(
-                n_estimators=100,
-                learning_rate=0.1,
-                max_depth=6,
-                random_state=42
-            )
+            self.roi_model = self._create_roi_model()
             
-            # Scale features
-            X_scaled = self.scaler.fit_transform(X)
+            # Scale features in place, fitting the scaler chunk by chunk
+            self.scaler = StandardScaler()
+            X_scaled = scale_in_place(self.scaler, X)
             
             # Train model
             self.roi_model.fit(X_scaled, y)
             self.is_trained = True
             
             # Cross-validation score
-            cv_scores = cross_val_score(self.roi_model, X_scaled, y, cv=5, scoring='r2')
+            cv_scores = cross_val_score(
+                self.roi_model, X_scaled, y, cv=5, scoring='r2',
+                n_jobs=Settings.get_model_config()['tuning']['workers']
+            )
             
-            # Save model
-            os.makedirs('models', exist_ok=True)
-            joblib.dump(self.roi_model, 'models/budget_optimizer_model.joblib')
-            joblib.dump(self.scaler, 'models/budget_optimizer_scaler.joblib')
+            # Publish new model version
+            self._publish_model({
+                'cv_r2_mean': cv_scores.mean(),
+                'cv_r2_std': cv_scores.std(),
+                'training_samples': len(X)
+            }, X.shape[1])
             
-            logger.info(f"Budget optimization model trained. CV R²: {cv_scores.mean():.3f}")
+            logger.info(f"Budget optimization model {self.model_version} trained. CV R²: {cv_scores.mean():.3f}")
             
             return {
                 'cv_r2_mean': cv_scores.mean(),
                 'cv_r2_std': cv_scores.std(),
                 'training_samples': len(X),
+                'model_version': self.model_version,
                 'model_saved': True
             }
             
@@ -445,25 +745,111 @@ class BudgetOptimizer:
             logger.error(f"Budget optimization model training failed: {e}")
             return {'error': str(e)}
     
-    def _prepare_training_data(self, training_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
-        """Prepare training data for model"""
+    def _create_roi_model(self):
+        """Create the configured ROI curve model"""
+        
+        if Settings.get_model_config()['budget_model_type'] == 'sgd':
+            # Linear ROI curve that supports partial_fit for incremental updates
+            return SGDRegressor(**get_hyperparameters('budget_optimization', {
+                'loss': 'huber',
+                'penalty': 'l2',
+                'alpha': 0.0001,
+                'learning_rate': 'invscaling',
+                'random_state': 42
+            }, model_type='sgd'))
+        
+        return GradientBoostingRegressor(**get_hyperparameters('budget_optimization', {
+            'n_estimators': 100,
+            'learning_rate': 0.1,
+            'max_depth': 6,
+            'random_state': 42
+        }, model_type='gradient_boosting'))
+    
+    @reports_peak_memory
+    def update_model(self, training_data: List[Dict[str, Any]]) -> Dict[str, float]:
+        """
+        Incrementally update the ROI model on recent data
+        SGD models take a partial_fit step; gradient boosting grows extra stages
+        on the recent residuals until the tree budget is reached, then retrains
         
-        X = []
-        y = []
+        Not scheduled by this service: the retraining job calls it with the
+        recent window (e.g. daily) instead of train_model on the full history.
+        """
         
-        for item in training_data:
-            try:
-                features = self._extract_optimization_features(
-                    item['spend'],
-                    item['revenue'],
-                    item.get('historical_data', [])
-                )
-                
-                X.append(features.flatten())
-                y.append(item['roi'])  # Target is ROI
+        try:
+            ready = self.is_ready()
+            scaler = load_fitted_scaler(self.scaler, 'models/budget_optimizer_scaler.joblib')
+            if not ready or scaler is None:
+                return self.train_model(training_data)
+            self.scaler = scaler
+            
+            # Prepare recent data
+            X, y = self._prepare_training_data(training_data)
+            
+            if len(X) < 20:
+                logger.warning("Insufficient recent data for budget optimization model update")
+                return {'error': 'insufficient_data'}
+            
+            config = Settings.get_model_config()['incremental']
+            
+            if hasattr(self.roi_model, 'partial_fit'):
+                # Running feature statistics keep the scaling current for the linear model
+                X_scaled = scale_in_place(self.scaler, X)
+                self.roi_model.partial_fit(X_scaled, y)
+                update = {'method': 'partial_fit'}
+            else:
+                # Boosting stages depend on all earlier ones, so old trees can't be retired
+                n_estimators = self.roi_model.n_estimators + config['new_trees']
+                if n_estimators > config['max_trees'] * 2:
+                    logger.info("Budget model reached its tree budget; running full retrain")
+                    return self.train_model(training_data)
                 
-            except Exception as e:
-                logger.warning(f"Skipping training sample: {e}")
-                continue
+                X_scaled = scale_in_place(self.scaler, X, fit=False)
+                self.roi_model.set_params(warm_start=True, n_estimators=n_estimators)
+                self.roi_model.fit(X_scaled, y)
+                self.roi_model.set_params(warm_start=False)
+                update = {'method': 'warm_start', 'n_estimators': n_estimators}
+            
+            r2 = self.roi_model.score(X_scaled, y)
+            
+            # Publish new model version
+            self._publish_model({'r2': r2, 'training_samples': len(X), **update}, X.shape[1])
+            
+            logger.info(f"Budget optimization model {self.model_version} updated incrementally. R²: {r2:.3f}")
+            
+            return {
+                'r2': r2,
+                'training_samples': len(X),
+                **update,
+                'model_version': self.model_version,
+                'model_saved': True
+            }
+            
+        except Exception as e:
+            logger.error(f"Budget optimization model update failed: {e}")
+            return {'error': str(e)}
+    
+    def _publish_model(self, metrics: Dict[str, Any], n_features: int) -> str:
+        """Publish the fitted model and scaler as a new registry version"""
+        
+        self.model_version = model_registry.publish(
+            'budget_optimization',
+            {'model': self.roi_model, 'scaler': self.scaler},
+            metrics=metrics,
+            feature_schema={'n_features': n_features}
+        )
+        return self.model_version
+    
+    def _prepare_training_data(self, training_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Prepare training data for model as a float32 memmap"""
+        
+        def extract(item):
+            features = self._extract_optimization_features(
+                item['spend'],
+                item['revenue'],
+                item.get('historical_data', [])
+            )
+            return features, (item['roi'],)  # Target is ROI
         
-        return np.array(X), np.array(y)
\ No newline at end of file
+        X, Y = build_feature_matrix(training_data, extract)
+        return X, Y[:, 0] if len(X) else np.array([])
\ No newline at end of file
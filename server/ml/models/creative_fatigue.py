@@ -11,10 +11,18 @@ from sklearn.metrics import mean_absolute_error
 from scipy.stats import linregress
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Union
 import joblib
 import os
 
+from utils.data_processor import DataProcessor
+from utils.drift_monitor import DriftProfile, drift_monitor
+from utils.hyperparameters import get_hyperparameters
+from utils.incremental import grow_sliding_forest, load_fitted_scaler
+from utils.model_registry import model_registry
+from utils.training_matrix import build_feature_matrix, reports_peak_memory, scale_in_place
+from settings import Settings
+
 logger = logging.getLogger(__name__)
 
 class CreativeFatiguePredictor:
@@ -30,6 +38,8 @@ class CreativeFatiguePredictor:
         self.model = None
         self.scaler = StandardScaler()
         self.is_trained = False
+        self.model_version = None
+        self.drift_profile = None
         self.feature_names = [
             'ctr_trend', 'cpm_trend', 'engagement_trend', 'frequency_avg',
             'days_running', 'impressions_total', 'spend_total',
@@ -41,11 +51,24 @@ class CreativeFatiguePredictor:
         return self.is_trained or self._load_pretrained_model()
     
     def _load_pretrained_model(self) -> bool:
-        """Load pre-trained model if available"""
+        """Load the current registry version, falling back to the legacy model file"""
         try:
+            bundle = model_registry.load('creative_fatigue')
+            if bundle is not None:
+                self.model = bundle.artifacts['model']
+                self.scaler = bundle.artifacts['scaler']
+                self.drift_profile = bundle.artifacts.get('drift_profile')
+                self.model_version = bundle.version
+                self.is_trained = True
+                drift_monitor.set_reference('creative_fatigue', self.drift_profile, bundle.version,
+                                            bundle.manifest.get('created_at'))
+                logger.info(f"Loaded creative fatigue model version {bundle.version}")
+                return True
+            
             model_path = "models/creative_fatigue_model.joblib"
             if os.path.exists(model_path):
                 self.model = joblib.load(model_path)
+                self.model_version = 'legacy'
                 self.is_trained = True
                 logger.info("Loaded pre-trained creative fatigue model")
                 return True
@@ -58,14 +81,12 @@ class CreativeFatiguePredictor:
                         platform: str) -> np.ndarray:
         """Extract features for fatigue prediction"""
         
-        # Convert historical data to DataFrame
-        df = pd.DataFrame(historical_data)
+        # Parsed, date-sorted history (shared with confidence scoring)
+        df = DataProcessor.process_historical_data(historical_data)
         if len(df) < 3:
             # Not enough data for trend analysis, use defaults
             return self._get_default_features(current_metrics, platform)
         
-        df = df.sort_values('date')
-        
         # Calculate trends over last 7 days
         recent_df = df.tail(7)
         
@@ -133,7 +154,8 @@ class CreativeFatiguePredictor:
     
     def predict_fatigue(self, creative_id: str, platform: str,
                        current_metrics: Dict[str, float],
-                       historical_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+                       historical_data: List[Dict[str, Any]],
+                       use_model: bool = True) -> Dict[str, Any]:
         """
         Predict creative fatigue timeline
         
@@ -142,18 +164,20 @@ class CreativeFatiguePredictor:
             platform: Ad platform (facebook, google, etc.)
             current_metrics: Current performance metrics
             historical_data: Historical performance data
+            use_model: False serves the rule-based tier even if a model is loaded
             
         Returns:
-            Dict with prediction results
+            Dict with prediction results and the tier that produced them
         """
         
         try:
             # Extract features
             features = self.extract_features(current_metrics, historical_data, platform)
+            drift_monitor.observe('creative_fatigue', features)
             
-            if not self.is_trained:
+            if not self.is_trained or not use_model:
                 # Use rule-based prediction if no trained model
-                return self._rule_based_prediction(features, current_metrics, platform)
+                return {**self._rule_based_prediction(features, current_metrics, platform), 'tier': 'rule_based'}
             
             # Scale features
             features_scaled = self.scaler.transform(features)
@@ -176,12 +200,13 @@ class CreativeFatiguePredictor:
                 'confidence': confidence,
                 'explanation': explanation,
                 'actions': actions,
-                'risk_level': self._assess_risk_level(days_to_fatigue)
+                'risk_level': self._assess_risk_level(days_to_fatigue),
+                'tier': 'model'
             }
             
         except Exception as e:
             logger.error(f"Fatigue prediction failed for {creative_id}: {e}")
-            return self._fallback_prediction(creative_id, platform)
+            return {**self._fallback_prediction(creative_id, platform), 'tier': 'fallback'}
     
     def _rule_based_prediction(self, features: np.ndarray, 
                               current_metrics: Dict[str, float],
@@ -229,7 +254,7 @@ class CreativeFatiguePredictor:
         data_confidence = min(0.9, len(historical_data) / 14.0)
         
         # Trend stability (less variance = higher confidence)
-        df = pd.DataFrame(historical_data)
+        df = DataProcessor.process_historical_data(historical_data)
         ctr_variance = df['ctr'].var() if 'ctr' in df.columns else 0.001
         stability_confidence = 1.0 / (1.0 + ctr_variance * 1000)
         
@@ -303,6 +328,181 @@ class CreativeFatiguePredictor:
             'risk_level': "MEDIUM"
         }
     
+    def batch_predict_account(self, account_data: Union[pd.DataFrame, List[Dict[str, Any]]],
+                              platform: str = 'facebook') -> List[Dict[str, Any]]:
+        """
+        Score every creative in an ad account in one pass
+        
+        Args:
+            account_data: Long-format rows with creative_id, date, ctr, cpm,
+                impressions, spend, frequency, engagement_rate (optional
+                platform, creative_type_factor, audience_size columns)
+            platform: Platform used for rows without a platform column
+            
+        Returns:
+            Predictions ranked by fatigue risk (soonest fatigue first)
+        """
+        
+        try:
+            account_features = self._extract_account_features(account_data, platform)
+        except Exception as e:
+            logger.error(f"Account feature extraction failed: {e}")
+            return []
+        
+        if account_features.empty:
+            return []
+        
+        features = account_features[self.feature_names].to_numpy(dtype=float)
+        drift_monitor.observe('creative_fatigue', features)
+        
+        if self.is_trained:
+            try:
+                # Single model call for the whole account
+                days = self.model.predict(self.scaler.transform(features))
+                counts = account_features['days_running'].to_numpy()
+                stability = 1.0 / (1.0 + account_features['ctr_variance'].to_numpy() * 1000)
+                confidence = np.where(
+                    counts < 3, 0.4,
+                    (np.minimum(0.9, counts / 14.0) + stability) / 2.0
+                )
+                days_to_fatigue = np.maximum(1, days.astype(int))
+                explanation_days = days
+                tier = 'model'
+            except Exception as e:
+                logger.warning(f"Account model scoring failed, using rules: {e}")
+                tier = 'rule_based'
+        else:
+            tier = 'rule_based'
+        
+        if tier == 'rule_based':
+            # Vectorized _rule_based_prediction using each creative's latest metrics
+            base_cycles = {'facebook': 7, 'instagram': 5, 'google': 14, 'tiktok': 3}
+            base_days = account_features['platform'].map(base_cycles).fillna(7).to_numpy()
+            frequency_factor = np.maximum(0.5, 2.0 - (account_features['current_frequency'].to_numpy() - 1.0) * 0.3)
+            ctr_factor = np.clip(account_features['current_ctr'].to_numpy() / 0.02, 0.3, 2.0)
+            predicted = (base_days * frequency_factor * ctr_factor).astype(int)
+            days_to_fatigue = np.maximum(1, predicted)
+            explanation_days = predicted
+            confidence = np.full(len(account_features), 0.65)
+        
+        ranked = pd.DataFrame({
+            'creative_id': account_features['creative_id'].to_numpy(),
+            'platform': account_features['platform'].to_numpy(),
+            'days_to_fatigue': days_to_fatigue,
+            'explanation_days': explanation_days,
+            'confidence': confidence
+        }).sort_values(['days_to_fatigue', 'confidence'], ascending=[True, False], kind='mergesort')
+        
+        results = []
+        for rank, row in enumerate(ranked.itertuples(index=False), start=1):
+            if tier == 'model':
+                explanation = self._generate_explanation(None, row.explanation_days, row.platform)
+            else:
+                explanation = f"Based on {row.platform} typical cycles and current metrics"
+            
+            results.append({
+                'creative_id': row.creative_id,
+                'platform': row.platform,
+                'rank': rank,
+                'days_to_fatigue': int(row.days_to_fatigue),
+                'confidence': float(row.confidence),
+                'explanation': explanation,
+                'actions': self._generate_actions(row.explanation_days, {}, row.platform),
+                'risk_level': self._assess_risk_level(row.explanation_days),
+                'tier': tier
+            })
+        
+        return results
+    
+    def _extract_account_features(self, account_data: Union[pd.DataFrame, List[Dict[str, Any]]],
+                                  platform: str) -> pd.DataFrame:
+        """
+        Compute extract_features for all creatives with grouped operations
+        
+        Returns one row per creative holding the model features plus the
+        latest ctr/frequency and ctr variance used by rules and confidence.
+        """
+        
+        df = account_data.copy() if isinstance(account_data, pd.DataFrame) else pd.DataFrame(account_data)
+        if df.empty or 'creative_id' not in df.columns or 'date' not in df.columns:
+            return pd.DataFrame()
+        
+        # Same cleaning as DataProcessor.process_historical_data
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        df = df.dropna(subset=['date'])
+        for col in ['ctr', 'cpm', 'impressions', 'spend']:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            else:
+                df[col] = 0.0
+        for col in ['frequency', 'engagement_rate']:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        if 'platform' in df.columns:
+            df['platform'] = df['platform'].fillna(platform).astype(str).str.lower()
+        else:
+            df['platform'] = platform.lower()
+        
+        df = df.sort_values(['creative_id', 'date'], kind='mergesort').reset_index(drop=True)
+        grouped = df.groupby('creative_id', sort=False)
+        
+        creatives = grouped.size().rename('days_running').to_frame()
+        last = grouped.tail(1).set_index('creative_id')
+        
+        # Least-squares slopes over each creative's last 7 days
+        recent = df[grouped.cumcount(ascending=False) < 7].copy()
+        recent['x'] = recent.groupby('creative_id', sort=False).cumcount().astype(float)
+        slope_cols = {'ctr': 'ctr_trend', 'cpm': 'cpm_trend'}
+        if 'engagement_rate' in recent.columns:
+            slope_cols['engagement_rate'] = 'engagement_trend'
+        
+        recent['xx'] = recent['x'] * recent['x']
+        for col in slope_cols:
+            recent[f'xy_{col}'] = recent['x'] * recent[col]
+        sums = recent.groupby('creative_id', sort=False)[
+            ['x', 'xx', *slope_cols, *[f'xy_{col}' for col in slope_cols]]
+        ].sum()
+        k = recent.groupby('creative_id', sort=False).size()
+        denominator = (k * sums['xx'] - sums['x'] ** 2).replace(0, np.nan)
+        for col, name in slope_cols.items():
+            creatives[name] = (k * sums[f'xy_{col}'] - sums['x'] * sums[col]) / denominator
+        if 'engagement_trend' not in creatives.columns:
+            creatives['engagement_trend'] = 0.0
+        
+        if 'frequency' in df.columns:
+            creatives['frequency_avg'] = grouped['frequency'].mean().fillna(2.0)
+            creatives['current_frequency'] = last['frequency'].fillna(2.0)
+        else:
+            creatives['frequency_avg'] = 2.0
+            creatives['current_frequency'] = 2.0
+        
+        creatives['impressions_total'] = grouped['impressions'].sum()
+        creatives['spend_total'] = grouped['spend'].sum()
+        creatives['platform'] = last['platform']
+        
+        platform_factors = {'facebook': 1.0, 'instagram': 1.2, 'google': 0.8, 'tiktok': 1.5}
+        creatives['platform_factor'] = creatives['platform'].map(platform_factors).fillna(1.0)
+        
+        for col, default in [('creative_type_factor', 1.0), ('audience_size', 100000)]:
+            if col in df.columns:
+                creatives[col] = pd.to_numeric(last[col], errors='coerce').fillna(default)
+            else:
+                creatives[col] = default
+        
+        creatives['current_ctr'] = last['ctr']
+        creatives['ctr_variance'] = grouped['ctr'].var().fillna(0)
+        
+        # Too little history for trends: conservative defaults as in _get_default_features
+        short = creatives['days_running'] < 3
+        creatives.loc[short, ['ctr_trend', 'cpm_trend', 'engagement_trend']] = [-0.001, 0.05, -0.005]
+        creatives.loc[short, ['creative_type_factor', 'audience_size']] = [1.0, 100000]
+        
+        trend_cols = ['ctr_trend', 'cpm_trend', 'engagement_trend']
+        creatives[trend_cols] = creatives[trend_cols].fillna(0)
+        
+        return creatives.reset_index()
+    
+    @reports_peak_memory
     def train_model(self, training_data: List[Dict[str, Any]]) -> Dict[str, float]:
         """Train the fatigue prediction model"""
         
@@ -315,33 +515,36 @@ class CreativeFatiguePredictor:
                 return {'error': 'insufficient_data'}
             
             # Train model
-            self.model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42
-            )
+            self.model = RandomForestRegressor(**get_hyperparameters('creative_fatigue', {
+                'n_estimators': 100,
+                'max_depth': 10,
+                'random_state': 42
+            }, model_type='random_forest'))
             
-            # Scale features
-            X_scaled = self.scaler.fit_transform(X)
+            # Reference input histograms, taken before X is scaled in place
+            self.drift_profile = DriftProfile.fit(X, self.feature_names)
+            
+            # Scale features in place, fitting the scaler chunk by chunk
+            self.scaler = StandardScaler()
+            X_scaled = scale_in_place(self.scaler, X)
             
             # Train
             self.model.fit(X_scaled, y)
             self.is_trained = True
             
-            # Save model
-            os.makedirs('models', exist_ok=True)
-            joblib.dump(self.model, 'models/creative_fatigue_model.joblib')
-            joblib.dump(self.scaler, 'models/creative_fatigue_scaler.joblib')
-            
             # Calculate training metrics
             y_pred = self.model.predict(X_scaled)
             mae = mean_absolute_error(y, y_pred)
             
-            logger.info(f"Creative fatigue model trained. MAE: {mae:.2f} days")
+            # Publish new model version
+            self._publish_model({'mae': mae, 'training_samples': len(X)})
+            
+            logger.info(f"Creative fatigue model {self.model_version} trained. MAE: {mae:.2f} days")
             
             return {
                 'mae': mae,
                 'training_samples': len(X),
+                'model_version': self.model_version,
                 'model_saved': True
             }
             
@@ -349,25 +552,89 @@ class CreativeFatiguePredictor:
             logger.error(f"Model training failed: {e}")
             return {'error': str(e)}
     
-    def _prepare_training_data(self, training_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
-        """Prepare data for model training"""
+    @reports_peak_memory
+    def update_model(self, training_data: List[Dict[str, Any]]) -> Dict[str, float]:
+        """
+        Incrementally update the fatigue model on recent data
+        Grows new trees on the recent window and retires the oldest ones;
+        falls back to a full train when no trained model exists yet
         
-        X = []
-        y = []
+        Not scheduled by this service: the retraining job calls it with the
+        recent window (e.g. daily) instead of train_model on the full history.
+        """
         
-        for item in training_data:
-            try:
-                features = self.extract_features(
-                    item['current_metrics'],
-                    item['historical_data'], 
-                    item['platform']
-                )
-                
-                X.append(features.flatten())
-                y.append(item['actual_fatigue_days'])
-                
-            except Exception as e:
-                logger.warning(f"Skipping training sample: {e}")
-                continue
+        try:
+            ready = self.is_ready()
+            scaler = load_fitted_scaler(self.scaler, 'models/creative_fatigue_scaler.joblib')
+            if not ready or scaler is None:
+                return self.train_model(training_data)
+            self.scaler = scaler
+            
+            # Prepare recent data
+            X, y = self._prepare_training_data(training_data)
+            
+            if len(X) < 10:
+                logger.warning("Insufficient recent data for fatigue model update")
+                return {'error': 'insufficient_data'}
+            
+            # New trees also learn from the recent inputs
+            if self.drift_profile is not None:
+                self.drift_profile.add(X)
+            
+            # Keep the training-time scaling so existing trees stay valid
+            X_scaled = scale_in_place(self.scaler, X, fit=False)
+            
+            config = Settings.get_model_config()['incremental']
+            update = grow_sliding_forest(
+                self.model, X_scaled, y, config['new_trees'], config['max_trees']
+            )
+            
+            mae = mean_absolute_error(y, self.model.predict(X_scaled))
+            
+            # Publish new model version
+            self._publish_model({'mae': mae, 'training_samples': len(X), **update})
+            
+            logger.info(f"Creative fatigue model {self.model_version} updated incrementally. "
+                        f"MAE: {mae:.2f}, trees: {update['n_estimators']}")
+            
+            return {
+                'mae': mae,
+                'training_samples': len(X),
+                **update,
+                'model_version': self.model_version,
+                'model_saved': True
+            }
+            
+        except Exception as e:
+            logger.error(f"Creative fatigue model update failed: {e}")
+            return {'error': str(e)}
+    
+    def _publish_model(self, metrics: Dict[str, Any]) -> str:
+        """Publish the fitted model, scaler and drift profile as a new registry version"""
+        
+        artifacts = {'model': self.model, 'scaler': self.scaler}
+        if self.drift_profile is not None:
+            artifacts['drift_profile'] = self.drift_profile
+        
+        self.model_version = model_registry.publish(
+            'creative_fatigue',
+            artifacts,
+            metrics=metrics,
+            feature_schema={'n_features': len(self.feature_names), 'feature_names': self.feature_names}
+        )
+        drift_monitor.set_reference('creative_fatigue', self.drift_profile, self.model_version, datetime.now())
+        return self.model_version
+    
+    def _prepare_training_data(self, training_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Prepare data for model training as a float32 memmap"""
+        
+        def extract(item):
+            features = self.extract_features(
+                item['current_metrics'],
+                item['historical_data'], 
+                item['platform']
+            )
+            return features, (item['actual_fatigue_days'],)
         
-        return np.array(X), np.array(y)
\ No newline at end of file
+        X, Y = build_feature_matrix(training_data, extract)
+        return X, Y[:, 0] if len(X) else np.array([])
\ No newline at end of file
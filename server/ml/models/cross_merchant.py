@@ -6,17 +6,140 @@ Uses collaborative intelligence to identify opportunities
 
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics.pairwise import cosine_similarity
+from scipy.optimize import linear_sum_assignment
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Tuple, Optional
+from typing import Dict, List, Any, Tuple, Optional, Iterable, Union
 import joblib
 import os
 
+from settings import Settings
+
 logger = logging.getLogger(__name__)
 
+# Profile fields archetypes are defined on (merchant_archetypes range keys), with defaults when missing
+ARCHETYPE_FEATURES = (
+    ('monthly_orders', 'order_volume', 0.0),
+    ('avg_order_value', 'avg_order_value', 0.0),
+    ('profit_margin', 'profit_margin', 0.2)
+)
+
+MerchantProfiles = Union[pd.DataFrame, np.ndarray, List[Dict[str, Any]]]
+
+def _cluster_space(raw: np.ndarray) -> np.ndarray:
+    """Log order volume and AOV (both span orders of magnitude); margin as is"""
+    X = np.array(raw, dtype=np.float64)
+    X[:, :2] = np.log1p(np.maximum(X[:, :2], 0))
+    return X
+
+class _ArchetypeClusters:
+    """
+    Standardized MiniBatchKMeans over merchant archetype vectors, fitted batch by batch
+    
+    Centroids start at the archetype prototypes, so cluster i begins as
+    archetype i; ids maps the model's clusters to those stable archetype IDs.
+    Readers only use the (mean, scale, centers) snapshot published after each
+    batch, so classification never sees a half-updated model.
+    """
+    
+    def __init__(self, prototypes: np.ndarray, batch_size: int):
+        self.prototypes = prototypes
+        self.batch_size = batch_size
+        self.scaler = StandardScaler()
+        self.model = None
+        self.ids = np.arange(len(prototypes))
+        self.fitted_rows = 0
+        self.fitted_at = None
+        self._state = None
+        self._lock = threading.Lock()
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    @property
+    def is_fitted(self) -> bool:
+        return self._state is not None
+    
+    def partial_fit(self, X: np.ndarray):
+        """Fold a batch of cluster-space vectors into the scaler and the centroids"""
+        
+        if len(X) == 0:
+            return
+        
+        with self._lock:
+            if self.model is None:
+                if len(X) < len(self.prototypes):
+                    raise ValueError(f"First archetype batch needs at least {len(self.prototypes)} merchants")
+                self.scaler.partial_fit(X)
+                self.model = MiniBatchKMeans(
+                    n_clusters=len(self.prototypes),
+                    init=self.scaler.transform(self.prototypes),
+                    n_init=1,
+                    batch_size=self.batch_size,
+                    # Random reassignment of small clusters would break stable IDs
+                    reassignment_ratio=0.0,
+                    compute_labels=False,
+                    random_state=0
+                )
+            else:
+                # Keep the centroids where they were in cluster space as the scaling moves
+                centers = self.model.cluster_centers_ * self.scaler.scale_ + self.scaler.mean_
+                self.scaler.partial_fit(X)
+                self.model.cluster_centers_ = np.ascontiguousarray(
+                    (centers - self.scaler.mean_) / self.scaler.scale_
+                )
+            
+            Z = self.scaler.transform(X)
+            for start in range(0, len(Z), self.batch_size):
+                self.model.partial_fit(Z[start:start + self.batch_size])
+            
+            self.fitted_rows += len(X)
+            self.fitted_at = datetime.now()
+            self._publish()
+    
+    def _publish(self):
+        centers = np.empty_like(self.model.cluster_centers_)
+        centers[self.ids] = self.model.cluster_centers_
+        self._state = (self.scaler.mean_.copy(), self.scaler.scale_.copy(), centers)
+    
+    def centroids(self) -> np.ndarray:
+        """Centroids in cluster space, ordered by stable archetype ID"""
+        mean, scale, centers = self._state
+        return centers * scale + mean
+    
+    def align_to(self, previous: np.ndarray):
+        """Renumber clusters to match the nearest previous centroids one-to-one"""
+        
+        with self._lock:
+            current = self.model.cluster_centers_
+            previous_scaled = (previous - self.scaler.mean_) / self.scaler.scale_
+            cost = ((previous_scaled[:, None, :] - current[None, :, :]) ** 2).sum(axis=2)
+            stable_ids, clusters = linear_sum_assignment(cost)
+            self.ids[clusters] = stable_ids
+            self._publish()
+    
+    def assign(self, X: np.ndarray, chunk_rows: int) -> np.ndarray:
+        """Nearest-centroid stable archetype ID for every row, chunk by chunk"""
+        
+        mean, scale, centers = self._state
+        # argmin |z - c|^2 = argmin (|c|^2 - 2 z.c), so only an (n, k) product is needed
+        center_norms = (centers ** 2).sum(axis=1)
+        ids = np.empty(len(X), dtype=np.int64)
+        for start in range(0, len(X), chunk_rows):
+            Z = (X[start:start + chunk_rows] - mean) / scale
+            ids[start:start + chunk_rows] = (center_norms - 2 * Z @ centers.T).argmin(axis=1)
+        return ids
+
 class CrossMerchantIntelligence:
     """
     Provides cross-merchant insights using:
@@ -32,6 +155,9 @@ class CrossMerchantIntelligence:
         self.similarity_model = None
         self.scaler = StandardScaler()
         self.is_ready_state = False
+        self.model_version = None  # Benchmark data is not registry-versioned
+        self.archetype_config = Settings.get_archetype_config()
+        self.archetype_clusters = None  # Range rules classify until clusters are fitted
         
         # Merchant archetypes and their characteristics
         self.merchant_archetypes = {
@@ -78,6 +204,8 @@ class CrossMerchantIntelligence:
     def _initialize_intelligence(self) -> bool:
         """Initialize intelligence system with baseline data"""
         try:
+            self._load_archetype_clusters()
+            
             # Load or create baseline merchant data
             baseline_path = "data/merchant_baseline.json"
             if os.path.exists(baseline_path):
@@ -206,37 +334,148 @@ class CrossMerchantIntelligence:
     
     def _classify_merchant_archetype(self, merchant_profile: Dict[str, Any]) -> str:
         """Classify merchant into archetype based on business metrics"""
+        return str(self.classify_merchants([merchant_profile])[0])
+    
+    def classify_merchants(self, profiles: MerchantProfiles) -> np.ndarray:
+        """
+        Classify many merchants at once
         
-        order_volume = merchant_profile.get('monthly_orders', 0)
-        aov = merchant_profile.get('avg_order_value', 0)
-        margin = merchant_profile.get('profit_margin', 0.2)
-        
-        # Score each archetype
-        archetype_scores = {}
+        Uses the fitted archetype clusters (one nearest-centroid pass) when
+        available, otherwise the archetype range rules.
         
-        for archetype, criteria in self.merchant_archetypes.items():
-            score = 0
-            
-            # Order volume score
-            vol_min, vol_max = criteria['order_volume']
-            if vol_min <= order_volume <= vol_max:
-                score += 1
-            
-            # AOV score
-            aov_min, aov_max = criteria['avg_order_value']
-            if aov_min <= aov <= aov_max:
-                score += 1
-            
-            # Margin score
-            margin_min, margin_max = criteria['profit_margin']
-            if margin_min <= margin <= margin_max:
-                score += 1
+        Args:
+            profiles: Profile dicts, a DataFrame with monthly_orders /
+                avg_order_value / profit_margin columns, or an (n, 3) array
+                of those values
             
-            archetype_scores[archetype] = score
+        Returns:
+            Archetype name per merchant
+        """
+        
+        raw = self._archetype_matrix(profiles)
+        clusters = self.archetype_clusters
+        if clusters is not None and clusters.is_fitted:
+            ids = clusters.assign(_cluster_space(raw), self.archetype_config['chunk_rows'])
+        else:
+            ids = self._score_archetype_rules(raw)
+        return np.array(list(self.merchant_archetypes), dtype=object)[ids]
+    
+    def _archetype_matrix(self, profiles: MerchantProfiles) -> np.ndarray:
+        """(n, 3) raw orders / AOV / margin matrix, missing values at their defaults"""
+        
+        if isinstance(profiles, np.ndarray):
+            raw = np.array(profiles, dtype=np.float64).reshape(-1, len(ARCHETYPE_FEATURES))
+        elif isinstance(profiles, pd.DataFrame):
+            raw = np.column_stack([
+                profiles[field].to_numpy(dtype=np.float64) if field in profiles.columns
+                else np.full(len(profiles), default)
+                for field, _, default in ARCHETYPE_FEATURES
+            ]).reshape(-1, len(ARCHETYPE_FEATURES))
+        else:
+            raw = np.array([
+                [profile.get(field, default) for field, _, default in ARCHETYPE_FEATURES]
+                for profile in profiles
+            ], dtype=np.float64).reshape(-1, len(ARCHETYPE_FEATURES))
         
-        # Return archetype with highest score
-        best_archetype = max(archetype_scores.items(), key=lambda x: x[1])
-        return best_archetype[0] if best_archetype[1] > 0 else 'mid_market'
+        defaults = np.array([default for _, _, default in ARCHETYPE_FEATURES])
+        return np.where(np.isnan(raw), defaults, raw)
+    
+    def _score_archetype_rules(self, raw: np.ndarray) -> np.ndarray:
+        """Archetype index matching the most ranges per row (mid_market when none match)"""
+        
+        scores = np.zeros((len(raw), len(self.merchant_archetypes)), dtype=np.int8)
+        for index, criteria in enumerate(self.merchant_archetypes.values()):
+            for column, (_, key, _) in enumerate(ARCHETYPE_FEATURES):
+                low, high = criteria[key]
+                scores[:, index] += (raw[:, column] >= low) & (raw[:, column] <= high)
+        
+        # argmax keeps the first archetype on ties, like max() over the dict
+        best = scores.argmax(axis=1)
+        best[scores.max(axis=1) == 0] = list(self.merchant_archetypes).index('mid_market')
+        return best
+    
+    def _archetype_prototypes(self) -> np.ndarray:
+        """One cluster-space point per archetype at the centre of its ranges"""
+        
+        prototypes = []
+        for criteria in self.merchant_archetypes.values():
+            point = []
+            for _, key, _ in ARCHETYPE_FEATURES:
+                low, high = criteria[key]
+                if key == 'profit_margin':
+                    point.append((low + high) / 2)
+                else:
+                    # Geometric midpoint; open-ended ranges reach 4x their floor
+                    low = max(low, 1)
+                    high = high if np.isfinite(high) else low * 4
+                    point.append(np.sqrt(low * high))
+            prototypes.append(point)
+        return _cluster_space(np.array(prototypes))
+    
+    def partial_fit_archetypes(self, profiles: MerchantProfiles) -> int:
+        """
+        Fold another batch of merchants into the archetype clusters
+        
+        Returns:
+            Merchants fitted so far (call save_archetype_clusters to persist)
+        """
+        
+        if self.archetype_clusters is None:
+            self.archetype_clusters = _ArchetypeClusters(
+                self._archetype_prototypes(), self.archetype_config['batch_size']
+            )
+        self.archetype_clusters.partial_fit(_cluster_space(self._archetype_matrix(profiles)))
+        return self.archetype_clusters.fitted_rows
+    
+    def fit_archetypes(self, batches: Iterable[MerchantProfiles], save: bool = True) -> Dict[str, Any]:
+        """
+        Refit the archetype clusters from scratch over a stream of merchant batches
+        
+        The new clusters are matched one-to-one with the current ones by
+        centroid distance, so archetype names stay on the same clusters and a
+        merchant only changes archetype when it (or its cluster) really moved.
+        Serving keeps the current clusters until the refit is complete.
+        
+        Returns:
+            Merchants fitted and how far each archetype's centroid moved
+        """
+        
+        clusters = _ArchetypeClusters(self._archetype_prototypes(), self.archetype_config['batch_size'])
+        for batch in batches:
+            clusters.partial_fit(_cluster_space(self._archetype_matrix(batch)))
+        if not clusters.is_fitted:
+            raise ValueError("No merchants to fit archetypes on")
+        
+        previous = self.archetype_clusters
+        shift = None
+        if previous is not None and previous.is_fitted:
+            clusters.align_to(previous.centroids())
+            shift = np.linalg.norm(clusters.centroids() - previous.centroids(), axis=1)
+        
+        self.archetype_clusters = clusters
+        if save:
+            self.save_archetype_clusters()
+        
+        logger.info(f"Refit merchant archetype clusters on {clusters.fitted_rows} merchants")
+        return {
+            'merchants': clusters.fitted_rows,
+            'centroid_shift': None if shift is None else {
+                archetype: float(distance) for archetype, distance in zip(self.merchant_archetypes, shift)
+            }
+        }
+    
+    def save_archetype_clusters(self, path: Optional[str] = None):
+        path = path or self.archetype_config['model_path']
+        if self.archetype_clusters is None:
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        joblib.dump(self.archetype_clusters, path)
+    
+    def _load_archetype_clusters(self):
+        path = self.archetype_config['model_path']
+        if self.archetype_clusters is None and os.path.exists(path):
+            self.archetype_clusters = joblib.load(path)
+            logger.info(f"Loaded merchant archetype clusters ({self.archetype_clusters.fitted_rows} merchants)")
     
     def _find_similar_merchants(self, merchant_profile: Dict[str, Any], 
                               archetype: str) -> List[Dict[str, Any]]:
@@ -11,10 +11,18 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import classification_report, mean_absolute_error
 from datetime import datetime, timedelta
 import logging
-from typing import Dict, List, Any, Tuple, Optional
+from typing import Dict, List, Any, Tuple, Optional, Union
 import joblib
 import os
 
+from utils.data_processor import DataProcessor
+from utils.hyperparameters import get_hyperparameters
+from utils.drift_monitor import DriftProfile, drift_monitor
+from utils.incremental import grow_sliding_forest, load_fitted_scaler
+from utils.model_registry import model_registry
+from utils.training_matrix import build_feature_matrix, reports_peak_memory, scale_in_place
+from settings import Settings
+
 logger = logging.getLogger(__name__)
 
 class CustomerPurchasePredictor:
@@ -32,6 +40,15 @@ class CustomerPurchasePredictor:
         self.probability_model = None  # Predicts likelihood of purchase
         self.scaler = StandardScaler()
         self.is_trained = False
+        self.model_version = None
+        self.drift_profile = None
+        
+        # Order of _extract_customer_features' vector (RFM, timing, recency and behavior signals)
+        self.feature_names = [
+            'recency', 'frequency', 'monetary', 'avg_order_value', 'avg_days_between',
+            'std_days_between', 'month_variety', 'recent_purchases', 'recent_amount', 'recent_trend',
+            'email_opens_30d', 'website_visits_30d', 'product_views_30d', 'cart_abandonment_rate'
+        ]
         
         # Customer segments for behavior analysis
         self.segments = {
@@ -45,14 +62,28 @@ class CustomerPurchasePredictor:
         return self.is_trained or self._load_pretrained_model()
     
     def _load_pretrained_model(self) -> bool:
-        """Load pre-trained models if available"""
+        """Load the current registry version, falling back to the legacy model files"""
         try:
+            bundle = model_registry.load('customer_prediction')
+            if bundle is not None:
+                self.timing_model = bundle.artifacts['timing_model']
+                self.probability_model = bundle.artifacts['probability_model']
+                self.scaler = bundle.artifacts['scaler']
+                self.drift_profile = bundle.artifacts.get('drift_profile')
+                self.model_version = bundle.version
+                self.is_trained = True
+                drift_monitor.set_reference('customer_prediction', self.drift_profile, bundle.version,
+                                            bundle.manifest.get('created_at'))
+                logger.info(f"Loaded customer prediction models version {bundle.version}")
+                return True
+            
             timing_path = "models/customer_timing_model.joblib"
             prob_path = "models/customer_probability_model.joblib"
             
             if os.path.exists(timing_path) and os.path.exists(prob_path):
                 self.timing_model = joblib.load(timing_path)
                 self.probability_model = joblib.load(prob_path)
+                self.model_version = 'legacy'
                 self.is_trained = True
                 logger.info("Loaded pre-trained customer prediction models")
                 return True
@@ -62,7 +93,8 @@ class CustomerPurchasePredictor:
     
     def predict_next_purchase(self, customer_id: str, 
                             purchase_history: List[Dict[str, Any]],
-                            behavior_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                            behavior_data: Optional[Dict[str, Any]] = None,
+                            use_model: bool = True) -> Dict[str, Any]:
         """
         Predict when customer will make next purchase
         
@@ -70,28 +102,30 @@ class CustomerPurchasePredictor:
             customer_id: Unique customer identifier
             purchase_history: List of previous purchases
             behavior_data: Additional behavioral data (clicks, views, etc.)
+            use_model: False serves the rule-based tier even if a model is loaded
             
         Returns:
-            Prediction with timing, probability, and confidence
+            Prediction with timing, probability, confidence and the serving tier
         """
         
         try:
             if not purchase_history:
-                return self._new_customer_prediction(customer_id)
+                return {**self._new_customer_prediction(customer_id), 'tier': 'rule_based'}
             
             # Extract customer features
             features = self._extract_customer_features(
                 purchase_history, behavior_data
             )
+            drift_monitor.observe('customer_prediction', features)
             
             # Get customer segment
             segment = self._classify_customer_segment(purchase_history)
             
-            if not self.is_trained:
+            if not self.is_trained or not use_model:
                 # Use rule-based prediction
-                return self._rule_based_customer_prediction(
+                return {**self._rule_based_customer_prediction(
                     customer_id, purchase_history, segment, features
-                )
+                ), 'tier': 'rule_based'}
             
             # Make ML predictions
             features_scaled = self.scaler.transform(features.reshape(1, -1))
@@ -125,20 +159,19 @@ class CustomerPurchasePredictor:
                 'segment': segment,
                 'explanation': explanation,
                 'actions': actions,
-                'urgency_level': self._assess_urgency(days_to_purchase, purchase_probability)
+                'urgency_level': self._assess_urgency(days_to_purchase, purchase_probability),
+                'tier': 'model'
             }
             
         except Exception as e:
             logger.error(f"Customer prediction failed for {customer_id}: {e}")
-            return self._fallback_prediction(customer_id)
+            return {**self._fallback_prediction(customer_id), 'tier': 'fallback'}
     
     def _extract_customer_features(self, purchase_history: List[Dict[str, Any]],
                                   behavior_data: Optional[Dict[str, Any]]) -> np.ndarray:
         """Extract features for customer prediction"""
         
-        df = pd.DataFrame(purchase_history)
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date')
+        df = DataProcessor.process_dated_records(purchase_history)
         
         # RFM Analysis
         recency = (datetime.now() - df['date'].max()).days
@@ -212,7 +245,7 @@ class CustomerPurchasePredictor:
     def _classify_customer_segment(self, purchase_history: List[Dict[str, Any]]) -> str:
         """Classify customer into behavioral segment"""
         
-        df = pd.DataFrame(purchase_history)
+        df = DataProcessor.process_dated_records(purchase_history)
         total_value = df['amount'].sum()
         total_orders = len(df)
         
@@ -228,8 +261,7 @@ class CustomerPurchasePredictor:
                                       segment: str, features: np.ndarray) -> Dict[str, Any]:
         """Rule-based prediction when ML model isn't available"""
         
-        df = pd.DataFrame(purchase_history)
-        df['date'] = pd.to_datetime(df['date'])
+        df = DataProcessor.process_dated_records(purchase_history)
         
         # Calculate average purchase cycle
         if len(df) > 1:
@@ -297,8 +329,7 @@ class CustomerPurchasePredictor:
         
         # Consistent purchase patterns = higher confidence
         if len(purchase_history) >= 3:
-            df = pd.DataFrame(purchase_history)
-            df['date'] = pd.to_datetime(df['date'])
+            df = DataProcessor.process_dated_records(purchase_history)
             
             # Calculate consistency in purchase timing
             intervals = []
@@ -339,8 +370,7 @@ class CustomerPurchasePredictor:
         
         cycle_info = ""
         if len(purchase_history) > 1:
-            df = pd.DataFrame(purchase_history)
-            df['date'] = pd.to_datetime(df['date'])
+            df = DataProcessor.process_dated_records(purchase_history)
             last_purchase = (datetime.now() - df['date'].max()).days
             cycle_info = f" Last purchase was {last_purchase} days ago."
         
@@ -458,6 +488,137 @@ class CustomerPurchasePredictor:
         
         return results
     
+    def extract_store_features(self, orders: Union[pd.DataFrame, List[Dict[str, Any]]],
+                               behavior_data: Optional[Union[pd.DataFrame, List[Dict[str, Any]]]] = None,
+                               now: Optional[datetime] = None) -> Tuple[pd.Index, np.ndarray]:
+        """
+        Vectorized _extract_customer_features for every customer in a store
+        
+        Orders are sorted once by (customer, date) so each customer's history is
+        a contiguous segment; every feature is a grouped reduction over those
+        segments. Sums go through _segment_sums, which adds in the same order
+        as pandas/numpy summing one history, so the features are identical to
+        the per-customer path, not just close.
+        
+        Args:
+            orders: Flat orders table with customer_id, date, amount
+            behavior_data: Optional table keyed by customer_id with the
+                behavior_data fields (email_opens_30d, website_visits_30d,
+                product_views_30d, cart_abandonment_rate)
+            now: Reference time for recency and the 30-day window (default: now)
+            
+        Returns:
+            (customer_ids, features): ids in order of first appearance and
+            one feature row per customer
+        """
+        
+        orders_df = orders if isinstance(orders, pd.DataFrame) else pd.DataFrame(orders)
+        now = np.datetime64(now or datetime.now(), 'ns')
+        day = np.timedelta64(1, 'D')
+        
+        codes, customer_ids = pd.factorize(orders_df['customer_id'])
+        customer_ids = pd.Index(customer_ids, name='customer_id')
+        n_customers = len(customer_ids)
+        if n_customers == 0:
+            return customer_ids, np.empty((0, 14))
+        
+        dates = pd.to_datetime(orders_df['date']).to_numpy(dtype='datetime64[ns]')
+        amounts = orders_df['amount'].to_numpy()
+        
+        # Stable sort keeps same-day orders in input order, like the per-customer mergesort
+        order = np.lexsort((dates, codes))
+        codes, dates, amounts = codes[order], dates[order], amounts[order]
+        
+        counts = np.bincount(codes, minlength=n_customers)
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        
+        # RFM
+        recency = (now - dates[ends - 1]) // day
+        monetary = self._segment_sums(amounts, starts, counts)
+        avg_order_value = monetary / counts
+        
+        # Days between consecutive purchases, one run per customer with 2+ orders
+        same_customer = codes[1:] == codes[:-1]
+        gaps = ((dates[1:] - dates[:-1]) // day)[same_customer].astype(float)
+        gap_codes = codes[1:][same_customer]
+        gap_counts = counts - 1
+        
+        gap_starts = np.cumsum(gap_counts) - gap_counts
+        
+        has_gaps = gap_counts >= 1
+        mean_gap = self._segment_sums(gaps, gap_starts, gap_counts) / np.maximum(gap_counts, 1)
+        avg_days_between = np.where(has_gaps, mean_gap, 30.0)
+        
+        # np.std: population standard deviation around the same mean
+        squared = (gaps - mean_gap[gap_codes]) ** 2
+        spread = np.sqrt(self._segment_sums(squared, gap_starts, gap_counts) / np.maximum(gap_counts, 1))
+        std_days_between = np.where(gap_counts >= 2, spread, 15.0)
+        
+        # Seasonal variety: distinct purchase months
+        months = pd.DatetimeIndex(dates).month.to_numpy()
+        customer_months = np.unique(codes.astype(np.int64) * 12 + (months - 1))
+        month_variety = np.bincount(customer_months // 12, minlength=n_customers) / 12.0
+        
+        # Last 30 days: a suffix of each date-sorted segment
+        recent = dates >= now - np.timedelta64(30, 'D')
+        recent_purchases = np.bincount(codes[recent], minlength=n_customers)
+        recent_amount = self._segment_sums(
+            amounts[recent], np.cumsum(recent_purchases) - recent_purchases, recent_purchases
+        )
+        
+        # Trend over the last three orders (customers with 3+ orders)
+        recent_trend = np.zeros(n_customers)
+        has_trend = counts >= 3
+        if has_trend.any():
+            last_three = amounts[ends[has_trend, None] + np.array([-3, -2, -1])].astype(float)
+            slope = np.polyfit(np.arange(3), last_three.T, 1)[0]
+            recent_trend[has_trend] = slope / (last_three.sum(axis=1) / 3)
+        
+        behavior_columns = ['email_opens_30d', 'website_visits_30d', 'product_views_30d', 'cart_abandonment_rate']
+        behavior = np.zeros((n_customers, len(behavior_columns)))
+        if behavior_data is not None and len(behavior_data) > 0:
+            behavior_df = behavior_data if isinstance(behavior_data, pd.DataFrame) else pd.DataFrame(behavior_data)
+            behavior = (behavior_df.drop_duplicates('customer_id', keep='last')
+                        .set_index('customer_id')
+                        .reindex(index=customer_ids, columns=behavior_columns)
+                        .fillna(0)
+                        .to_numpy(dtype=float))
+        
+        features = np.column_stack([
+            recency,
+            counts,
+            monetary,
+            avg_order_value,
+            avg_days_between,
+            std_days_between,
+            month_variety,
+            recent_purchases,
+            recent_amount,
+            recent_trend,
+            behavior
+        ]).astype(float)
+        
+        return customer_ids, features
+    
+    @staticmethod
+    def _segment_sums(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """
+        Sum of each contiguous segment values[start:start + length]
+        
+        Segments of equal length are gathered into one matrix and summed along
+        rows, which numpy does with the same pairwise order as summing each
+        segment on its own. np.add.reduceat would add strictly left to right
+        and drift from the per-customer results in the last bits.
+        """
+        
+        sums = np.zeros(len(lengths), dtype=np.result_type(values, float))
+        for length in np.unique(lengths[lengths > 0]):
+            rows = np.flatnonzero(lengths == length)
+            sums[rows] = values[starts[rows, None] + np.arange(length)].sum(axis=1)
+        return sums
+    
+    @reports_peak_memory
     def train_model(self, training_data: List[Dict[str, Any]]) -> Dict[str, float]:
         """Train the customer prediction models"""
         
@@ -469,23 +630,26 @@ class CustomerPurchasePredictor:
                 logger.warning("Insufficient training data for customer prediction models")
                 return {'error': 'insufficient_data'}
             
+            # Tuned on the timing target only; the probability forest reuses them (see tuning.SHARED_PARAMS)
+            hyperparameters = get_hyperparameters('customer_prediction', {
+                'n_estimators': 100,
+                'max_depth': 10,
+                'random_state': 42
+            }, model_type='random_forest')
+            
             # Train timing model (regression)
-            self.timing_model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42
-            )
+            self.timing_model = RandomForestRegressor(**hyperparameters)
             
             # Train probability model (classification)
-            self.probability_model = RandomForestClassifier(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42
-            )
+            self.probability_model = RandomForestClassifier(**hyperparameters)
             
-            # Scale features
-            X_timing_scaled = self.scaler.fit_transform(X_timing)
-            X_prob_scaled = self.scaler.transform(X_prob)
+            # Reference input histograms, taken before the matrix is scaled in place
+            self.drift_profile = DriftProfile.fit(X_timing, self.feature_names)
+            
+            # Scale the shared feature matrix in place, fitting the scaler chunk by chunk
+            self.scaler = StandardScaler()
+            X_timing_scaled = scale_in_place(self.scaler, X_timing)
+            X_prob_scaled = X_timing_scaled if X_prob is X_timing else scale_in_place(self.scaler, X_prob, fit=False)
             
             # Train models
             self.timing_model.fit(X_timing_scaled, y_timing)
@@ -496,17 +660,15 @@ class CustomerPurchasePredictor:
             # Calculate metrics
             timing_mae = mean_absolute_error(y_timing, self.timing_model.predict(X_timing_scaled))
             
-            # Save models
-            os.makedirs('models', exist_ok=True)
-            joblib.dump(self.timing_model, 'models/customer_timing_model.joblib')
-            joblib.dump(self.probability_model, 'models/customer_probability_model.joblib')
-            joblib.dump(self.scaler, 'models/customer_scaler.joblib')
+            # Publish new model version
+            self._publish_model({'timing_mae': timing_mae, 'training_samples': len(X_timing)}, X_timing.shape[1])
             
-            logger.info(f"Customer prediction models trained. Timing MAE: {timing_mae:.2f} days")
+            logger.info(f"Customer prediction models {self.model_version} trained. Timing MAE: {timing_mae:.2f} days")
             
             return {
                 'timing_mae': timing_mae,
                 'training_samples': len(X_timing),
+                'model_version': self.model_version,
                 'models_saved': True
             }
             
@@ -514,30 +676,108 @@ class CustomerPurchasePredictor:
             logger.error(f"Customer model training failed: {e}")
             return {'error': str(e)}
     
+    @reports_peak_memory
+    def update_model(self, training_data: List[Dict[str, Any]]) -> Dict[str, float]:
+        """
+        Incrementally update both customer models on recent data
+        Grows new trees on the recent window and retires the oldest ones;
+        falls back to a full train when no trained models exist yet
+        
+        Not scheduled by this service: the retraining job calls it with the
+        recent window (e.g. daily) instead of train_model on the full history.
+        """
+        
+        try:
+            ready = self.is_ready()
+            scaler = load_fitted_scaler(self.scaler, 'models/customer_scaler.joblib')
+            if not ready or scaler is None:
+                return self.train_model(training_data)
+            self.scaler = scaler
+            
+            # Prepare recent data
+            X_timing, y_timing, X_prob, y_prob = self._prepare_training_data(training_data)
+            
+            if len(X_timing) < 20:
+                logger.warning("Insufficient recent data for customer model update")
+                return {'error': 'insufficient_data'}
+            
+            # New trees also learn from the recent inputs
+            if self.drift_profile is not None:
+                self.drift_profile.add(X_timing)
+            
+            # Keep the training-time scaling so existing trees stay valid
+            X_timing_scaled = scale_in_place(self.scaler, X_timing, fit=False)
+            X_prob_scaled = X_timing_scaled if X_prob is X_timing else scale_in_place(self.scaler, X_prob, fit=False)
+            
+            config = Settings.get_model_config()['incremental']
+            timing_update = grow_sliding_forest(
+                self.timing_model, X_timing_scaled, y_timing, config['new_trees'], config['max_trees']
+            )
+            probability_update = grow_sliding_forest(
+                self.probability_model, X_prob_scaled, y_prob, config['new_trees'], config['max_trees']
+            )
+            
+            timing_mae = mean_absolute_error(y_timing, self.timing_model.predict(X_timing_scaled))
+            
+            # Publish new model version
+            self._publish_model({
+                'timing_mae': timing_mae,
+                'training_samples': len(X_timing),
+                'timing_update': timing_update,
+                'probability_update': probability_update
+            }, X_timing.shape[1])
+            
+            logger.info(f"Customer prediction models {self.model_version} updated incrementally. "
+                        f"Timing MAE: {timing_mae:.2f} days")
+            
+            return {
+                'timing_mae': timing_mae,
+                'training_samples': len(X_timing),
+                'timing_update': timing_update,
+                'probability_update': probability_update,
+                'model_version': self.model_version,
+                'models_saved': True
+            }
+            
+        except Exception as e:
+            logger.error(f"Customer model update failed: {e}")
+            return {'error': str(e)}
+    
+    def _publish_model(self, metrics: Dict[str, Any], n_features: int) -> str:
+        """Publish both fitted models, the scaler and the drift profile as a new registry version"""
+        
+        artifacts = {
+            'timing_model': self.timing_model,
+            'probability_model': self.probability_model,
+            'scaler': self.scaler
+        }
+        if self.drift_profile is not None:
+            artifacts['drift_profile'] = self.drift_profile
+        
+        self.model_version = model_registry.publish(
+            'customer_prediction',
+            artifacts,
+            metrics=metrics,
+            feature_schema={'n_features': n_features, 'feature_names': self.feature_names}
+        )
+        drift_monitor.set_reference('customer_prediction', self.drift_profile, self.model_version, datetime.now())
+        return self.model_version
+    
     def _prepare_training_data(self, training_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
-        """Prepare training data for both models"""
+        """
+        Prepare training data for both models
+        Both models use the same features, so one float32 memmap is returned for both
+        """
         
-        X_timing = []
-        y_timing = []
-        X_prob = []
-        y_prob = []
+        def extract(item):
+            features = self._extract_customer_features(
+                item['purchase_history'],
+                item.get('behavior_data')
+            )
+            return features, (item['actual_days_to_next_purchase'], 1 if item['did_purchase'] else 0)
         
-        for item in training_data:
-            try:
-                features = self._extract_customer_features(
-                    item['purchase_history'],
-                    item.get('behavior_data')
-                )
-                
-                X_timing.append(features)
-                y_timing.append(item['actual_days_to_next_purchase'])
-                
-                X_prob.append(features)
-                y_prob.append(1 if item['did_purchase'] else 0)
-                
-            except Exception as e:
-                logger.warning(f"Skipping training sample: {e}")
-                continue
+        X, Y = build_feature_matrix(training_data, extract)
+        if len(X) == 0:
+            return X, np.array([]), X, np.array([])
         
-        return (np.array(X_timing), np.array(y_timing), 
-                np.array(X_prob), np.array(y_prob))
\ No newline at end of file
+        return X, Y[:, 0], X, Y[:, 1].astype(int)
\ No newline at end of file
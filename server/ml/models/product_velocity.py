@@ -11,11 +11,19 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_absolute_error
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Tuple, Optional
+from typing import Dict, List, Any, Tuple, Optional, Union
 import joblib
 import os
 from scipy import stats
 
+from utils.calendar_table import calendar_table
+from utils.data_processor import DataProcessor
+from utils.hyperparameters import get_hyperparameters
+from utils.incremental import grow_sliding_forest, load_fitted_scaler
+from utils.model_registry import model_registry
+from utils.training_matrix import build_feature_matrix, reports_peak_memory, scale_in_place
+from settings import Settings
+
 logger = logging.getLogger(__name__)
 
 class ProductVelocityPredictor:
@@ -33,6 +41,7 @@ class ProductVelocityPredictor:
         self.velocity_model = None
         self.scaler = StandardScaler()
         self.is_trained = False
+        self.model_version = None
         
         # Product categories with different velocity patterns
         self.category_patterns = {
@@ -56,11 +65,21 @@ class ProductVelocityPredictor:
         return self.is_trained or self._load_pretrained_model()
     
     def _load_pretrained_model(self) -> bool:
-        """Load pre-trained model if available"""
+        """Load the current registry version, falling back to the legacy model file"""
         try:
+            bundle = model_registry.load('product_velocity')
+            if bundle is not None:
+                self.velocity_model = bundle.artifacts['model']
+                self.scaler = bundle.artifacts['scaler']
+                self.model_version = bundle.version
+                self.is_trained = True
+                logger.info(f"Loaded product velocity model version {bundle.version}")
+                return True
+            
             model_path = "models/product_velocity_model.joblib"
             if os.path.exists(model_path):
                 self.velocity_model = joblib.load(model_path)
+                self.model_version = 'legacy'
                 self.is_trained = True
                 logger.info("Loaded pre-trained product velocity model")
                 return True
@@ -69,7 +88,8 @@ class ProductVelocityPredictor:
         return False
     
     def predict_velocity(self, product_id: str, product_data: Dict[str, Any],
-                        market_data: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+                        market_data: Optional[List[Dict[str, Any]]] = None,
+                        use_model: bool = True) -> Dict[str, Any]:
         """
         Predict product velocity and demand trends
         
@@ -77,9 +97,10 @@ class ProductVelocityPredictor:
             product_id: Unique product identifier
             product_data: Product information and sales history
             market_data: External market trend data
+            use_model: False serves the rule-based tier even if a model is loaded
             
         Returns:
-            Velocity prediction with direction, magnitude, and timing
+            Velocity prediction with direction, magnitude, timing and the serving tier
         """
         
         try:
@@ -89,11 +110,11 @@ class ProductVelocityPredictor:
             # Get product category for pattern matching
             category = product_data.get('category', 'general')
             
-            if not self.is_trained:
+            if not self.is_trained or not use_model:
                 # Use rule-based prediction
-                return self._rule_based_velocity_prediction(
+                return {**self._rule_based_velocity_prediction(
                     product_id, product_data, category, features
-                )
+                ), 'tier': 'rule_based'}
             
             # Make ML prediction
             features_scaled = self.scaler.transform(features.reshape(1, -1))
@@ -130,12 +151,13 @@ class ProductVelocityPredictor:
                 'confidence': confidence,
                 'explanation': explanation,
                 'actions': actions,
-                'risk_level': self._assess_risk_level(velocity_change, confidence)
+                'risk_level': self._assess_risk_level(velocity_change, confidence),
+                'tier': 'model'
             }
             
         except Exception as e:
             logger.error(f"Velocity prediction failed for {product_id}: {e}")
-            return self._fallback_prediction(product_id)
+            return {**self._fallback_prediction(product_id), 'tier': 'fallback'}
     
     def _extract_velocity_features(self, product_data: Dict[str, Any],
                                   market_data: Optional[List[Dict[str, Any]]]) -> np.ndarray:
@@ -150,9 +172,7 @@ class ProductVelocityPredictor:
         # Sales history analysis
         sales_history = product_data.get('sales_history', [])
         if sales_history and len(sales_history) >= 7:
-            df = pd.DataFrame(sales_history)
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.sort_values('date')
+            df = DataProcessor.process_dated_records(sales_history)
             
             # Calculate trends
             recent_trend = self._calculate_sales_trend(df.tail(14))
@@ -232,14 +252,13 @@ class ProductVelocityPredictor:
         if len(df) < 30:
             return 1.0
         
-        # Simple seasonal analysis based on day of week and month
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['month'] = df['date'].dt.month
+        # Simple seasonal analysis based on month
+        month = calendar_table.take(df['date'], ['month'])['month']
         
         # Current month factor
         current_month = datetime.now().month
-        if current_month in df['month'].values:
-            current_month_sales = df[df['month'] == current_month]['units_sold'].mean()
+        if current_month in month:
+            current_month_sales = df.loc[month == current_month, 'units_sold'].mean()
             overall_avg = df['units_sold'].mean()
             return current_month_sales / overall_avg if overall_avg > 0 else 1.0
         
@@ -485,6 +504,290 @@ class ProductVelocityPredictor:
         
         return results
     
+    def predict_catalog(self, products: Union[pd.DataFrame, List[Dict[str, Any]]],
+                        sales: Union[pd.DataFrame, List[Dict[str, Any]]],
+                        market_data: Optional[Union[pd.DataFrame, List[Dict[str, Any]]]] = None,
+                        chunk_size: int = 20000) -> pd.DataFrame:
+        """
+        Predict velocity for a whole catalog from one long sales table
+        
+        Args:
+            products: One row per product with product_id and the product_data
+                fields (units_sold_30d, price, inventory, days_since_launch,
+                category, competitive_products, price_percentile); for a
+                repeated product_id the last row wins
+            sales: Long sales table with product_id, date, units_sold
+            market_data: Optional long table keyed by product_id; the latest
+                row per product supplies the market trend features
+            chunk_size: Products processed per chunk, bounding peak memory
+            
+        Returns:
+            DataFrame with one prediction row per product
+        """
+        
+        products_df = products.copy() if isinstance(products, pd.DataFrame) else pd.DataFrame(products)
+        if products_df.empty:
+            return pd.DataFrame()
+        products_df = products_df.drop_duplicates('product_id', keep='last').reset_index(drop=True)
+        
+        features, history_lengths = self._extract_catalog_features(
+            products_df, sales, market_data, chunk_size
+        )
+        
+        category = products_df['category'].fillna('general').to_numpy() \
+            if 'category' in products_df.columns else np.full(len(products_df), 'general', dtype=object)
+        has_market = market_data is not None and len(market_data) > 0
+        
+        tier = 'rule_based'
+        if self.is_trained:
+            try:
+                # Single model call for the whole catalog
+                velocity_change = self.velocity_model.predict(self.scaler.transform(features))
+                confidence = self._catalog_confidence(products_df, history_lengths, features, has_market)
+                tier = 'model'
+            except Exception as e:
+                logger.warning(f"Catalog model scoring failed, using rules: {e}")
+        
+        if tier == 'rule_based':
+            velocity_change = self._catalog_rule_based_change(features, category)
+            confidence = np.full(len(products_df), 0.6)
+        
+        magnitude = np.abs(velocity_change)
+        direction = np.where(velocity_change > 0.05, 'upward',
+                             np.where(velocity_change < -0.05, 'downward', 'stable'))
+        risk_level = np.where((magnitude > 0.3) | (confidence < 0.5), 'HIGH',
+                              np.where((magnitude > 0.15) | (confidence < 0.7), 'MEDIUM', 'LOW'))
+        
+        return pd.DataFrame({
+            'product_id': products_df['product_id'].to_numpy(),
+            'velocity_change': velocity_change,
+            'direction': direction,
+            'magnitude': magnitude,
+            'timeframe': self._catalog_timeframes(category, magnitude),
+            'confidence': confidence,
+            'risk_level': risk_level,
+            'tier': tier
+        })
+    
+    def _extract_catalog_features(self, products_df: pd.DataFrame,
+                                  sales: Union[pd.DataFrame, List[Dict[str, Any]]],
+                                  market_data: Optional[Union[pd.DataFrame, List[Dict[str, Any]]]],
+                                  chunk_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized _extract_velocity_features for every product in the catalog"""
+        
+        n_products = len(products_df)
+        
+        def column(name: str, default: Any) -> np.ndarray:
+            if name not in products_df.columns:
+                return np.full(n_products, default, dtype=float)
+            return pd.to_numeric(products_df[name], errors='coerce').fillna(default).to_numpy(dtype=float)
+        
+        current_velocity = column('units_sold_30d', 0) / 30.0
+        inventory_level = column('inventory', 0)
+        days_since_launch = column('days_since_launch', 365)
+        
+        recent_trend, velocity_variance, seasonal_factor, history_lengths = self._catalog_sales_features(
+            products_df['product_id'], sales, chunk_size
+        )
+        
+        default_pattern = {'seasonality': 0.5, 'trend_sensitivity': 0.5, 'lifecycle': 365}
+        category = products_df['category'].fillna('general') if 'category' in products_df.columns \
+            else pd.Series('general', index=products_df.index)
+        patterns = pd.DataFrame(
+            [self.category_patterns.get(c, default_pattern) for c in category.unique()],
+            index=category.unique()
+        ).reindex(category.to_numpy())
+        
+        lifecycle_position = np.minimum(1.0, days_since_launch / patterns['lifecycle'].to_numpy())
+        
+        # Zero velocity: treat any stock as full pressure instead of dividing by zero
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inventory_pressure = inventory_level / (current_velocity * 30)
+        inventory_pressure = np.clip(np.nan_to_num(inventory_pressure, nan=0.0, posinf=1.0), 0.0, 1.0)
+        
+        market_features = self._catalog_market_features(products_df['product_id'], market_data)
+        
+        features = np.column_stack([
+            current_velocity,
+            recent_trend,
+            velocity_variance,
+            seasonal_factor,
+            lifecycle_position,
+            inventory_pressure,
+            column('price_percentile', 0.5),
+            column('competitive_products', 0),
+            patterns['seasonality'].to_numpy(dtype=float),
+            patterns['trend_sensitivity'].to_numpy(dtype=float),
+            market_features
+        ])
+        
+        return features, history_lengths
+    
+    def _catalog_sales_features(self, product_ids: pd.Series,
+                                sales: Union[pd.DataFrame, List[Dict[str, Any]]],
+                                chunk_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Trend, variance and seasonal factor per product from the long sales table
+        
+        Sales are sorted once by (product, date) and processed in product chunks,
+        so intermediate arrays stay proportional to chunk_size products.
+        """
+        
+        n_products = len(product_ids)
+        recent_trend = np.zeros(n_products)
+        velocity_variance = np.ones(n_products)
+        seasonal_factor = np.ones(n_products)
+        history_lengths = np.zeros(n_products, dtype=np.int64)
+        
+        sales_df = sales if isinstance(sales, pd.DataFrame) else pd.DataFrame(sales)
+        if sales_df.empty:
+            return recent_trend, velocity_variance, seasonal_factor, history_lengths
+        
+        codes = pd.Index(product_ids).get_indexer(sales_df['product_id'])
+        dates = pd.to_datetime(sales_df['date']).to_numpy()
+        units = pd.to_numeric(sales_df['units_sold'], errors='coerce').to_numpy(dtype=float)
+        
+        valid = codes >= 0
+        codes, dates, units = codes[valid], dates[valid], units[valid]
+        order = np.lexsort((dates, codes))
+        codes, dates, units = codes[order], dates[order], units[order]
+        
+        current_month = datetime.now().month
+        boundaries = np.searchsorted(codes, np.arange(0, n_products + chunk_size, chunk_size))
+        
+        for chunk_index in range(len(boundaries) - 1):
+            lo, hi = boundaries[chunk_index], boundaries[chunk_index + 1]
+            if lo == hi:
+                continue
+            
+            first = chunk_index * chunk_size
+            size = min(chunk_size, n_products - first)
+            local = codes[lo:hi] - first
+            y = units[lo:hi]
+            
+            counts = np.bincount(local, minlength=size)
+            ends = np.cumsum(counts)
+            starts = ends - counts
+            position = np.arange(hi - lo) - starts[local]
+            from_end = counts[local] - position - 1
+            
+            # Sales variance (ddof=1) and mean over the full history
+            sums = np.bincount(local, weights=y, minlength=size)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                means = sums / counts
+                variance = np.bincount(local, weights=(y - means[local]) ** 2, minlength=size) / (counts - 1)
+            
+            # Least-squares trend over the last 14 days, normalized by its mean
+            in_tail = from_end < 14
+            tail_local = local[in_tail]
+            tail_y = y[in_tail]
+            k = np.minimum(counts, 14).astype(float)
+            x = (position - (counts[local] - k[local]))[in_tail]
+            sx = np.bincount(tail_local, weights=x, minlength=size)
+            sy = np.bincount(tail_local, weights=tail_y, minlength=size)
+            sxx = np.bincount(tail_local, weights=x * x, minlength=size)
+            sxy = np.bincount(tail_local, weights=x * tail_y, minlength=size)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                slope = (k * sxy - sx * sy) / (k * sxx - sx ** 2)
+                tail_mean = sy / k
+                trend = np.where(tail_mean > 0, slope / tail_mean, 0.0)
+            
+            # Current month average vs overall average (histories of 30+ days)
+            in_month = calendar_table.take(dates[lo:hi], ['month'])['month'] == current_month
+            month_counts = np.bincount(local[in_month], minlength=size)
+            month_sums = np.bincount(local[in_month], weights=y[in_month], minlength=size)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                month_factor = np.where((month_counts > 0) & (means > 0),
+                                        (month_sums / month_counts) / means, 1.0)
+            
+            enough_history = counts >= 7
+            target = slice(first, first + size)
+            history_lengths[target] = counts
+            recent_trend[target] = np.where(enough_history, np.nan_to_num(trend), 0.0)
+            velocity_variance[target] = np.where(enough_history, variance, 1.0)
+            seasonal_factor[target] = np.where(enough_history & (counts >= 30), month_factor, 1.0)
+        
+        return recent_trend, velocity_variance, seasonal_factor, history_lengths
+    
+    def _catalog_market_features(self, product_ids: pd.Series,
+                                 market_data: Optional[Union[pd.DataFrame, List[Dict[str, Any]]]]) -> np.ndarray:
+        """Latest market trend indicators per product (zeros when absent)"""
+        
+        market_columns = ['search_volume_change', 'social_mentions_change',
+                          'competitor_price_change', 'market_demand_change']
+        market_features = np.zeros((len(product_ids), len(market_columns)))
+        
+        if market_data is None or len(market_data) == 0:
+            return market_features
+        
+        market_df = market_data if isinstance(market_data, pd.DataFrame) else pd.DataFrame(market_data)
+        if 'date' in market_df.columns:
+            market_df = market_df.sort_values('date', kind='mergesort')
+        latest = market_df.groupby('product_id', sort=False).tail(1).set_index('product_id')
+        latest = latest.reindex(product_ids.to_numpy())
+        
+        for i, col in enumerate(market_columns):
+            if col in latest.columns:
+                market_features[:, i] = pd.to_numeric(latest[col], errors='coerce').fillna(0).to_numpy()
+        
+        return market_features
+    
+    def _catalog_rule_based_change(self, features: np.ndarray, category: np.ndarray) -> np.ndarray:
+        """Vectorized _rule_based_velocity_prediction velocity change"""
+        
+        recent_trend = features[:, 1]
+        seasonal_factor = features[:, 3]
+        lifecycle_position = features[:, 4]
+        
+        velocity_change = recent_trend * 0.5
+        velocity_change = np.where(lifecycle_position > 0.8, velocity_change * 0.7,
+                                   np.where(lifecycle_position < 0.3, velocity_change * 1.3, velocity_change))
+        velocity_change = velocity_change * seasonal_factor
+        
+        category_multipliers = {
+            'fashion': 1.2,
+            'electronics': 0.8,
+            'beauty': 1.1,
+            'home': 0.6,
+            'sports': 0.9
+        }
+        
+        return velocity_change * pd.Series(category).map(category_multipliers).fillna(1.0).to_numpy()
+    
+    def _catalog_confidence(self, products_df: pd.DataFrame, history_lengths: np.ndarray,
+                            features: np.ndarray, has_market: bool) -> np.ndarray:
+        """Vectorized _calculate_confidence"""
+        
+        confidence = np.select(
+            [history_lengths >= 60, history_lengths >= 30, history_lengths >= 14],
+            [0.9, 0.75, 0.6],
+            default=0.5
+        )
+        
+        if has_market:
+            confidence = confidence * 1.1
+        
+        days_since_launch = pd.to_numeric(products_df['days_since_launch'], errors='coerce').fillna(365).to_numpy() \
+            if 'days_since_launch' in products_df.columns else np.full(len(products_df), 365.0)
+        confidence = confidence * np.select([days_since_launch > 180, days_since_launch < 30], [1.1, 0.8], default=1.0)
+        
+        velocity_variance = features[:, 2]
+        confidence = confidence * np.select([velocity_variance < 0.5, velocity_variance > 2.0], [1.1, 0.9], default=1.0)
+        
+        return np.minimum(0.95, confidence)
+    
+    def _catalog_timeframes(self, category: np.ndarray, magnitude: np.ndarray) -> np.ndarray:
+        """Vectorized _determine_timeframe"""
+        
+        band = np.where(magnitude > 0.3, 'high', np.where(magnitude > 0.15, 'medium', 'low'))
+        lookup = {
+            (c, b): self._determine_timeframe(c, {'high': 0.5, 'medium': 0.2, 'low': 0.0}[b])
+            for c in pd.unique(category) for b in ('high', 'medium', 'low')
+        }
+        
+        return np.array([lookup[key] for key in zip(category, band)], dtype=object)
+    
+    @reports_peak_memory
     def train_model(self, training_data: List[Dict[str, Any]]) -> Dict[str, float]:
         """Train the velocity prediction model"""
         
@@ -497,14 +800,15 @@ class ProductVelocityPredictor:
                 return {'error': 'insufficient_data'}
             
             # Create and train model
-            self.velocity_model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42
-            )
+            self.velocity_model = RandomForestRegressor(**get_hyperparameters('product_velocity', {
+                'n_estimators': 100,
+                'max_depth': 10,
+                'random_state': 42
+            }, model_type='random_forest'))
             
-            # Scale features
-            X_scaled = self.scaler.fit_transform(X)
+            # Scale features in place, fitting the scaler chunk by chunk
+            self.scaler = StandardScaler()
+            X_scaled = scale_in_place(self.scaler, X)
             
             # Train model
             self.velocity_model.fit(X_scaled, y)
@@ -514,16 +818,15 @@ class ProductVelocityPredictor:
             y_pred = self.velocity_model.predict(X_scaled)
             mae = mean_absolute_error(y, y_pred)
             
-            # Save model
-            os.makedirs('models', exist_ok=True)
-            joblib.dump(self.velocity_model, 'models/product_velocity_model.joblib')
-            joblib.dump(self.scaler, 'models/product_velocity_scaler.joblib')
+            # Publish new model version
+            self._publish_model({'mae': mae, 'training_samples': len(X)}, X.shape[1])
             
-            logger.info(f"Product velocity model trained. MAE: {mae:.3f}")
+            logger.info(f"Product velocity model {self.model_version} trained. MAE: {mae:.3f}")
             
             return {
                 'mae': mae,
                 'training_samples': len(X),
+                'model_version': self.model_version,
                 'model_saved': True
             }
             
@@ -531,24 +834,79 @@ class ProductVelocityPredictor:
             logger.error(f"Velocity model training failed: {e}")
             return {'error': str(e)}
     
-    def _prepare_training_data(self, training_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
-        """Prepare training data for velocity model"""
+    @reports_peak_memory
+    def update_model(self, training_data: List[Dict[str, Any]]) -> Dict[str, float]:
+        """
+        Incrementally update the velocity model on recent data
+        Grows new trees on the recent window and retires the oldest ones;
+        falls back to a full train when no trained model exists yet
         
-        X = []
-        y = []
+        Not scheduled by this service: the retraining job calls it with the
+        recent window (e.g. daily) instead of train_model on the full history.
+        """
         
-        for item in training_data:
-            try:
-                features = self._extract_velocity_features(
-                    item['product_data'],
-                    item.get('market_data')
-                )
-                
-                X.append(features)
-                y.append(item['actual_velocity_change'])
-                
-            except Exception as e:
-                logger.warning(f"Skipping training sample: {e}")
-                continue
+        try:
+            ready = self.is_ready()
+            scaler = load_fitted_scaler(self.scaler, 'models/product_velocity_scaler.joblib')
+            if not ready or scaler is None:
+                return self.train_model(training_data)
+            self.scaler = scaler
+            
+            # Prepare recent data
+            X, y = self._prepare_training_data(training_data)
+            
+            if len(X) < 20:
+                logger.warning("Insufficient recent data for velocity model update")
+                return {'error': 'insufficient_data'}
+            
+            # Keep the training-time scaling so existing trees stay valid
+            X_scaled = scale_in_place(self.scaler, X, fit=False)
+            
+            config = Settings.get_model_config()['incremental']
+            update = grow_sliding_forest(
+                self.velocity_model, X_scaled, y, config['new_trees'], config['max_trees']
+            )
+            
+            mae = mean_absolute_error(y, self.velocity_model.predict(X_scaled))
+            
+            # Publish new model version
+            self._publish_model({'mae': mae, 'training_samples': len(X), **update}, X.shape[1])
+            
+            logger.info(f"Product velocity model {self.model_version} updated incrementally. "
+                        f"MAE: {mae:.3f}, trees: {update['n_estimators']}")
+            
+            return {
+                'mae': mae,
+                'training_samples': len(X),
+                **update,
+                'model_version': self.model_version,
+                'model_saved': True
+            }
+            
+        except Exception as e:
+            logger.error(f"Product velocity model update failed: {e}")
+            return {'error': str(e)}
+    
+    def _publish_model(self, metrics: Dict[str, Any], n_features: int) -> str:
+        """Publish the fitted model and scaler as a new registry version"""
+        
+        self.model_version = model_registry.publish(
+            'product_velocity',
+            {'model': self.velocity_model, 'scaler': self.scaler},
+            metrics=metrics,
+            feature_schema={'n_features': n_features}
+        )
+        return self.model_version
+    
+    def _prepare_training_data(self, training_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Prepare training data for velocity model as a float32 memmap"""
+        
+        def extract(item):
+            features = self._extract_velocity_features(
+                item['product_data'],
+                item.get('market_data')
+            )
+            return features, (item['actual_velocity_change'],)
         
-        return np.array(X), np.array(y)
\ No newline at end of file
+        X, Y = build_feature_matrix(training_data, extract)
+        return X, Y[:, 0] if len(X) else np.array([])
\ No newline at end of file
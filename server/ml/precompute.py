@@ -0,0 +1,388 @@
+"""
+Slay Season Prediction Engine - Precompute Pipeline
+Runs every enabled predictor for all active merchants ahead of page load
+"""
+
+import glob
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from settings import Settings
+from utils.metric_snapshots import MetricSnapshotReader
+from utils.model_registry import model_registry
+from utils.results_store import ResultsStore
+
+logger = logging.getLogger(__name__)
+
+# Maps Settings enabled_predictions keys to result keys used by /batch-predictions
+PREDICTION_TYPES = {
+    'creative_fatigue': 'creative_fatigue',
+    'budget_optimization': 'budget_optimization',
+    'customer_prediction': 'customer_predictions',
+    'product_velocity': 'product_velocity',
+    'cross_merchant': 'cross_merchant'
+}
+
+class MerchantSource(ABC):
+    """Enumerates active merchants and loads their prediction inputs"""
+    
+    @abstractmethod
+    def list_active_merchants(self) -> List[str]:
+        ...
+    
+    @abstractmethod
+    def load_merchant_data(self, merchant_id: str) -> Optional[Dict[str, Any]]:
+        """Return a payload shaped like the /batch-predictions request body"""
+    
+    def data_version(self, merchant_id: str) -> Optional[str]:
+        """Cheap version tag that changes whenever the merchant's data changes"""
+        return None
+
+class DirectoryMerchantSource(MerchantSource):
+    """
+    Reads one JSON payload per merchant from a directory ({merchant_id}.json).
+    Nothing in this repo writes them: use it for payloads exported by another
+    system or prepared by hand. Payloads with "active": false are skipped.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+    
+    def _file(self, merchant_id: str) -> str:
+        return os.path.join(self.path, f"{merchant_id}.json")
+    
+    def list_active_merchants(self) -> List[str]:
+        merchants = []
+        for file_path in sorted(glob.glob(os.path.join(self.path, "*.json"))):
+            merchant_id = os.path.splitext(os.path.basename(file_path))[0]
+            try:
+                with open(file_path) as f:
+                    if json.load(f).get('active', True):
+                        merchants.append(merchant_id)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable merchant payload {file_path}: {e}")
+        return merchants
+    
+    def load_merchant_data(self, merchant_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file(merchant_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def data_version(self, merchant_id: str) -> Optional[str]:
+        try:
+            return str(os.stat(self._file(merchant_id)).st_mtime_ns)
+        except OSError:
+            return None
+
+class SnapshotMerchantSource(MerchantSource):
+    """
+    Builds payloads from the dashboard's metric_snapshots, which the Node sync jobs fill daily
+    
+    Every shop with snapshots is active. Daily spend and revenue feed budget
+    optimization; the last 30 days give the cross-merchant profile. The
+    snapshots hold no creative, customer or product data, so those
+    predictions need payloads from a DirectoryMerchantSource.
+    """
+    
+    def __init__(self, reader: Optional[MetricSnapshotReader] = None, history_days: int = 90):
+        self.reader = reader or MetricSnapshotReader()
+        self.history_days = history_days
+    
+    def list_active_merchants(self) -> List[str]:
+        try:
+            return self.reader.list_shops()
+        except FileNotFoundError as e:
+            logger.warning(f"No merchants to precompute: {e}")
+            return []
+    
+    def load_merchant_data(self, merchant_id: str) -> Optional[Dict[str, Any]]:
+        start = datetime.now().date() - timedelta(days=self.history_days)
+        try:
+            history = self.reader.read_history(merchant_id, start=start)
+        except FileNotFoundError:
+            return None
+        if history.empty:
+            return None
+        
+        payload = {}
+        if 'spend' in history.columns and 'revenue' in history.columns:
+            performance = history.dropna(subset=['spend', 'revenue'])
+            recent = performance[performance['date'] > performance['date'].max() - pd.Timedelta(days=30)]
+            if not recent.empty:
+                columns = ['date', 'spend', 'revenue'] + (['roas'] if 'roas' in performance.columns else [])
+                rows = performance[columns].assign(date=performance['date'].dt.strftime('%Y-%m-%d'))
+                payload['budget_data'] = {
+                    'current_spend': float(recent['spend'].sum()),
+                    'current_revenue': float(recent['revenue'].sum()),
+                    'historical_performance': rows.astype(object).where(rows.notna(), None).to_dict('records')
+                }
+        
+        recent = history[history['date'] > history['date'].max() - pd.Timedelta(days=30)]
+        totals = recent.sum(numeric_only=True)
+        if totals.get('orders', 0) > 0:
+            profile = {
+                'monthly_orders': float(totals['orders']),
+                'avg_order_value': float(totals.get('revenue', 0) / totals['orders']),
+                'aov': float(totals.get('revenue', 0) / totals['orders'])
+            }
+            if totals.get('spend', 0) > 0:
+                profile['roas'] = float(totals.get('revenue', 0) / totals['spend'])
+            if totals.get('sessions', 0) > 0:
+                profile['conversion_rate'] = float(totals['orders'] / totals['sessions'])
+            payload['merchant_profile'] = {
+                'merchant_profile': profile,
+                'benchmark_categories': [name for name in ('conversion_rate', 'aov', 'roas') if name in profile]
+            }
+        
+        return payload or None
+    
+    def data_version(self, merchant_id: str) -> Optional[str]:
+        try:
+            return self.reader.shop_version(merchant_id)
+        except FileNotFoundError:
+            return None
+
+def create_merchant_source(config: Optional[Dict[str, Any]] = None) -> MerchantSource:
+    """The MerchantSource selected by PRECOMPUTE_SOURCE"""
+    
+    config = config or Settings.get_precompute_config()
+    if config['source'] == 'directory':
+        return DirectoryMerchantSource(config['data_path'])
+    if config['source'] == 'snapshots':
+        return SnapshotMerchantSource(history_days=config['history_days'])
+    raise ValueError(f"Unknown precompute source: {config['source']}")
+
+def iter_merchant_profiles(source: MerchantSource, batch_size: int = 4096) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream the cross-merchant profiles of all active merchants in batches
+    
+    Feeds CrossMerchantIntelligence.fit_archetypes; merchants without a
+    profile in their payload are skipped.
+    """
+    
+    batch = []
+    for merchant_id in source.list_active_merchants():
+        merchant_data = source.load_merchant_data(merchant_id)
+        if not merchant_data or 'merchant_profile' not in merchant_data:
+            continue
+        batch.append(merchant_data['merchant_profile']['merchant_profile'])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def create_predictor(name: str) -> Any:
+    """Instantiate a predictor and load its current model version"""
+    
+    from models.creative_fatigue import CreativeFatiguePredictor
+    from models.budget_optimizer import BudgetOptimizer
+    from models.customer_purchase import CustomerPurchasePredictor
+    from models.product_velocity import ProductVelocityPredictor
+    from models.cross_merchant import CrossMerchantIntelligence
+    
+    predictor_classes = {
+        'creative_fatigue': CreativeFatiguePredictor,
+        'budget_optimization': BudgetOptimizer,
+        'customer_prediction': CustomerPurchasePredictor,
+        'product_velocity': ProductVelocityPredictor,
+        'cross_merchant': CrossMerchantIntelligence
+    }
+    
+    predictor = predictor_classes[name]()
+    predictor.is_ready()
+    return predictor
+
+def create_predictors() -> Dict[str, Any]:
+    """Instantiate one of each predictor"""
+    return {name: create_predictor(name) for name in PREDICTION_TYPES}
+
+def refresh_predictors(predictors: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Replace predictors whose registry has a newer current version
+    
+    A fresh instance is fully loaded before it is swapped into the dict, so
+    requests either see the old version or the new one, never a mix.
+    
+    Returns:
+        {name: version} for every predictor that was swapped
+    """
+    
+    swapped = {}
+    for name, predictor in list(predictors.items()):
+        current = model_registry.current_version(name)
+        if current is None or current == getattr(predictor, 'model_version', None):
+            continue
+        
+        replacement = create_predictor(name)
+        if replacement.model_version == current:
+            predictors[name] = replacement
+            swapped[name] = current
+    
+    return swapped
+
+def model_versions(predictors: Dict[str, Any]) -> Dict[str, str]:
+    """Model version per result key, used to invalidate results after retrains"""
+    
+    versions = {}
+    for name, predictor in predictors.items():
+        version = getattr(predictor, 'model_version', None)
+        if version is None:
+            trained = getattr(predictor, 'is_trained', False)
+            version = f"{Settings.APP_VERSION}:{'model' if trained else 'rule_based'}"
+        versions[PREDICTION_TYPES[name]] = version
+    return versions
+
+def run_merchant_predictions(predictors: Dict[str, Any], merchant_data: Dict[str, Any],
+                             enabled: Dict[str, bool]) -> Dict[str, Any]:
+    """
+    Run every enabled predictor the merchant payload has data for
+    
+    Args:
+        predictors: Predictors from create_predictors()
+        merchant_data: Payload shaped like the /batch-predictions request body
+        enabled: Settings.get_prediction_config()['enabled_predictions']
+    
+    Returns:
+        Raw prediction dicts keyed like the /batch-predictions response
+    """
+    
+    results = {}
+    
+    if enabled.get('creative_fatigue') and 'creative_data' in merchant_data:
+        data = merchant_data['creative_data']
+        results['creative_fatigue'] = predictors['creative_fatigue'].predict_fatigue(
+            data['creative_id'], data['platform'],
+            data.get('current_metrics', {}), data.get('historical_data', [])
+        )
+    
+    if enabled.get('budget_optimization') and 'budget_data' in merchant_data:
+        data = merchant_data['budget_data']
+        results['budget_optimization'] = predictors['budget_optimization'].optimize(
+            data['current_spend'], data['current_revenue'],
+            data.get('historical_performance', []), data.get('constraints')
+        )
+    
+    if enabled.get('customer_prediction') and 'customer_data' in merchant_data:
+        results['customer_predictions'] = predictors['customer_prediction'].batch_predict(
+            merchant_data['customer_data']
+        )
+    
+    if enabled.get('product_velocity') and 'product_data' in merchant_data:
+        results['product_velocity'] = predictors['product_velocity'].batch_predict(
+            merchant_data['product_data']
+        )
+    
+    if enabled.get('cross_merchant') and 'merchant_profile' in merchant_data:
+        data = merchant_data['merchant_profile']
+        results['cross_merchant'] = predictors['cross_merchant'].get_insights(
+            data['merchant_profile'], data.get('benchmark_categories', [])
+        )
+    
+    return results
+
+# Per-process predictors for pool workers, created once by the initializer
+_worker_predictors: Optional[Dict[str, Any]] = None
+
+def _init_worker():
+    global _worker_predictors
+    _worker_predictors = create_predictors()
+
+def _process_chunk(source: MerchantSource, merchant_ids: List[str],
+                   enabled: Dict[str, bool]) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[str], Dict[str, str]]]:
+    """Compute predictions for a chunk of merchants inside a worker"""
+    
+    predictors = _worker_predictors if _worker_predictors is not None else create_predictors()
+    versions = model_versions(predictors)
+    output = []
+    
+    for merchant_id in merchant_ids:
+        data_version = source.data_version(merchant_id)
+        merchant_data = source.load_merchant_data(merchant_id)
+        if merchant_data is None:
+            output.append((merchant_id, None, data_version, versions))
+            continue
+        try:
+            results = run_merchant_predictions(predictors, merchant_data, enabled)
+            output.append((merchant_id, results, data_version, versions))
+        except Exception as e:
+            logger.error(f"Precompute failed for merchant {merchant_id}: {e}")
+            output.append((merchant_id, None, data_version, versions))
+    
+    return output
+
+class PrecomputePipeline:
+    """
+    Enumerates active merchants, runs enabled predictors in batched parallel
+    chunks and writes timestamped, model-versioned results to the store
+    """
+    
+    def __init__(self, source: MerchantSource, store: ResultsStore,
+                 workers: int = 1, chunk_size: int = 100):
+        self.source = source
+        self.store = store
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.last_run: Optional[Dict[str, Any]] = None
+    
+    def run(self, merchant_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Precompute predictions for the given (default: all active) merchants
+        
+        Returns:
+            Run summary with merchant counts and duration
+        """
+        
+        started = time.perf_counter()
+        enabled = Settings.get_prediction_config()['enabled_predictions']
+        merchant_ids = merchant_ids if merchant_ids is not None else self.source.list_active_merchants()
+        chunks = [merchant_ids[i:i + self.chunk_size] for i in range(0, len(merchant_ids), self.chunk_size)]
+        
+        succeeded = 0
+        failed = 0
+        
+        def store_chunk(chunk_results):
+            nonlocal succeeded, failed
+            for merchant_id, results, data_version, versions in chunk_results:
+                if results is None:
+                    failed += 1
+                    continue
+                self.store.save_results(merchant_id, results, versions, data_version)
+                succeeded += 1
+        
+        if self.workers == 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                store_chunk(_process_chunk(self.source, chunk, enabled))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(_process_chunk, self.source, chunk, enabled) for chunk in chunks]
+                for chunk, future in zip(chunks, futures):
+                    try:
+                        store_chunk(future.result())
+                    except Exception as e:
+                        logger.error(f"Precompute chunk failed: {e}")
+                        failed += len(chunk)
+        
+        self.last_run = {
+            'merchants': len(merchant_ids),
+            'succeeded': succeeded,
+            'failed': failed,
+            'chunks': len(chunks),
+            'workers': self.workers,
+            'duration_seconds': time.perf_counter() - started,
+            'finished_at': datetime.now()
+        }
+        logger.info(f"Precomputed predictions for {succeeded}/{len(merchant_ids)} merchants "
+                    f"in {self.last_run['duration_seconds']:.1f}s")
+        
+        return self.last_run
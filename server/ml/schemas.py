@@ -0,0 +1,93 @@
+"""
+Slay Season Prediction Engine - Columnar Request Schemas
+Strictly typed, column-oriented histories that validate without per-row dict checks
+"""
+
+from typing import Any, ClassVar, Dict, List, Optional
+
+import pandas as pd
+from pydantic import BaseModel, ConfigDict, model_validator
+
+class ColumnarHistory(BaseModel):
+    """
+    A history sent as parallel columns instead of a list of row dicts
+    
+    Each column is a flat list validated in a single pass, where
+    List[Dict[str, Any]] makes pydantic check every key and value of every
+    row generically. Columns left out are simply absent from the rows the
+    predictors receive.
+    """
+    
+    model_config = ConfigDict(strict=True, extra='forbid')
+    
+    # Column name -> key the predictors expect in each row
+    record_keys: ClassVar[Dict[str, str]] = {'dates': 'date'}
+    
+    dates: List[str]
+    
+    @model_validator(mode='after')
+    def _check_lengths(self):
+        n_rows = len(self.dates)
+        for name in type(self).model_fields:
+            column = getattr(self, name)
+            if column is not None and len(column) != n_rows:
+                raise ValueError(f"Column '{name}' has {len(column)} values, expected {n_rows}")
+        return self
+    
+    def columns(self) -> Dict[str, List[Any]]:
+        """Provided columns, keyed the way the predictors name them"""
+        return {
+            self.record_keys.get(name, name): column
+            for name in type(self).model_fields
+            if (column := getattr(self, name)) is not None
+        }
+    
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Rows in the format the per-item predictors consume"""
+        columns = self.columns()
+        keys = list(columns)
+        return [dict(zip(keys, row)) for row in zip(*columns.values())]
+    
+    def to_frame(self) -> pd.DataFrame:
+        """Long-format frame for the batch scorers, built without intermediate rows"""
+        return pd.DataFrame(self.columns())
+
+class PerformanceHistory(ColumnarHistory):
+    """Daily ad performance (creative fatigue and budget optimization)"""
+    
+    impressions: Optional[List[float]] = None
+    clicks: Optional[List[float]] = None
+    ctr: Optional[List[float]] = None
+    cpm: Optional[List[float]] = None
+    spend: Optional[List[float]] = None
+    revenue: Optional[List[float]] = None
+    orders: Optional[List[float]] = None
+    frequency: Optional[List[float]] = None
+    engagement_rate: Optional[List[float]] = None
+
+class PurchaseHistory(ColumnarHistory):
+    """A customer's orders"""
+    
+    record_keys: ClassVar[Dict[str, str]] = {'dates': 'date', 'amounts': 'amount'}
+    
+    amounts: List[float]
+
+class SalesHistory(ColumnarHistory):
+    """A product's daily unit sales"""
+    
+    units_sold: List[float]
+
+class AccountHistory(PerformanceHistory):
+    """Daily performance of every creative in an account, one row per creative per day"""
+    
+    record_keys: ClassVar[Dict[str, str]] = {'dates': 'date', 'creative_ids': 'creative_id'}
+    
+    creative_ids: List[str]
+
+class CatalogSales(ColumnarHistory):
+    """Daily unit sales of every product in a catalog"""
+    
+    record_keys: ClassVar[Dict[str, str]] = {'dates': 'date', 'product_ids': 'product_id'}
+    
+    product_ids: List[str]
+    units_sold: List[float]
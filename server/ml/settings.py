@@ -36,12 +36,94 @@ class Settings:
     MODEL_STORAGE_PATH = os.getenv("MODEL_STORAGE_PATH", "./models/")
     MODEL_AUTO_RETRAIN = os.getenv("MODEL_AUTO_RETRAIN", "true").lower() == "true"
     MODEL_RETRAIN_INTERVAL_HOURS = int(os.getenv("MODEL_RETRAIN_INTERVAL_HOURS", "168"))  # Weekly
+    MODEL_INCREMENTAL_TREES = int(os.getenv("MODEL_INCREMENTAL_TREES", "20"))
+    MODEL_MAX_TREES = int(os.getenv("MODEL_MAX_TREES", "100"))
+    BUDGET_MODEL_TYPE = os.getenv("BUDGET_MODEL_TYPE", "gradient_boosting")  # gradient_boosting | sgd
+    MODEL_REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH", "./models/registry/")
+    MODEL_WATCH_INTERVAL_SECONDS = int(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", "30"))
+    MODEL_EXPORT_ENABLED = os.getenv("MODEL_EXPORT_ENABLED", "true").lower() == "true"
+    MODEL_EXPORT_LAYOUT = os.getenv("MODEL_EXPORT_LAYOUT", "mmap")  # mmap | compressed
+    MODEL_EXPORT_PARITY_RTOL = float(os.getenv("MODEL_EXPORT_PARITY_RTOL", "1e-5"))
+    MODEL_SERVE_COMPACT = os.getenv("MODEL_SERVE_COMPACT", "false").lower() == "true"  # Serve-only workers
+    
+    # Out-of-core Training
+    TRAINING_SCRATCH_PATH = os.getenv("TRAINING_SCRATCH_PATH", "")  # Empty: system temp dir
+    TRAINING_CHUNK_ROWS = int(os.getenv("TRAINING_CHUNK_ROWS", "10000"))
+    TRAINING_MEMORY_BUDGET_MB = int(os.getenv("TRAINING_MEMORY_BUDGET_MB", "1024"))
+    
+    # Hyperparameter Tuning
+    TUNING_WORKERS = int(os.getenv("TUNING_WORKERS", str(os.cpu_count() or 1)))
+    TUNING_CACHE_PATH = os.getenv("TUNING_CACHE_PATH", "./data/tuning_cache/")
+    TUNING_RESULTS_PATH = os.getenv("TUNING_RESULTS_PATH", "./models/tuning/")
+    TUNING_LATENCY_TOLERANCE = float(os.getenv("TUNING_LATENCY_TOLERANCE", "0.01"))  # Relative MAE slack
     
     # Prediction Configuration
     PREDICTION_CACHE_TTL_MINUTES = int(os.getenv("PREDICTION_CACHE_TTL_MINUTES", "30"))
     PREDICTION_BATCH_SIZE = int(os.getenv("PREDICTION_BATCH_SIZE", "100"))
     MIN_CONFIDENCE_THRESHOLD = float(os.getenv("MIN_CONFIDENCE_THRESHOLD", "0.3"))
     
+    # Processed Frame Cache
+    FRAME_CACHE_MAX_ENTRIES = int(os.getenv("FRAME_CACHE_MAX_ENTRIES", "512"))
+    FRAME_CACHE_MAX_MB = int(os.getenv("FRAME_CACHE_MAX_MB", "256"))
+    
+    # Prediction Precompute
+    PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "false").lower() == "true"
+    PRECOMPUTE_INTERVAL_MINUTES = int(os.getenv("PRECOMPUTE_INTERVAL_MINUTES", "60"))
+    PRECOMPUTE_SOURCE = os.getenv("PRECOMPUTE_SOURCE", "snapshots")  # snapshots | directory
+    PRECOMPUTE_DATA_PATH = os.getenv("PRECOMPUTE_DATA_PATH", "./data/merchants/")  # directory source
+    PRECOMPUTE_HISTORY_DAYS = int(os.getenv("PRECOMPUTE_HISTORY_DAYS", "90"))  # snapshots source
+    PRECOMPUTE_RESULTS_PATH = os.getenv("PRECOMPUTE_RESULTS_PATH", "./data/prediction_results.db")
+    
+    # Admission Control
+    ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "4"))  # Per endpoint
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))  # Per endpoint
+    ADMISSION_DEFAULT_DEADLINE_MS = int(os.getenv("ADMISSION_DEFAULT_DEADLINE_MS", "2000"))
+    DEADLINE_HEADER = os.getenv("DEADLINE_HEADER", "X-Request-Deadline-Ms")
+    
+    # Tiered Inference
+    TIER_BREAKER_P95_MS = float(os.getenv("TIER_BREAKER_P95_MS", "250"))
+    TIER_BREAKER_COOLDOWN_SECONDS = int(os.getenv("TIER_BREAKER_COOLDOWN_SECONDS", "30"))
+    TIER_LATENCY_WINDOW = int(os.getenv("TIER_LATENCY_WINDOW", "200"))  # Samples per endpoint
+    TIER_MIN_SAMPLES = int(os.getenv("TIER_MIN_SAMPLES", "20"))
+    TIER_LATENCY_MAX_AGE_SECONDS = int(os.getenv("TIER_LATENCY_MAX_AGE_SECONDS", "300"))  # Older samples expire
+    
+    # Export Ingestion
+    INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "100000"))
+    INGEST_CHECKPOINT_EVERY = int(os.getenv("INGEST_CHECKPOINT_EVERY", "10"))  # Chunks
+    INGEST_CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", "./data/ingest_checkpoints/")
+    
+    # Dashboard Metric Snapshots
+    SNAPSHOT_DB_PATH = os.getenv("SNAPSHOT_DB_PATH", "../data/ecommerce.db")  # Node's server/data, seen from server/ml
+    SNAPSHOT_SHARD_SIZE = int(os.getenv("SNAPSHOT_SHARD_SIZE", "500"))  # Shops per query
+    SNAPSHOT_READ_RETRIES = int(os.getenv("SNAPSHOT_READ_RETRIES", "3"))
+    SNAPSHOT_RETRY_DELAY_MS = int(os.getenv("SNAPSHOT_RETRY_DELAY_MS", "200"))
+    
+    # Feature Drift Monitoring
+    DRIFT_MONITOR_ENABLED = os.getenv("DRIFT_MONITOR_ENABLED", "true").lower() == "true"
+    DRIFT_BINS = int(os.getenv("DRIFT_BINS", "10"))
+    DRIFT_PSI_THRESHOLD = float(os.getenv("DRIFT_PSI_THRESHOLD", "0.25"))
+    DRIFT_KS_THRESHOLD = float(os.getenv("DRIFT_KS_THRESHOLD", "0.2"))
+    DRIFT_MIN_SAMPLES = int(os.getenv("DRIFT_MIN_SAMPLES", "500"))
+    DRIFT_CHECK_INTERVAL_MINUTES = int(os.getenv("DRIFT_CHECK_INTERVAL_MINUTES", "60"))
+    DRIFT_DECAY = float(os.getenv("DRIFT_DECAY", "0.5"))  # Live count weight kept after each check
+    DRIFT_MAX_MODEL_AGE_HOURS = int(os.getenv("DRIFT_MAX_MODEL_AGE_HOURS", "720"))  # 0: no age limit
+    
+    # Merchant Archetype Clustering
+    ARCHETYPE_MODEL_PATH = os.getenv("ARCHETYPE_MODEL_PATH", "./data/archetype_clusters.joblib")
+    ARCHETYPE_BATCH_SIZE = int(os.getenv("ARCHETYPE_BATCH_SIZE", "4096"))
+    ARCHETYPE_CHUNK_ROWS = int(os.getenv("ARCHETYPE_CHUNK_ROWS", "1000000"))  # Merchants per classification pass
+    ARCHETYPE_REFIT_ENABLED = os.getenv("ARCHETYPE_REFIT_ENABLED", "true").lower() == "true"
+    ARCHETYPE_REFIT_INTERVAL_HOURS = int(os.getenv("ARCHETYPE_REFIT_INTERVAL_HOURS", "24"))  # Nightly
+    
+    # Prediction Log
+    PREDICTION_LOG_ENABLED = os.getenv("PREDICTION_LOG_ENABLED", "true").lower() == "true"
+    PREDICTION_LOG_PATH = os.getenv("PREDICTION_LOG_PATH", "./data/prediction_log/")
+    PREDICTION_LOG_MAX_QUEUE = int(os.getenv("PREDICTION_LOG_MAX_QUEUE", "10000"))  # Records; overflow is dropped
+    PREDICTION_LOG_BATCH_SIZE = int(os.getenv("PREDICTION_LOG_BATCH_SIZE", "512"))
+    PREDICTION_LOG_FLUSH_MS = int(os.getenv("PREDICTION_LOG_FLUSH_MS", "1000"))
+    PREDICTION_LOG_SEGMENT_MB = int(os.getenv("PREDICTION_LOG_SEGMENT_MB", "64"))
+    FORECAST_EXPORT_PATH = os.getenv("FORECAST_EXPORT_PATH", "../data/forecast_exports/")  # Imported by Node
+    
     # Dashboard Integration
     DASHBOARD_API_URL = os.getenv("DASHBOARD_API_URL", "http://localhost:3000/api")
     DASHBOARD_API_KEY = os.getenv("DASHBOARD_API_KEY")
@@ -60,6 +142,8 @@ class Settings:
     WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
     MAX_REQUEST_SIZE = int(os.getenv("MAX_REQUEST_SIZE", "10485760"))  # 10MB
     REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "300"))  # 5 minutes
+    RESPONSE_GZIP_ENABLED = os.getenv("RESPONSE_GZIP_ENABLED", "true").lower() == "true"
+    RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "65536"))  # Only large batch payloads
     
     # Feature Flags
     ENABLE_CREATIVE_FATIGUE = os.getenv("ENABLE_CREATIVE_FATIGUE", "true").lower() == "true"
@@ -97,6 +181,30 @@ class Settings:
             "storage_path": cls.MODEL_STORAGE_PATH,
             "auto_retrain": cls.MODEL_AUTO_RETRAIN,
             "retrain_interval": timedelta(hours=cls.MODEL_RETRAIN_INTERVAL_HOURS),
+            "incremental": {
+                "new_trees": cls.MODEL_INCREMENTAL_TREES,
+                "max_trees": cls.MODEL_MAX_TREES
+            },
+            "budget_model_type": cls.BUDGET_MODEL_TYPE,
+            "registry_path": cls.MODEL_REGISTRY_PATH,
+            "watch_interval": timedelta(seconds=cls.MODEL_WATCH_INTERVAL_SECONDS),
+            "export": {
+                "enabled": cls.MODEL_EXPORT_ENABLED,
+                "layout": cls.MODEL_EXPORT_LAYOUT,
+                "parity_rtol": cls.MODEL_EXPORT_PARITY_RTOL,
+                "serve_compact": cls.MODEL_SERVE_COMPACT
+            },
+            "training": {
+                "scratch_path": cls.TRAINING_SCRATCH_PATH,
+                "chunk_rows": cls.TRAINING_CHUNK_ROWS,
+                "memory_budget_mb": cls.TRAINING_MEMORY_BUDGET_MB
+            },
+            "tuning": {
+                "workers": cls.TUNING_WORKERS,
+                "cache_path": cls.TUNING_CACHE_PATH,
+                "results_path": cls.TUNING_RESULTS_PATH,
+                "latency_tolerance": cls.TUNING_LATENCY_TOLERANCE
+            },
             "min_training_samples": {
                 "creative_fatigue": 50,
                 "budget_optimization": 100,
@@ -151,6 +259,99 @@ class Settings:
             }
         }
     
+    @classmethod
+    def get_precompute_config(cls) -> Dict[str, Any]:
+        """Get prediction precompute configuration"""
+        return {
+            "enabled": cls.PRECOMPUTE_ENABLED,
+            "interval": timedelta(minutes=cls.PRECOMPUTE_INTERVAL_MINUTES),
+            "source": cls.PRECOMPUTE_SOURCE,
+            "data_path": cls.PRECOMPUTE_DATA_PATH,
+            "history_days": cls.PRECOMPUTE_HISTORY_DAYS,
+            "results_path": cls.PRECOMPUTE_RESULTS_PATH,
+            "workers": cls.WORKER_PROCESSES,
+            "chunk_size": cls.PREDICTION_BATCH_SIZE
+        }
+    
+    @classmethod
+    def get_admission_config(cls) -> Dict[str, Any]:
+        """Get request admission control configuration"""
+        return {
+            "max_concurrency": cls.ADMISSION_MAX_CONCURRENCY,
+            "max_queue": cls.ADMISSION_MAX_QUEUE,
+            "default_deadline": timedelta(milliseconds=cls.ADMISSION_DEFAULT_DEADLINE_MS),
+            "max_deadline": timedelta(seconds=cls.REQUEST_TIMEOUT),
+            "deadline_header": cls.DEADLINE_HEADER
+        }
+    
+    @classmethod
+    def get_tiering_config(cls) -> Dict[str, Any]:
+        """Get model / rule-based tier selection configuration"""
+        return {
+            "breaker_p95_ms": cls.TIER_BREAKER_P95_MS,
+            "breaker_cooldown": timedelta(seconds=cls.TIER_BREAKER_COOLDOWN_SECONDS),
+            "latency_window": cls.TIER_LATENCY_WINDOW,
+            "min_samples": cls.TIER_MIN_SAMPLES,
+            "latency_max_age": timedelta(seconds=cls.TIER_LATENCY_MAX_AGE_SECONDS)
+        }
+    
+    @classmethod
+    def get_ingestion_config(cls) -> Dict[str, Any]:
+        """Get chunked export ingestion configuration"""
+        return {
+            "chunk_rows": cls.INGEST_CHUNK_ROWS,
+            "checkpoint_every": cls.INGEST_CHECKPOINT_EVERY,
+            "checkpoint_path": cls.INGEST_CHECKPOINT_PATH
+        }
+    
+    @classmethod
+    def get_snapshot_config(cls) -> Dict[str, Any]:
+        """Get dashboard metric snapshot reader configuration"""
+        return {
+            "db_path": cls.SNAPSHOT_DB_PATH,
+            "shard_size": cls.SNAPSHOT_SHARD_SIZE,
+            "retries": cls.SNAPSHOT_READ_RETRIES,
+            "retry_delay": timedelta(milliseconds=cls.SNAPSHOT_RETRY_DELAY_MS)
+        }
+    
+    @classmethod
+    def get_drift_config(cls) -> Dict[str, Any]:
+        """Get feature drift monitoring configuration"""
+        return {
+            "enabled": cls.DRIFT_MONITOR_ENABLED,
+            "bins": cls.DRIFT_BINS,
+            "psi_threshold": cls.DRIFT_PSI_THRESHOLD,
+            "ks_threshold": cls.DRIFT_KS_THRESHOLD,
+            "min_samples": cls.DRIFT_MIN_SAMPLES,
+            "check_interval": timedelta(minutes=cls.DRIFT_CHECK_INTERVAL_MINUTES),
+            "decay": cls.DRIFT_DECAY,
+            "max_model_age": timedelta(hours=cls.DRIFT_MAX_MODEL_AGE_HOURS)
+        }
+    
+    @classmethod
+    def get_archetype_config(cls) -> Dict[str, Any]:
+        """Get merchant archetype clustering configuration"""
+        return {
+            "model_path": cls.ARCHETYPE_MODEL_PATH,
+            "batch_size": cls.ARCHETYPE_BATCH_SIZE,
+            "chunk_rows": cls.ARCHETYPE_CHUNK_ROWS,
+            "refit_enabled": cls.ARCHETYPE_REFIT_ENABLED,
+            "refit_interval": timedelta(hours=cls.ARCHETYPE_REFIT_INTERVAL_HOURS)
+        }
+    
+    @classmethod
+    def get_prediction_log_config(cls) -> Dict[str, Any]:
+        """Get prediction log configuration"""
+        return {
+            "enabled": cls.PREDICTION_LOG_ENABLED,
+            "path": cls.PREDICTION_LOG_PATH,
+            "max_queue": cls.PREDICTION_LOG_MAX_QUEUE,
+            "batch_size": cls.PREDICTION_LOG_BATCH_SIZE,
+            "flush_interval": timedelta(milliseconds=cls.PREDICTION_LOG_FLUSH_MS),
+            "segment_bytes": cls.PREDICTION_LOG_SEGMENT_MB * 1024 * 1024,
+            "forecast_export_path": cls.FORECAST_EXPORT_PATH
+        }
+    
     @classmethod
     def get_external_api_config(cls) -> Dict[str, Any]:
         """Get external API configuration"""
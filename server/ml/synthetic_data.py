@@ -0,0 +1,505 @@
+"""
+Slay Season Prediction Engine - Synthetic Merchant Data
+Seeded generator for production-scale merchants, daily metrics, creatives, customers and SKUs
+
+Usage (from server/ml):
+    python synthetic_data.py --merchants 10000 --days 365 --out ./data/synthetic [--format npz|parquet]
+
+The same seed and sizes always produce the same rows, whatever the chunk
+size: merchants are generated in fixed blocks, each from its own seed, and
+chunking only decides how the rows are split into part files.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.calendar_table import calendar_table
+
+logger = logging.getLogger(__name__)
+
+# Merchants per generation block; part of the seed derivation, so changing it changes the data
+BLOCK_MERCHANTS = 64
+
+TABLES = ('merchants', 'daily_metrics', 'creatives', 'creative_daily',
+          'customers', 'orders', 'products', 'sku_sales')
+
+PLATFORMS = ('facebook', 'instagram', 'google', 'tiktok')
+PLATFORM_WEIGHTS = np.array([0.4, 0.25, 0.25, 0.1])
+# Same relative fatigue speed as CreativeFatiguePredictor's platform factors
+PLATFORM_FATIGUE = np.array([1.0, 1.2, 0.8, 1.5])
+PLATFORM_CPM = np.array([10.0, 8.0, 12.0, 6.0])
+
+CATEGORIES = ('fashion', 'electronics', 'home_garden', 'beauty', 'sports', 'general')
+
+# Order volume, AOV and margin ranges follow CrossMerchantIntelligence.merchant_archetypes;
+# benchmark metrics its baseline; the rest scales the per-merchant tables
+ARCHETYPES = {
+    'high_volume_low_margin': {
+        'share': 0.25, 'monthly_orders': (1000, 20000), 'avg_order_value': (20, 50), 'profit_margin': (0.05, 0.2),
+        'conversion_rate': 0.025, 'customer_retention': 0.3, 'roas': 2.8, 'lifetime_value': 180,
+        'purchase_cycle_days': 25, 'creatives': 1.5, 'customers': 2.0, 'skus': 1.5
+    },
+    'premium_brand': {
+        'share': 0.15, 'monthly_orders': (50, 500), 'avg_order_value': (100, 400), 'profit_margin': (0.3, 0.7),
+        'conversion_rate': 0.04, 'customer_retention': 0.5, 'roas': 3.5, 'lifetime_value': 450,
+        'purchase_cycle_days': 60, 'creatives': 0.8, 'customers': 0.6, 'skus': 0.6
+    },
+    'mid_market': {
+        'share': 0.4, 'monthly_orders': (200, 1000), 'avg_order_value': (50, 150), 'profit_margin': (0.15, 0.35),
+        'conversion_rate': 0.03, 'customer_retention': 0.35, 'roas': 3.0, 'lifetime_value': 280,
+        'purchase_cycle_days': 40, 'creatives': 1.0, 'customers': 1.0, 'skus': 1.0
+    },
+    'niche_specialist': {
+        'share': 0.2, 'monthly_orders': (10, 200), 'avg_order_value': (75, 300), 'profit_margin': (0.25, 0.6),
+        'conversion_rate': 0.045, 'customer_retention': 0.45, 'roas': 3.8, 'lifetime_value': 380,
+        'purchase_cycle_days': 50, 'creatives': 0.5, 'customers': 0.4, 'skus': 0.5
+    }
+}
+ARCHETYPE_NAMES = tuple(ARCHETYPES)
+
+# Demand by calendar month (Q4 peak) and day of week (Monday = 0)
+MONTH_SEASONALITY = np.array([np.nan, 0.85, 0.8, 0.9, 0.95, 1.0, 0.95, 0.9, 0.95, 1.0, 1.05, 1.3, 1.45])
+WEEKDAY_SEASONALITY = np.array([0.95, 0.95, 0.97, 1.0, 1.05, 1.1, 0.98])
+
+# Integer-coded columns and the labels of their codes
+CODED_COLUMNS = {
+    'archetype': ARCHETYPE_NAMES,
+    'platform': PLATFORMS,
+    'category': CATEGORIES
+}
+
+Columns = Dict[str, np.ndarray]
+
+def _within_segment(lengths: np.ndarray) -> np.ndarray:
+    """0, 1, ... within each consecutive segment of the given lengths"""
+    total = int(lengths.sum())
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.arange(total) - starts
+
+def _block_rng(seed: int, block: int, table: str) -> np.random.Generator:
+    return np.random.default_rng(np.random.SeedSequence([seed, block, TABLES.index(table)]))
+
+class SyntheticMerchantGenerator:
+    """
+    Generates the eight tables of a synthetic merchant population
+    
+    merchants          one row per merchant: archetype, category, profile and benchmark metrics
+    daily_metrics      merchant x day: orders, revenue, spend, impressions, clicks
+    creatives          one row per ad creative, with its fatigue day (the training label)
+    creative_daily     creative x running day: impressions, ctr, cpm, spend, frequency, engagement
+    customers          one row per customer, with the purchase cycle that drives their orders
+    orders             one row per order: customer, date, amount
+    products           one row per SKU, with its seasonal peak, amplitude and trend
+    sku_sales          SKU x day since launch: units sold
+    
+    Rows are produced per block of BLOCK_MERCHANTS merchants with NumPy,
+    so memory stays bounded by one block whatever the population size.
+    """
+    
+    def __init__(self, n_merchants: int = 1000, days: int = 365, start_date: str = '2023-01-01', seed: int = 42,
+                 creatives_per_merchant: float = 20, customers_per_merchant: float = 500,
+                 skus_per_merchant: float = 40):
+        self.n_merchants = n_merchants
+        self.days = days
+        self.start_date = np.datetime64(start_date, 'D')
+        self.seed = seed
+        self.creatives_per_merchant = creatives_per_merchant
+        self.customers_per_merchant = customers_per_merchant
+        self.skus_per_merchant = skus_per_merchant
+        
+        dates = self.start_date + np.arange(days)
+        calendar = calendar_table.take(dates, ['month', 'day_of_week'])
+        self.dates = dates
+        self.day_of_year = (dates - dates.astype('datetime64[Y]')).astype(int)
+        self.seasonality = MONTH_SEASONALITY[calendar['month']] * WEEKDAY_SEASONALITY[calendar['day_of_week']]
+    
+    def config(self) -> Dict[str, Any]:
+        return {
+            'n_merchants': self.n_merchants,
+            'days': self.days,
+            'start_date': str(self.start_date),
+            'seed': self.seed,
+            'creatives_per_merchant': self.creatives_per_merchant,
+            'customers_per_merchant': self.customers_per_merchant,
+            'skus_per_merchant': self.skus_per_merchant,
+            'block_merchants': BLOCK_MERCHANTS
+        }
+    
+    def _archetype_values(self, codes: np.ndarray, key: str) -> np.ndarray:
+        return np.array([ARCHETYPES[name][key] for name in ARCHETYPE_NAMES], dtype=float)[codes]
+    
+    def _merchants(self, block: int, first_id: int, n: int) -> Columns:
+        rng = _block_rng(self.seed, block, 'merchants')
+        shares = np.array([ARCHETYPES[name]['share'] for name in ARCHETYPE_NAMES])
+        archetype = rng.choice(len(ARCHETYPE_NAMES), n, p=shares).astype(np.int8)
+        
+        def in_range(key: str, log_scale: bool = False) -> np.ndarray:
+            bounds = np.array([ARCHETYPES[name][key] for name in ARCHETYPE_NAMES], dtype=float)[archetype]
+            if log_scale:
+                return np.exp(rng.uniform(np.log(bounds[:, 0]), np.log(bounds[:, 1])))
+            return rng.uniform(bounds[:, 0], bounds[:, 1])
+        
+        def around(key: str, spread: float = 0.15) -> np.ndarray:
+            return self._archetype_values(archetype, key) * rng.lognormal(0, spread, n)
+        
+        return {
+            'merchant_id': np.arange(first_id, first_id + n, dtype=np.int32),
+            'archetype': archetype,
+            'category': rng.integers(0, len(CATEGORIES), n).astype(np.int8),
+            'monthly_orders': np.round(in_range('monthly_orders', log_scale=True)).astype(np.int32),
+            'avg_order_value': np.round(in_range('avg_order_value'), 2),
+            'profit_margin': np.round(in_range('profit_margin'), 3),
+            'conversion_rate': around('conversion_rate'),
+            'customer_retention': np.clip(around('customer_retention'), 0.02, 0.95),
+            'roas': around('roas', 0.25),
+            'lifetime_value': around('lifetime_value', 0.25),
+            'daily_growth': rng.normal(0.0005, 0.0008, n),
+            'ctr': rng.uniform(0.008, 0.03, n),
+            'cpm': rng.uniform(6, 16, n)
+        }
+    
+    def _daily_metrics(self, block: int, merchants: Columns) -> Columns:
+        rng = _block_rng(self.seed, block, 'daily_metrics')
+        n, days = len(merchants['merchant_id']), self.days
+        day = np.arange(days)
+        
+        expected = (merchants['monthly_orders'][:, None] / 30.0 * self.seasonality[None]
+                    * np.exp(merchants['daily_growth'][:, None] * day[None]) * rng.lognormal(0, 0.1, (n, days)))
+        orders = rng.poisson(expected)
+        revenue = orders * merchants['avg_order_value'][:, None] * rng.lognormal(0, 0.08, (n, days))
+        spend = revenue / (merchants['roas'][:, None] * rng.lognormal(0, 0.15, (n, days)))
+        impressions = rng.poisson(spend / merchants['cpm'][:, None] * 1000)
+        clicks = rng.binomial(impressions, merchants['ctr'][:, None])
+        
+        return {
+            'merchant_id': np.repeat(merchants['merchant_id'], days),
+            'date': np.tile(self.dates, n),
+            'orders': orders.ravel().astype(np.int32),
+            'revenue': np.round(revenue.ravel(), 2),
+            'spend': np.round(spend.ravel(), 2),
+            'impressions': impressions.ravel().astype(np.int64),
+            'clicks': clicks.ravel().astype(np.int64)
+        }
+    
+    def _creatives(self, block: int, merchants: Columns, first_id: int) -> Dict[str, Columns]:
+        rng = _block_rng(self.seed, block, 'creatives')
+        factor = self._archetype_values(merchants['archetype'], 'creatives')
+        counts = rng.poisson(self.creatives_per_merchant * factor)
+        n = int(counts.sum())
+        
+        platform = rng.choice(len(PLATFORMS), n, p=PLATFORM_WEIGHTS).astype(np.int8)
+        launch = rng.integers(0, max(1, self.days - 7), n)
+        run_days = np.minimum(self.days - launch, rng.integers(14, 91, n))
+        # Faster-fatiguing platforms reach fatigue sooner
+        fatigue_day = np.maximum(3, np.round(rng.gamma(4.0, 21.0 / 4.0, n) / PLATFORM_FATIGUE[platform])).astype(np.int32)
+        base_ctr = rng.lognormal(np.log(0.015), 0.35, n)
+        base_cpm = PLATFORM_CPM[platform] * rng.lognormal(0, 0.2, n)
+        daily_impressions = rng.lognormal(np.log(8000), 0.8, n)
+        audience_size = np.round(rng.lognormal(np.log(300_000), 0.9, n))
+        creative_type_factor = rng.choice([0.8, 1.0, 1.2], n)
+        
+        creatives = {
+            'creative_id': np.arange(first_id, first_id + n, dtype=np.int64),
+            'merchant_id': np.repeat(merchants['merchant_id'], counts),
+            'platform': platform,
+            'launch_date': self.dates[launch],
+            'run_days': run_days.astype(np.int32),
+            'fatigue_day': fatigue_day,
+            'creative_type_factor': creative_type_factor,
+            'audience_size': audience_size
+        }
+        
+        # One row per creative per running day
+        rows = np.repeat(np.arange(n), run_days)
+        age = _within_segment(run_days)
+        past_fatigue = np.maximum(0, age - fatigue_day[rows])
+        decline = np.exp(-0.06 * past_fatigue * PLATFORM_FATIGUE[platform[rows]])
+        
+        impressions = rng.poisson(daily_impressions[rows] * rng.lognormal(0, 0.15, len(rows)))
+        ctr = base_ctr[rows] * decline * rng.lognormal(0, 0.08, len(rows))
+        cpm = base_cpm[rows] * (1 + 0.015 * past_fatigue) * rng.lognormal(0, 0.06, len(rows))
+        frequency = 1 + (age + 1) * daily_impressions[rows] / audience_size[rows]
+        
+        creative_daily = {
+            'creative_id': creatives['creative_id'][rows],
+            'date': self.dates[launch[rows] + age],
+            'impressions': impressions.astype(np.int64),
+            'ctr': ctr,
+            'cpm': cpm,
+            'spend': np.round(impressions * cpm / 1000, 2),
+            'frequency': frequency,
+            'engagement_rate': ctr * rng.uniform(1.2, 2.0, len(rows))
+        }
+        return {'creatives': creatives, 'creative_daily': creative_daily}
+    
+    def _customers(self, block: int, merchants: Columns, first_id: int) -> Dict[str, Columns]:
+        rng = _block_rng(self.seed, block, 'customers')
+        factor = self._archetype_values(merchants['archetype'], 'customers')
+        counts = rng.poisson(self.customers_per_merchant * factor)
+        n = int(counts.sum())
+        
+        owner = np.repeat(np.arange(len(counts)), counts)
+        cycle = rng.gamma(3.0, self._archetype_values(merchants['archetype'], 'purchase_cycle_days')[owner] / 3.0)
+        first_day = rng.integers(0, self.days, n)
+        # Loyal merchants keep customers active for more cycles
+        retention = merchants['customer_retention'][owner]
+        active_days = rng.exponential(cycle / np.maximum(1 - retention, 0.05))
+        last_day = np.minimum(first_day + active_days, self.days - 1)
+        
+        customers = {
+            'customer_id': np.arange(first_id, first_id + n, dtype=np.int64),
+            'merchant_id': merchants['merchant_id'][owner],
+            'first_order_date': self.dates[first_day],
+            'purchase_cycle_days': cycle,
+            'churned': first_day + active_days < self.days
+        }
+        
+        # Enough draws to cover each customer's active span, then trimmed to it
+        draws = 1 + rng.poisson((last_day - first_day) / cycle * 1.5 + 1)
+        rows = np.repeat(np.arange(n), draws)
+        gaps = rng.gamma(4.0, cycle[rows] / 4.0)
+        gaps[_within_segment(draws) == 0] = 0
+        running = np.cumsum(gaps)
+        segment_start = np.repeat(running[np.cumsum(draws) - draws], draws)
+        day = first_day[rows] + (running - segment_start)
+        keep = day <= last_day[rows]
+        rows, day = rows[keep], day[keep].astype(np.int64)
+        
+        aov = merchants['avg_order_value'][owner[rows]]
+        orders = {
+            'customer_id': customers['customer_id'][rows],
+            'merchant_id': customers['merchant_id'][rows],
+            'date': self.dates[day],
+            'amount': np.round(rng.gamma(3.0, aov / 3.0), 2)
+        }
+        return {'customers': customers, 'orders': orders}
+    
+    def _products(self, block: int, merchants: Columns, first_id: int) -> Dict[str, Columns]:
+        rng = _block_rng(self.seed, block, 'products')
+        factor = self._archetype_values(merchants['archetype'], 'skus')
+        counts = np.maximum(1, rng.poisson(self.skus_per_merchant * factor))
+        n = int(counts.sum())
+        
+        owner = np.repeat(np.arange(len(counts)), counts)
+        launch = rng.integers(-365, max(1, self.days - 30), n)
+        base_units = rng.lognormal(np.log(3.0), 1.0, n) * (merchants['monthly_orders'][owner] / 500.0) ** 0.5
+        amplitude = rng.uniform(0, 0.6, n)
+        peak_day = rng.integers(0, 365, n)
+        trend = rng.normal(0, 0.002, n)
+        
+        products = {
+            'product_id': np.arange(first_id, first_id + n, dtype=np.int64),
+            'merchant_id': merchants['merchant_id'][owner],
+            'category': merchants['category'][owner],
+            'price': np.round(merchants['avg_order_value'][owner] * rng.lognormal(-0.3, 0.4, n), 2),
+            'launch_date': self.start_date + launch,
+            'inventory': rng.integers(0, 5000, n).astype(np.int32),
+            'base_daily_units': base_units,
+            'seasonal_amplitude': amplitude,
+            'seasonal_peak_day': peak_day.astype(np.int16),
+            'daily_trend': trend
+        }
+        
+        # One row per SKU per day on sale within the generated range
+        first_day = np.maximum(launch, 0)
+        on_sale = np.maximum(self.days - first_day, 0)
+        rows = np.repeat(np.arange(n), on_sale)
+        day = first_day[rows] + _within_segment(on_sale)
+        age = day - launch[rows]
+        
+        season = 1 + amplitude[rows] * np.cos(2 * np.pi * (self.day_of_year[day] - peak_day[rows]) / 365.25)
+        growth = np.exp(np.clip(trend[rows] * age, -3, 3))
+        expected = base_units[rows] * season * growth * self.seasonality[day] / MONTH_SEASONALITY[1:].mean()
+        
+        sku_sales = {
+            'product_id': products['product_id'][rows],
+            'date': self.dates[day],
+            'units_sold': rng.poisson(expected).astype(np.int32)
+        }
+        return {'products': products, 'sku_sales': sku_sales}
+    
+    def iter_blocks(self, tables: Sequence[str] = TABLES) -> Iterator[Dict[str, Columns]]:
+        """Yield {table: columns} for each block of merchants, in merchant order"""
+        
+        unknown = set(tables) - set(TABLES)
+        if unknown:
+            raise ValueError(f"Unknown tables: {sorted(unknown)}")
+        
+        next_ids = {'creatives': 0, 'customers': 0, 'products': 0}
+        for block, first in enumerate(range(0, self.n_merchants, BLOCK_MERCHANTS)):
+            merchants = self._merchants(block, first, min(BLOCK_MERCHANTS, self.n_merchants - first))
+            result = {}
+            if 'merchants' in tables:
+                result['merchants'] = merchants
+            if 'daily_metrics' in tables:
+                result['daily_metrics'] = self._daily_metrics(block, merchants)
+            
+            # Each generator draws from its own seed, so skipping a table never shifts another
+            generated = {}
+            if {'creatives', 'creative_daily'} & set(tables):
+                generated.update(self._creatives(block, merchants, next_ids['creatives']))
+                next_ids['creatives'] += len(generated['creatives']['creative_id'])
+            if {'customers', 'orders'} & set(tables):
+                generated.update(self._customers(block, merchants, next_ids['customers']))
+                next_ids['customers'] += len(generated['customers']['customer_id'])
+            if {'products', 'sku_sales'} & set(tables):
+                generated.update(self._products(block, merchants, next_ids['products']))
+                next_ids['products'] += len(generated['products']['product_id'])
+            
+            result.update({name: columns for name, columns in generated.items() if name in tables})
+            yield result
+    
+    def write(self, directory: str, fmt: str = 'npz', chunk_rows: int = 1_000_000,
+              tables: Sequence[str] = TABLES) -> Dict[str, Any]:
+        """
+        Generate and write every table as numbered part files
+        
+        Args:
+            directory: Output directory (one subdirectory per table)
+            fmt: 'npz' or 'parquet' (needs pyarrow)
+            chunk_rows: Rows per part file
+            tables: Tables to generate
+        
+        Returns:
+            The manifest also written to <directory>/manifest.json: config,
+            code labels and rows / parts per table
+        """
+        
+        if fmt not in ('npz', 'parquet'):
+            raise ValueError(f"Unknown format: {fmt}")
+        if fmt == 'parquet':
+            import pyarrow  # noqa: F401  (fail before generating anything)
+        
+        started = time.perf_counter()
+        writers = {name: _ChunkWriter(directory, name, fmt, chunk_rows) for name in tables}
+        for index, block in enumerate(self.iter_blocks(tables)):
+            for name, columns in block.items():
+                writers[name].write(columns)
+            if index % 50 == 0:
+                logger.info(f"Generated {min((index + 1) * BLOCK_MERCHANTS, self.n_merchants)}/{self.n_merchants} merchants")
+        
+        manifest = {
+            'config': self.config(),
+            'format': fmt,
+            'codes': {column: list(labels) for column, labels in CODED_COLUMNS.items()},
+            'tables': {name: writer.close() for name, writer in writers.items()},
+            'seconds': round(time.perf_counter() - started, 2)
+        }
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+class _ChunkWriter:
+    """Buffers a table's columns and writes them as fixed-size part files"""
+    
+    def __init__(self, directory: str, table: str, fmt: str, chunk_rows: int):
+        self.directory = os.path.join(directory, table)
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+        self.parts = 0
+        self.rows = 0
+        self._buffer: List[Columns] = []
+        self._buffered = 0
+        os.makedirs(self.directory, exist_ok=True)
+        for stale in glob.glob(os.path.join(self.directory, 'part-*')):
+            os.remove(stale)
+    
+    def write(self, columns: Columns):
+        rows = len(next(iter(columns.values())))
+        if rows == 0:
+            return
+        self._buffer.append(columns)
+        self._buffered += rows
+        while self._buffered >= self.chunk_rows:
+            self._flush(self.chunk_rows)
+    
+    def _flush(self, rows: int):
+        names = list(self._buffer[0])
+        merged = {name: np.concatenate([part[name] for part in self._buffer]) for name in names}
+        self._write_part({name: values[:rows] for name, values in merged.items()})
+        
+        rest = {name: values[rows:] for name, values in merged.items()}
+        self._buffered -= rows
+        self._buffer = [rest] if self._buffered else []
+    
+    def _write_part(self, columns: Columns):
+        path = os.path.join(self.directory, f"part-{self.parts:05d}.{self.fmt}")
+        if self.fmt == 'npz':
+            np.savez(path, **columns)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            pq.write_table(pa.table(columns), path)
+        self.parts += 1
+        self.rows += len(next(iter(columns.values())))
+    
+    def close(self) -> Dict[str, int]:
+        if self._buffered:
+            self._flush(self._buffered)
+        return {'rows': self.rows, 'parts': self.parts}
+
+def iter_table(directory: str, table: str, decode: bool = True) -> Iterator[pd.DataFrame]:
+    """
+    Read a generated table back one part file at a time
+    
+    Args:
+        directory: Directory written by SyntheticMerchantGenerator.write
+        table: Table name
+        decode: Turn coded columns (archetype, platform, category) into categoricals
+    """
+    
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    
+    for path in sorted(glob.glob(os.path.join(directory, table, f"part-*.{manifest['format']}"))):
+        if manifest['format'] == 'npz':
+            with np.load(path) as data:
+                frame = pd.DataFrame({name: data[name] for name in data.files})
+        else:
+            import pyarrow.parquet as pq
+            frame = pq.read_table(path).to_pandas()
+        
+        if decode:
+            for column, labels in manifest['codes'].items():
+                if column in frame.columns:
+                    frame[column] = pd.Categorical.from_codes(frame[column].astype(int), categories=labels)
+        yield frame
+
+def read_table(directory: str, table: str, decode: bool = True) -> pd.DataFrame:
+    """A whole generated table (see iter_table)"""
+    frames = list(iter_table(directory, table, decode))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--merchants', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--start-date', default='2023-01-01')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--creatives', type=float, default=20, help="mean creatives per merchant")
+    parser.add_argument('--customers', type=float, default=500, help="mean customers per merchant")
+    parser.add_argument('--skus', type=float, default=40, help="mean SKUs per merchant")
+    parser.add_argument('--tables', default=','.join(TABLES))
+    parser.add_argument('--out', default='./data/synthetic')
+    parser.add_argument('--format', choices=('npz', 'parquet'), default='npz')
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    generator = SyntheticMerchantGenerator(
+        args.merchants, args.days, args.start_date, args.seed,
+        args.creatives, args.customers, args.skus
+    )
+    manifest = generator.write(args.out, args.format, args.chunk_rows, args.tables.split(','))
+    print(json.dumps(manifest['tables'], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Slay Season Prediction Engine - Hyperparameter Tuning
+Successive-halving / Hyperband search over each predictor's hyperparameters
+"""
+
+import glob
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import SGDRegressor
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import KFold, ParameterSampler
+from sklearn.preprocessing import StandardScaler
+
+from settings import Settings
+from utils.frame_cache import FrameCache
+from utils.hyperparameters import save_tuning_result
+from utils.training_matrix import scale_in_place
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SPACES = {
+    'random_forest': {
+        'n_estimators': [25, 50, 100, 200],
+        'max_depth': [4, 6, 8, 10, 14, None],
+        'min_samples_leaf': [1, 2, 5, 10],
+        'max_features': [1.0, 0.7, 'sqrt']
+    },
+    'gradient_boosting': {
+        'n_estimators': [50, 100, 200],
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'max_depth': [2, 3, 4, 6],
+        'subsample': [0.7, 0.85, 1.0]
+    },
+    'sgd': {
+        'alpha': [0.00001, 0.0001, 0.001, 0.01],
+        'loss': ['squared_error', 'huber'],
+        'penalty': ['l2', 'elasticnet'],
+        'eta0': [0.001, 0.01, 0.05]
+    }
+}
+
+# Models trained with another predictor model's tuned params, noted in the tuning report
+SHARED_PARAMS = {
+    'customer_prediction': {
+        'probability_model': "RandomForestClassifier reuses the params tuned on the timing regressor; "
+                             "its purchase probability is not scored during tuning"
+    }
+}
+
+ESTIMATORS = {
+    'random_forest': RandomForestRegressor,
+    'gradient_boosting': GradientBoostingRegressor,
+    'sgd': SGDRegressor
+}
+
+def model_type_for(name: str) -> str:
+    """Estimator family each predictor trains"""
+    if name == 'budget_optimization':
+        return 'sgd' if Settings.get_model_config()['budget_model_type'] == 'sgd' else 'gradient_boosting'
+    return 'random_forest'
+
+def _make_estimator(model_type: str, params: Dict[str, Any]):
+    estimator = ESTIMATORS[model_type](random_state=42, **params)
+    if model_type == 'random_forest':
+        # Parallelism comes from running trials side by side
+        estimator.set_params(n_jobs=1)
+    return estimator
+
+def _single_row_latency_ms(model, X: np.ndarray, repeats: int = 25) -> float:
+    """Median latency of a one-row predict, matching how the API calls the models"""
+    
+    row = X[:1]
+    model.predict(row)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1000)
+
+def _evaluate_trial(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Cross-validate one configuration on a row subset of the cached features"""
+    
+    X = np.load(task['X_path'], mmap_mode='r')
+    y = np.load(task['y_path'], mmap_mode='r')
+    
+    # Same row order for every trial, so configs on a rung see identical data
+    rows = np.sort(np.random.default_rng(task['seed']).permutation(len(X))[:task['n_rows']])
+    X_sub = np.asarray(X[rows])
+    y_sub = np.asarray(y[rows])
+    
+    result = {'params': task['params'], 'n_rows': len(rows)}
+    started = time.perf_counter()
+    
+    try:
+        errors = []
+        folds = KFold(task['cv_folds'], shuffle=True, random_state=task['seed'])
+        for train_idx, test_idx in folds.split(X_sub):
+            model = _make_estimator(task['model_type'], task['params'])
+            model.fit(X_sub[train_idx], y_sub[train_idx])
+            errors.append(mean_absolute_error(y_sub[test_idx], model.predict(X_sub[test_idx])))
+        
+        result['error'] = float(np.mean(errors))
+        result['latency_ms'] = _single_row_latency_ms(model, X_sub)
+    except Exception as e:
+        logger.warning(f"Trial {task['params']} failed: {e}")
+        result['error'] = float('inf')
+        result['latency_ms'] = float('inf')
+    
+    result['fit_seconds'] = time.perf_counter() - started
+    return result
+
+class HyperparameterTuner:
+    """
+    Searches each predictor's hyperparameters with successive halving:
+    - features are extracted once per training set and cached as .npy files
+      that trial processes memory-map instead of receiving pickled copies
+    - every rung evaluates the surviving configs in parallel processes on a
+      growing row subset; only the best 1/eta advance, so bad configs stop early
+    - among finalists within latency_tolerance of the best error, the fastest
+      single-row predictor wins, favouring smaller models when accuracy ties
+    """
+    
+    def __init__(self, workers: Optional[int] = None, eta: int = 3, min_rows: int = 50,
+                 cv_folds: int = 3, latency_tolerance: Optional[float] = None,
+                 random_state: int = 42):
+        config = Settings.get_model_config()['tuning']
+        self.workers = max(1, workers or config['workers'])
+        self.eta = max(2, eta)
+        self.min_rows = max(cv_folds * 2, min_rows)
+        self.cv_folds = cv_folds
+        self.latency_tolerance = config['latency_tolerance'] if latency_tolerance is None else latency_tolerance
+        self.random_state = random_state
+        self.cache_path = config['cache_path']
+    
+    def cache_features(self, name: str, training_data: List[Dict[str, Any]]) -> Tuple[str, str, int]:
+        """
+        Extract and scale features once, keyed by a fingerprint of the training data
+        
+        The key includes the extraction date: features such as customer
+        recency are measured against today, so a cached matrix is only
+        reused on the day it was built. Entries from earlier days are
+        deleted.
+        
+        Returns:
+            (X_path, y_path, n_rows)
+        """
+        
+        from precompute import create_predictor
+        
+        os.makedirs(self.cache_path, exist_ok=True)
+        extracted_on = datetime.now().strftime('%Y%m%d')
+        self._prune_cache(extracted_on)
+        
+        prefix = os.path.join(self.cache_path, f"{name}-{extracted_on}-{FrameCache.fingerprint(training_data)}")
+        X_path, y_path = f"{prefix}-X.npy", f"{prefix}-y.npy"
+        
+        if os.path.exists(X_path) and os.path.exists(y_path):
+            return X_path, y_path, len(np.load(y_path, mmap_mode='r'))
+        
+        # Customer predictor returns (X, y_timing, X, y_prob); the timing target is tuned
+        prepared = create_predictor(name)._prepare_training_data(training_data)
+        X, y = prepared[0], prepared[1]
+        scale_in_place(StandardScaler(), X)
+        
+        for path, array in ((X_path, X), (y_path, y)):
+            tmp_path = f"{path}.tmp.npy"
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+        
+        return X_path, y_path, len(y)
+    
+    def _prune_cache(self, extracted_on: str):
+        """Delete cached matrices extracted on any other day"""
+        
+        for path in glob.glob(os.path.join(self.cache_path, '*.npy')):
+            if f"-{extracted_on}-" not in os.path.basename(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.debug(f"Could not remove stale tuning cache {path}: {e}")
+    
+    def _rung_rows(self, n_rows: int, rungs: int) -> List[int]:
+        return [max(self.min_rows, int(n_rows / self.eta ** (rungs - 1 - i))) for i in range(rungs)]
+    
+    def _successive_halving(self, evaluate: Callable, base_task: Dict[str, Any],
+                            configs: List[Dict[str, Any]], rung_rows: List[int]) -> List[Dict[str, Any]]:
+        """Run one bracket; returns every trial, tagged with its rung"""
+        
+        trials = []
+        survivors = configs
+        
+        for rung, n_rows in enumerate(rung_rows):
+            tasks = [{**base_task, 'params': params, 'n_rows': n_rows} for params in survivors]
+            results = list(evaluate(_evaluate_trial, tasks))
+            for result in results:
+                result['rung'] = rung
+            trials.extend(results)
+            
+            keep = max(1, len(results) // self.eta)
+            survivors = [r['params'] for r in sorted(results, key=lambda r: r['error'])[:keep]]
+            logger.info(f"Rung {rung}: {len(results)} configs on {n_rows} rows, "
+                        f"best MAE {min(r['error'] for r in results):.4f}")
+        
+        return trials
+    
+    def _select(self, finalists: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Fastest finalist whose error is within tolerance of the best"""
+        
+        best_error = min(f['error'] for f in finalists)
+        eligible = [f for f in finalists if f['error'] <= best_error * (1 + self.latency_tolerance)]
+        return min(eligible, key=lambda f: (f['latency_ms'], f['error']))
+    
+    def tune(self, name: str, training_data: List[Dict[str, Any]], n_candidates: int = 27,
+             hyperband: bool = False, save: bool = True) -> Dict[str, Any]:
+        """
+        Search hyperparameters for one predictor
+        
+        Args:
+            name: Predictor name ('creative_fatigue', 'budget_optimization',
+                  'customer_prediction' or 'product_velocity')
+            training_data: Samples in the predictor's train_model format
+            n_candidates: Configs in the first rung (successive halving only)
+            hyperband: Run Hyperband brackets, trading candidate count against
+                       starting rows, instead of a single halving bracket
+            save: Persist the result so the next train_model uses best_params
+        
+        Returns:
+            Tuning report with best_params, its error and latency, and all trials
+        """
+        
+        started = time.perf_counter()
+        model_type = model_type_for(name)
+        search_space = SEARCH_SPACES[model_type]
+        
+        X_path, y_path, n_rows = self.cache_features(name, training_data)
+        if n_rows < self.min_rows:
+            return {'error': 'insufficient_data', 'training_samples': n_rows}
+        
+        base_task = {
+            'X_path': X_path,
+            'y_path': y_path,
+            'model_type': model_type,
+            'cv_folds': self.cv_folds,
+            'seed': self.random_state
+        }
+        
+        max_rungs = int(math.log(n_rows / self.min_rows, self.eta)) + 1
+        if hyperband:
+            brackets = [
+                (math.ceil(max_rungs / (s + 1) * self.eta ** s), s + 1)
+                for s in reversed(range(max_rungs))
+            ]
+        else:
+            brackets = [(n_candidates, min(max_rungs, int(math.log(n_candidates, self.eta)) + 1))]
+        
+        trials = []
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        try:
+            evaluate = pool.map if pool else map
+            for bracket, (n_configs, rungs) in enumerate(brackets):
+                configs = list(ParameterSampler(search_space, n_configs,
+                                                random_state=self.random_state + bracket))
+                bracket_trials = self._successive_halving(evaluate, base_task, configs,
+                                                          self._rung_rows(n_rows, rungs))
+                for trial in bracket_trials:
+                    trial['bracket'] = bracket
+                trials.extend(bracket_trials)
+        finally:
+            if pool:
+                pool.shutdown()
+        
+        finalists = [t for t in trials if t['n_rows'] == n_rows and math.isfinite(t['error'])]
+        if not finalists:
+            return {'error': 'all_trials_failed', 'trials': trials}
+        
+        best = self._select(finalists)
+        most_accurate = min(finalists, key=lambda f: f['error'])
+        
+        result = {
+            'name': name,
+            'model_type': model_type,
+            'search_space': search_space,
+            'best_params': best['params'],
+            'best_error': best['error'],
+            'best_latency_ms': best['latency_ms'],
+            'most_accurate_params': most_accurate['params'],
+            'most_accurate_error': most_accurate['error'],
+            'latency_tolerance': self.latency_tolerance,
+            'training_samples': n_rows,
+            'shared_params': SHARED_PARAMS.get(name, {}),
+            'n_trials': len(trials),
+            'brackets': len(brackets),
+            'workers': self.workers,
+            'duration_seconds': time.perf_counter() - started,
+            'trials': trials
+        }
+        
+        if save:
+            save_tuning_result(name, result)
+        
+        logger.info(f"Tuned {name}: MAE {best['error']:.4f}, {best['latency_ms']:.2f} ms/row "
+                    f"with {best['params']} ({len(trials)} trials)")
+        
+        return result
@@ -0,0 +1,196 @@
+"""
+Deadline-Aware Admission Control
+Bounded per-endpoint queues that shed load before a request would miss its deadline
+"""
+
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """A request could neither be queued nor served by a fallback within its deadline"""
+    
+    def __init__(self, endpoint: str, reason: str, retry_after: float):
+        super().__init__(f"{endpoint} is overloaded ({reason}), retry in {retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+
+class _EndpointState:
+    def __init__(self, max_concurrency: int):
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.queued = 0
+        self.shedding = 0
+        self.service_time: Optional[float] = None  # EWMA, seconds
+        self.fallback_time: Optional[float] = None
+        self.stats = {'requests': 0, 'admitted': 0, 'shed': 0, 'rejected': 0}
+        self.reasons: Dict[str, int] = {}
+
+class AdmissionController:
+    """
+    Per-endpoint admission control driven by request deadlines
+    
+    Each endpoint runs at most max_concurrency computations; up to max_queue
+    more wait for a slot. Service times are tracked as an EWMA, so the wait a
+    new request faces can be estimated from its queue position. When the queue
+    is full, or the estimated wait plus service time exceeds the request's
+    remaining deadline, the request is shed at once instead of queueing: it is
+    served by the endpoint's cheaper fallback (the rule-based tier) if one fits
+    the deadline, and rejected otherwise. Nobody waits past their deadline, so
+    tail latency stays bounded however far arrivals exceed capacity.
+    
+    All state is touched from the event loop only, so no locking is needed.
+    """
+    
+    def __init__(self, max_concurrency: Optional[int] = None, max_queue: Optional[int] = None,
+                 default_deadline: Optional[float] = None, max_deadline: Optional[float] = None,
+                 smoothing: float = 0.2):
+        config = Settings.get_admission_config()
+        self.max_concurrency = max(1, max_concurrency or config['max_concurrency'])
+        self.max_queue = max(0, config['max_queue'] if max_queue is None else max_queue)
+        self.default_deadline = default_deadline or config['default_deadline'].total_seconds()
+        self.max_deadline = max_deadline or config['max_deadline'].total_seconds()
+        self.smoothing = smoothing
+        self._endpoints: Dict[str, _EndpointState] = {}
+    
+    def _state(self, endpoint: str) -> _EndpointState:
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            state = self._endpoints[endpoint] = _EndpointState(self.max_concurrency)
+        return state
+    
+    def _smooth(self, average: Optional[float], sample: float) -> float:
+        return sample if average is None else average + self.smoothing * (sample - average)
+    
+    def deadline(self, budget_ms: Optional[float] = None) -> float:
+        """
+        Absolute deadline (time.monotonic() clock) for a request arriving now
+        
+        Args:
+            budget_ms: Client latency budget, e.g. from the deadline header;
+                       missing or non-positive values use the default, and
+                       budgets are capped at the request timeout
+        """
+        if budget_ms is None or budget_ms <= 0:
+            budget = self.default_deadline
+        else:
+            budget = min(budget_ms / 1000, self.max_deadline)
+        return time.monotonic() + budget
+    
+    def estimated_wait(self, endpoint: str) -> float:
+        """Seconds a request arriving now would wait for a slot"""
+        
+        state = self._state(endpoint)
+        # Completions needed before a slot frees up for the new request
+        ahead = state.active + state.queued - self.max_concurrency + 1
+        if ahead <= 0:
+            return 0.0
+        return math.ceil(ahead / self.max_concurrency) * (state.service_time or 0.0)
+    
+    async def run(self, endpoint: str, deadline: float, compute: Callable[[], Awaitable[Any]],
+                  fallback: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """
+        Admit, shed or reject one request
+        
+        Args:
+            endpoint: Admission namespace (one queue per API endpoint)
+            deadline: Absolute deadline from deadline()
+            compute: Starts the full computation
+            fallback: Starts the cheaper computation served when shedding;
+                      None rejects shed requests instead
+        
+        Returns:
+            The result of compute() or fallback()
+        
+        Raises:
+            AdmissionRejected: The request was shed and no fallback fits its deadline
+        """
+        
+        state = self._state(endpoint)
+        state.stats['requests'] += 1
+        
+        service_time = state.service_time or 0.0
+        remaining = deadline - time.monotonic()
+        
+        if state.queued >= self.max_queue and state.slots.locked():
+            return await self._shed(endpoint, state, deadline, fallback, 'queue_full')
+        if self.estimated_wait(endpoint) + service_time > remaining:
+            return await self._shed(endpoint, state, deadline, fallback, 'deadline')
+        
+        state.queued += 1
+        try:
+            admitted = await self._acquire(state, remaining - service_time)
+        finally:
+            state.queued -= 1
+        
+        if not admitted:
+            return await self._shed(endpoint, state, deadline, fallback, 'queue_timeout')
+        
+        state.active += 1
+        state.stats['admitted'] += 1
+        started = time.monotonic()
+        try:
+            return await compute()
+        finally:
+            state.active -= 1
+            state.slots.release()
+            state.service_time = self._smooth(state.service_time, time.monotonic() - started)
+    
+    async def _acquire(self, state: _EndpointState, timeout: float) -> bool:
+        """Wait for a slot, giving up once waiting longer would miss the deadline"""
+        
+        if not state.slots.locked():
+            await state.slots.acquire()
+            return True
+        
+        try:
+            await asyncio.wait_for(state.slots.acquire(), timeout=max(0.0, timeout))
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    async def _shed(self, endpoint: str, state: _EndpointState, deadline: float,
+                    fallback: Optional[Callable[[], Awaitable[Any]]], reason: str) -> Any:
+        state.reasons[reason] = state.reasons.get(reason, 0) + 1
+        remaining = deadline - time.monotonic()
+        
+        # Fallbacks skip the queue, but are bounded too so shedding cannot itself overload
+        if (fallback is not None and state.shedding < max(1, self.max_queue)
+                and (state.fallback_time or 0.0) <= remaining):
+            state.stats['shed'] += 1
+            state.shedding += 1
+            started = time.monotonic()
+            try:
+                return await fallback()
+            finally:
+                state.shedding -= 1
+                state.fallback_time = self._smooth(state.fallback_time, time.monotonic() - started)
+        
+        state.stats['rejected'] += 1
+        retry_after = max(self.estimated_wait(endpoint), state.service_time or 0.0)
+        logger.warning(f"Rejected {endpoint} request: {reason}")
+        raise AdmissionRejected(endpoint, reason, retry_after)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Per-endpoint queue depth, service times and admission outcomes"""
+        return {
+            endpoint: {
+                **state.stats,
+                'active': state.active,
+                'queued': state.queued,
+                'shed_reasons': dict(state.reasons),
+                'service_time_ms': round(state.service_time * 1000, 2) if state.service_time is not None else None,
+                'fallback_time_ms': round(state.fallback_time * 1000, 2) if state.fallback_time is not None else None,
+                'estimated_wait_ms': round(self.estimated_wait(endpoint) * 1000, 2)
+            }
+            for endpoint, state in self._endpoints.items()
+        }
+
+admission_controller = AdmissionController()
@@ -0,0 +1,159 @@
+"""
+Calendar Feature Table
+Process-wide calendar features indexed by epoch day, gathered per row instead of recomputed
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SEASONS = ('winter', 'spring', 'summer', 'fall')
+
+# Month (1-12) -> index into SEASONS
+_MONTH_SEASON = np.array([-1, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.int8)
+
+CALENDAR_FEATURES = ('year', 'month', 'day_of_week', 'day_of_month', 'quarter',
+                     'is_weekend', 'is_month_end', 'is_quarter_end', 'season')
+
+class _Table:
+    """Immutable block of calendar features for epoch days [first_day, first_day + len)"""
+    
+    def __init__(self, first_day: int, n_days: int):
+        self.first_day = first_day
+        self.n_days = n_days
+        
+        index = pd.DatetimeIndex(np.arange(first_day, first_day + n_days).astype('datetime64[D]'))
+        month = index.month.to_numpy(dtype=np.int32)
+        day_of_month = index.day.to_numpy(dtype=np.int32)
+        
+        self.columns: Dict[str, np.ndarray] = {
+            'year': index.year.to_numpy(dtype=np.int32),
+            'month': month,
+            'day_of_week': index.dayofweek.to_numpy(dtype=np.int32),
+            'day_of_month': day_of_month,
+            'quarter': index.quarter.to_numpy(dtype=np.int32),
+            'is_weekend': index.dayofweek.to_numpy() >= 5,
+            'is_month_end': day_of_month >= 28,
+            'is_quarter_end': (month % 3 == 0) & (day_of_month >= 28),
+            'season': _MONTH_SEASON[month]
+        }
+    
+    def covers(self, lo: int, hi: int) -> bool:
+        return lo >= self.first_day and hi < self.first_day + self.n_days
+
+class CalendarTable:
+    """
+    Calendar features for every day in a range, stored as typed arrays
+    
+    Every merchant shares one calendar, so the features are computed once per
+    process and per-row extraction is a single np.take on the epoch-day
+    offsets. The range grows automatically (by at least pad_days) when dates
+    outside it show up; readers always see a complete, immutable table.
+    """
+    
+    def __init__(self, start: str = '2000-01-01', end: str = '2040-01-01', pad_days: int = 366):
+        self.pad_days = pad_days
+        first_day = int(np.datetime64(start, 'D').astype(np.int64))
+        last_day = int(np.datetime64(end, 'D').astype(np.int64))
+        self._table = _Table(first_day, last_day - first_day)
+        self._lock = threading.Lock()
+        self.extensions = 0
+    
+    @staticmethod
+    def epoch_days(dates: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Days since 1970-01-01 for each date (timezone-aware dates use their local day)
+        
+        Returns:
+            (days, valid): int64 epoch days and a mask that is False for NaT
+        """
+        
+        index = pd.DatetimeIndex(dates)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        
+        values = index.to_numpy()
+        valid = ~np.isnat(values)
+        days = values.astype('datetime64[D]').astype(np.int64)
+        return days, valid
+    
+    def _covering(self, lo: int, hi: int) -> _Table:
+        table = self._table
+        if table.covers(lo, hi):
+            return table
+        
+        with self._lock:
+            table = self._table
+            if not table.covers(lo, hi):
+                first_day = min(table.first_day, lo - self.pad_days)
+                end_day = max(table.first_day + table.n_days, hi + 1 + self.pad_days)
+                table = self._table = _Table(first_day, end_day - first_day)
+                self.extensions += 1
+                logger.info(f"Calendar table extended to {table.n_days} days")
+        return table
+    
+    def take(self, dates: Any, features: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Gather calendar features for each date
+        
+        Args:
+            dates: Datetime-like Series, index or array
+            features: Subset of CALENDAR_FEATURES (default: all)
+        
+        Returns:
+            {feature: array aligned with dates}; season is a Categorical.
+            Like the .dt accessors, NaT gives NaN numbers, False flags and a
+            missing season.
+        """
+        
+        features = CALENDAR_FEATURES if features is None else tuple(features)
+        days, valid = self.epoch_days(dates)
+        all_valid = bool(valid.all())
+        
+        if all_valid and len(days):
+            table = self._covering(int(days.min()), int(days.max()))
+        elif valid.any():
+            table = self._covering(int(days[valid].min()), int(days[valid].max()))
+        else:
+            table = self._table
+        
+        offsets = days - table.first_day
+        if not all_valid:
+            offsets[~valid] = 0
+        
+        result = {}
+        for name in features:
+            values = np.take(table.columns[name], offsets)
+            
+            if name == 'season':
+                if not all_valid:
+                    values[~valid] = -1
+                result[name] = pd.Categorical.from_codes(values, categories=list(SEASONS))
+            elif not all_valid:
+                if values.dtype == bool:
+                    values[~valid] = False
+                else:
+                    values = values.astype(float)
+                    values[~valid] = np.nan
+                result[name] = values
+            else:
+                result[name] = values
+        
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        table = self._table
+        first = np.datetime64(table.first_day, 'D')
+        return {
+            'first_day': str(first),
+            'last_day': str(first + (table.n_days - 1)),
+            'days': table.n_days,
+            'extensions': self.extensions
+        }
+
+calendar_table = CalendarTable()
@@ -9,8 +9,30 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 import logging
 
+from utils.calendar_table import calendar_table
+from utils.frame_cache import frame_cache
+
 logger = logging.getLogger(__name__)
 
+# Derived metric -> (numerator, denominator) added by process_historical_data
+DERIVED_METRICS = {
+    'calculated_ctr': ('clicks', 'impressions'),
+    'calculated_cpc': ('spend', 'clicks'),
+    'roas': ('revenue', 'spend')
+}
+
+# Aggregation per metric for aggregate_by_period: volumes add up, rates are averaged
+PERIOD_AGGREGATIONS = {
+    'revenue': 'sum',
+    'spend': 'sum',
+    'orders': 'sum',
+    'impressions': 'sum',
+    'clicks': 'sum',
+    'ctr': 'mean',
+    'cpm': 'mean',
+    'roas': 'mean'
+}
+
 class DataProcessor:
     """Utility class for data processing and validation"""
     
@@ -67,6 +89,9 @@ class DataProcessor:
         """
         Process historical performance data
         
+        Parsed frames are memoized by content fingerprint, so the same history
+        is only processed once per request. Treat existing values as read-only.
+        
         Args:
             data: List of historical data points
             
@@ -77,34 +102,90 @@ class DataProcessor:
         if not data:
             return pd.DataFrame()
         
+        return frame_cache.get_or_compute(
+            'historical', data, DataProcessor._process_historical_data
+        )
+    
+    @staticmethod
+    def _process_historical_data(data: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Uncached body of process_historical_data"""
+        
         df = pd.DataFrame(data)
         
         # Ensure date column
         if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            df = df.dropna(subset=['date'])
+            df = DataProcessor.clean_dated_frame(df)
             df = df.sort_values('date')
         else:
             logger.warning("No date column found in historical data")
             return pd.DataFrame()
         
+        return DataProcessor.derive_metrics(df)
+    
+    @staticmethod
+    def derive_metrics(df: pd.DataFrame) -> pd.DataFrame:
+        """Add the DERIVED_METRICS whose inputs are present (in place)"""
+        
+        for name, (numerator, denominator) in DERIVED_METRICS.items():
+            if numerator in df.columns and denominator in df.columns:
+                df[name] = df[numerator] / df[denominator].replace(0, 1)
+        
+        return df
+    
+    @staticmethod
+    def clean_dated_frame(df: pd.DataFrame, extra_numeric: Tuple[str, ...] = ()) -> pd.DataFrame:
+        """
+        Coerce the date column (dropping unparseable rows) and the numeric
+        metric columns (invalid values become 0); row order is kept
+        
+        Args:
+            df: DataFrame with a date column; modified in place where possible
+            extra_numeric: Columns to clean besides the standard metrics
+            
+        Returns:
+            Cleaned DataFrame
+        """
+        
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        df = df.dropna(subset=['date'])
+        
         # Clean numeric columns
-        numeric_cols = ['revenue', 'spend', 'orders', 'impressions', 'clicks', 'ctr', 'cpm']
+        numeric_cols = ['revenue', 'spend', 'orders', 'impressions', 'clicks', 'ctr', 'cpm', *extra_numeric]
         for col in numeric_cols:
             if col in df.columns:
                 df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
         
-        # Calculate derived metrics
-        if 'clicks' in df.columns and 'impressions' in df.columns:
-            df['calculated_ctr'] = df['clicks'] / df['impressions'].replace(0, 1)
+        return df
+    
+    @staticmethod
+    def process_dated_records(data: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        Parse records with a date column into a date-sorted DataFrame
+        
+        Used for purchase and sales histories, which carry their own value
+        columns. Memoized like process_historical_data.
+        
+        Args:
+            data: List of records with a 'date' field
+            
+        Returns:
+            DataFrame sorted by date
+        """
         
-        if 'spend' in df.columns and 'clicks' in df.columns:
-            df['calculated_cpc'] = df['spend'] / df['clicks'].replace(0, 1)
+        if not data:
+            return pd.DataFrame()
         
-        if 'revenue' in df.columns and 'spend' in df.columns:
-            df['roas'] = df['revenue'] / df['spend'].replace(0, 1)
+        return frame_cache.get_or_compute(
+            'dated', data, DataProcessor._process_dated_records
+        )
+    
+    @staticmethod
+    def _process_dated_records(data: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Uncached body of process_dated_records"""
         
-        return df
+        df = pd.DataFrame(data)
+        df['date'] = pd.to_datetime(df['date'])
+        return df.sort_values('date', kind='mergesort').reset_index(drop=True)
     
     @staticmethod
     def extract_time_features(df: pd.DataFrame) -> pd.DataFrame:
@@ -123,25 +204,9 @@ class DataProcessor:
         
         df = df.copy()
         
-        # Extract time components
-        df['year'] = df['date'].dt.year
-        df['month'] = df['date'].dt.month
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['day_of_month'] = df['date'].dt.day
-        df['quarter'] = df['date'].dt.quarter
-        
-        # Business time features
-        df['is_weekend'] = df['day_of_week'].isin([5, 6])
-        df['is_month_end'] = df['day_of_month'] >= 28
-        df['is_quarter_end'] = df['month'].isin([3, 6, 9, 12]) & (df['day_of_month'] >= 28)
-        
-        # Seasonal features
-        df['season'] = df['month'].map({
-            12: 'winter', 1: 'winter', 2: 'winter',
-            3: 'spring', 4: 'spring', 5: 'spring',
-            6: 'summer', 7: 'summer', 8: 'summer',
-            9: 'fall', 10: 'fall', 11: 'fall'
-        })
+        # Time components, business flags and season, gathered from the shared calendar
+        for name, values in calendar_table.take(df['date']).items():
+            df[name] = values
         
         return df
     
@@ -226,20 +291,8 @@ class DataProcessor:
         df = df.copy()
         df.set_index('date', inplace=True)
         
-        # Aggregation functions for different metrics
-        agg_funcs = {
-            'revenue': 'sum',
-            'spend': 'sum',
-            'orders': 'sum',
-            'impressions': 'sum',
-            'clicks': 'sum',
-            'ctr': 'mean',
-            'cpm': 'mean',
-            'roas': 'mean'
-        }
-        
         # Filter aggregation functions to only include existing columns
-        agg_funcs = {col: func for col, func in agg_funcs.items() if col in df.columns}
+        agg_funcs = {col: func for col, func in PERIOD_AGGREGATIONS.items() if col in df.columns}
         
         if not agg_funcs:
             return pd.DataFrame()
@@ -289,6 +342,135 @@ class DataProcessor:
         
         return result
     
+    @staticmethod
+    def aggregate_by_period_multi(df: pd.DataFrame, period: str = 'D',
+                                  series_column: str = 'merchant_id') -> pd.DataFrame:
+        """
+        Aggregate many series of a long (series, date) table by time period
+        
+        One groupby over the whole table, then a reindex onto each series' full
+        run of periods. The rows of each series equal aggregate_by_period on
+        that series alone: periods run from its own first to its own last
+        period, with empty periods summing to 0 and averaging to NaN.
+        
+        Args:
+            df: Long DataFrame with series_column and date columns
+            period: Period for aggregation ('D', 'W', 'ME', 'QE', 'YE', ...)
+            series_column: Column identifying the series (merchant, creative, ...)
+            
+        Returns:
+            Aggregated DataFrame with series_column and date first, sorted by both
+        """
+        
+        if 'date' not in df.columns or series_column not in df.columns or df.empty:
+            return df
+        
+        agg_funcs = {col: func for col, func in PERIOD_AGGREGATIONS.items() if col in df.columns}
+        
+        if not agg_funcs:
+            return pd.DataFrame()
+        
+        offset = pd.tseries.frequencies.to_offset(period)
+        if DataProcessor._anchored_at_first_day(offset):
+            # Such bins start at each series' own first day, so they can't be shared
+            return pd.concat([
+                DataProcessor.aggregate_by_period(group, period).assign(**{series_column: key})
+                for key, group in df.groupby(series_column, sort=True)
+            ])[[series_column, 'date', *agg_funcs]].reset_index(drop=True)
+        
+        # Stable sort so every bin sums its rows in the same order resample would
+        df = df.sort_values([series_column, 'date'], kind='stable')
+        observed = df.groupby([series_column, pd.Grouper(key='date', freq=offset)], sort=True).agg(agg_funcs)
+        if observed.empty:
+            return pd.DataFrame(columns=[series_column, 'date', *agg_funcs])
+        
+        # Every period between each series' first and last observed one
+        keys = observed.index.get_level_values(0)
+        labels = observed.index.get_level_values(1)
+        periods = pd.date_range(labels.min(), labels.max(), freq=offset)
+        bounds = pd.Series(periods.get_indexer(labels)).groupby(pd.factorize(keys)[0]).agg(['min', 'max'])
+        counts = (bounds['max'] - bounds['min'] + 1).to_numpy()
+        steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        grid = pd.MultiIndex.from_arrays([
+            keys.unique().repeat(counts),
+            periods[np.repeat(bounds['min'].to_numpy(), counts) + steps]
+        ], names=[series_column, 'date'])
+        
+        aggregated = observed.reindex(grid)
+        for col, func in agg_funcs.items():
+            if func == 'sum':
+                aggregated[col] = aggregated[col].fillna(0).astype(observed[col].dtype)
+        
+        return aggregated.reset_index()
+    
+    @staticmethod
+    def _anchored_at_first_day(offset: pd.DateOffset) -> bool:
+        """Whether resample bins depend on the first day of the data (fixed periods not dividing a day)"""
+        if isinstance(offset, pd.offsets.Day):
+            length = pd.Timedelta(days=offset.n)
+        elif isinstance(offset, pd.offsets.Tick):
+            length = pd.Timedelta(offset)
+        else:
+            return False
+        return pd.Timedelta(days=1) % length != pd.Timedelta(0)
+    
+    @staticmethod
+    def fill_missing_dates_multi(df: pd.DataFrame, start_date: Optional[datetime] = None,
+                                 end_date: Optional[datetime] = None,
+                                 series_column: str = 'merchant_id') -> pd.DataFrame:
+        """
+        Fill missing dates of many series in a long (series, date) table
+        
+        Builds every series' full date range at once and does a single merge.
+        The rows of each series equal fill_missing_dates on that series alone,
+        except that series_column is filled on the added rows too.
+        
+        Args:
+            df: Long DataFrame with series_column and date columns
+            start_date: Start date for every series (default: each series' min date)
+            end_date: End date for every series (default: each series' max date)
+            series_column: Column identifying the series (merchant, creative, ...)
+            
+        Returns:
+            DataFrame with series_column and date first, series in sorted order
+        """
+        
+        if 'date' not in df.columns or series_column not in df.columns or df.empty:
+            return df
+        
+        bounds = df.groupby(series_column, sort=True)['date'].agg(['min', 'max'])
+        starts = pd.DatetimeIndex(bounds['min'])
+        ends = pd.DatetimeIndex(bounds['max'])
+        if start_date is not None:
+            starts = pd.DatetimeIndex([pd.Timestamp(start_date)] * len(bounds))
+        if end_date is not None:
+            ends = pd.DatetimeIndex([pd.Timestamp(end_date)] * len(bounds))
+        
+        # Daily steps are calendar days, so count them on wall-clock time
+        tz = starts.tz
+        if tz is not None:
+            starts, ends = starts.tz_localize(None), ends.tz_localize(None)
+        
+        spans = ((ends - starts) // pd.Timedelta(days=1)).to_numpy(dtype=float, na_value=np.nan)
+        counts = np.where(np.isnan(spans), 0, np.maximum(spans + 1, 0)).astype(np.int64)
+        steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        dates = starts.repeat(counts) + pd.to_timedelta(steps, unit='D')
+        if tz is not None:
+            dates = dates.tz_localize(tz)
+        
+        full_df = pd.DataFrame({
+            series_column: bounds.index.repeat(counts),
+            'date': dates.as_unit(df['date'].dt.unit)
+        })
+        
+        result = full_df.merge(df, on=[series_column, 'date'], how='left')
+        
+        # Fill missing numeric values with 0
+        numeric_cols = result.select_dtypes(include=[np.number]).columns.drop(series_column, errors='ignore')
+        result[numeric_cols] = result[numeric_cols].fillna(0)
+        
+        return result
+    
     @staticmethod
     def calculate_growth_rates(df: pd.DataFrame, periods: List[int] = [1, 7, 30]) -> pd.DataFrame:
         """
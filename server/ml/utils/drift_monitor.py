@@ -0,0 +1,296 @@
+"""
+Feature Drift Monitor
+Fixed-bin feature histograms from training, updated online, compared with PSI and KS
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Floor for empty bins so PSI stays finite
+_MIN_PROPORTION = 1e-4
+
+class DriftProfile:
+    """
+    Per-feature histograms over fixed bin edges
+    
+    Edges are training quantiles, padded with +inf so every feature has the
+    same number of bins; the last column counts missing values. Counts over
+    the same edges are additive, so a profile can absorb more data without
+    keeping any of it.
+    """
+    
+    def __init__(self, feature_names: Sequence[str], edges: np.ndarray, counts: Optional[np.ndarray] = None):
+        self.feature_names = list(feature_names)
+        self.edges = edges
+        self.counts = np.zeros((len(self.feature_names), edges.shape[1] + 2)) if counts is None else counts
+    
+    @property
+    def n_bins(self) -> int:
+        return self.edges.shape[1] + 1
+    
+    @classmethod
+    def fit(cls, X: np.ndarray, feature_names: Optional[Sequence[str]] = None, n_bins: Optional[int] = None,
+            sample_rows: int = 100_000, random_state: int = 0) -> 'DriftProfile':
+        """
+        Reference histograms of a training matrix (read chunk by chunk, so memmaps stay on disk)
+        
+        Args:
+            X: Raw (unscaled) training features
+            feature_names: Column names (default: feature_0, feature_1, ...)
+            n_bins: Bins per feature (default: DRIFT_BINS)
+            sample_rows: Rows sampled to place the quantile edges
+            random_state: Seed for the edge sample
+        """
+        
+        n_bins = n_bins or Settings.get_drift_config()['bins']
+        n_features = X.shape[1]
+        feature_names = feature_names or [f"feature_{i}" for i in range(n_features)]
+        
+        rows = np.arange(len(X))
+        if len(X) > sample_rows:
+            rows = np.sort(np.random.default_rng(random_state).choice(len(X), sample_rows, replace=False))
+        sample = np.asarray(X[rows], dtype=np.float64)
+        
+        edges = np.full((n_features, n_bins - 1), np.inf)
+        quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+        for f in range(n_features):
+            column = sample[:, f]
+            column = column[~np.isnan(column)]
+            if len(column):
+                # Repeated quantiles (discrete features) collapse into one edge
+                unique = np.unique(np.quantile(column, quantiles))
+                edges[f, :len(unique)] = unique
+        
+        profile = cls(feature_names, edges)
+        profile.add(X)
+        return profile
+    
+    def bin_counts(self, X: np.ndarray, chunk_rows: int = 65_536) -> np.ndarray:
+        """(n_features, n_bins + 1) counts of X's rows; values equal to an edge fall in the lower bin"""
+        
+        X = np.atleast_2d(X)
+        if X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected {len(self.feature_names)} features, got {X.shape[1]}")
+        
+        n_features, width = X.shape[1], self.n_bins + 1
+        offsets = np.arange(n_features) * width
+        counts = np.zeros(n_features * width)
+        
+        for start in range(0, len(X), chunk_rows):
+            chunk = np.asarray(X[start:start + chunk_rows], dtype=np.float64)
+            bins = (chunk[:, :, None] > self.edges[None]).sum(axis=2)
+            bins[np.isnan(chunk)] = self.n_bins
+            counts += np.bincount((bins + offsets).ravel(), minlength=n_features * width)
+        
+        return counts.reshape(n_features, width)
+    
+    def add(self, X: np.ndarray):
+        """Fold more rows into the reference counts"""
+        self.counts = self.counts + self.bin_counts(X)
+    
+    def compare(self, live: np.ndarray) -> Dict[str, Dict[str, float]]:
+        """
+        PSI and KS of live counts (same edges) against the reference
+        
+        KS is the largest gap between the two binned CDFs of present values;
+        the missing-value rate is compared separately.
+        """
+        
+        def proportions(counts: np.ndarray) -> np.ndarray:
+            totals = counts.sum(axis=1, keepdims=True)
+            return counts / np.where(totals == 0, 1, totals)
+        
+        ref_present, live_present = self.counts[:, :-1], live[:, :-1]
+        p_ref = proportions(ref_present)
+        p_live = proportions(live_present)
+        
+        floored_ref = np.maximum(p_ref, _MIN_PROPORTION)
+        floored_live = np.maximum(p_live, _MIN_PROPORTION)
+        psi = ((floored_live - floored_ref) * np.log(floored_live / floored_ref)).sum(axis=1)
+        ks = np.abs(np.cumsum(p_live, axis=1) - np.cumsum(p_ref, axis=1)).max(axis=1)
+        
+        missing_ref = proportions(self.counts)[:, -1]
+        missing_live = proportions(live)[:, -1]
+        samples = live.sum(axis=1)
+        
+        return {
+            name: {
+                'psi': float(psi[f]),
+                'ks': float(ks[f]),
+                'missing_rate': float(missing_live[f]),
+                'reference_missing_rate': float(missing_ref[f]),
+                'samples': float(samples[f])
+            }
+            for f, name in enumerate(self.feature_names)
+        }
+
+class _ModelDrift:
+    """Reference profile and decayed live counts of one model's inputs"""
+    
+    def __init__(self, profile: DriftProfile, version: Optional[str], trained_at: Optional[datetime]):
+        self.profile = profile
+        self.version = version
+        self.trained_at = trained_at
+        self.live = np.zeros_like(profile.counts)
+        self.observed = 0
+        self.last_report: Optional[Dict[str, Any]] = None
+
+class DriftMonitor:
+    """
+    Tracks live feature distributions of every served model
+    
+    Predictors register their training profile when they load a model
+    version and pass each feature vector they score to observe(), which
+    only adds to fixed-size count arrays. check() compares the live counts
+    with the reference on a schedule and then decays them, so the live
+    histograms weight recent traffic without storing it. retrain_decision()
+    turns the latest check into a retrain signal: drift beyond the PSI or KS
+    threshold, or a model older than the maximum age.
+    """
+    
+    def __init__(self, psi_threshold: Optional[float] = None, ks_threshold: Optional[float] = None,
+                 min_samples: Optional[int] = None, decay: Optional[float] = None):
+        config = Settings.get_drift_config()
+        self.enabled = config['enabled']
+        self.psi_threshold = psi_threshold or config['psi_threshold']
+        self.ks_threshold = ks_threshold or config['ks_threshold']
+        self.min_samples = min_samples or config['min_samples']
+        self.decay = config['decay'] if decay is None else decay
+        self.max_model_age = config['max_model_age']
+        self._models: Dict[str, _ModelDrift] = {}
+        self._lock = threading.Lock()
+    
+    def set_reference(self, name: str, profile: Optional[DriftProfile], version: Optional[str] = None,
+                      trained_at: Optional[Union[str, datetime]] = None):
+        """Register a model version's training profile; live counts restart when the version changes"""
+        
+        if profile is None:
+            return
+        if isinstance(trained_at, str):
+            trained_at = datetime.fromisoformat(trained_at)
+        
+        with self._lock:
+            state = self._models.get(name)
+            if state is not None and state.version == version and version is not None:
+                return
+            self._models[name] = _ModelDrift(profile, version, trained_at)
+    
+    def observe(self, name: str, features: np.ndarray):
+        """Count live feature vectors (one row or a matrix of rows) for a model"""
+        
+        if not self.enabled:
+            return
+        state = self._models.get(name)
+        if state is None:
+            return
+        
+        try:
+            counts = state.profile.bin_counts(features)
+        except ValueError as e:
+            logger.debug(f"Skipping drift observation for {name}: {e}")
+            return
+        
+        with self._lock:
+            state.live += counts
+            state.observed += int(np.atleast_2d(features).shape[0])
+    
+    def check(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Compare a model's live histograms with its training profile
+        
+        Returns:
+            Report with per-feature PSI/KS, the drifted features and the
+            effective sample count, or None if the model has no profile
+        """
+        
+        state = self._models.get(name)
+        if state is None:
+            return None
+        
+        with self._lock:
+            live = state.live.copy()
+            # Older traffic fades so the next check reflects recent inputs
+            state.live *= self.decay
+        
+        features = state.profile.compare(live)
+        samples = float(live.sum(axis=1).max()) if live.size else 0.0
+        enough = samples >= self.min_samples
+        drifted = [
+            feature for feature, stats in features.items()
+            if enough and (stats['psi'] > self.psi_threshold or stats['ks'] > self.ks_threshold)
+        ]
+        
+        report = {
+            'model_version': state.version,
+            'checked_at': datetime.now().isoformat(),
+            'samples': samples,
+            'enough_samples': enough,
+            'max_psi': max((stats['psi'] for stats in features.values()), default=0.0),
+            'max_ks': max((stats['ks'] for stats in features.values()), default=0.0),
+            'drifted_features': drifted,
+            'features': features
+        }
+        state.last_report = report
+        
+        if drifted:
+            logger.warning(f"Input drift for {name} {state.version}: {', '.join(drifted)}")
+        return report
+    
+    def check_all(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.check(name) for name in list(self._models)}
+    
+    def retrain_decision(self, name: str) -> Dict[str, Any]:
+        """
+        Whether a model should be retrained, from its latest check
+        
+        Returns:
+            {'retrain': bool, 'reason': str, ...}; reasons are 'drift',
+            'max_age', 'no_profile' (no reference, so fall back to the
+            fixed retrain interval), 'insufficient_samples' and 'stable'
+        """
+        
+        state = self._models.get(name)
+        if state is None:
+            return {'retrain': False, 'reason': 'no_profile',
+                    'retrain_interval_hours': Settings.get_model_config()['retrain_interval'].total_seconds() / 3600}
+        
+        report = state.last_report
+        age = datetime.now() - state.trained_at if state.trained_at is not None else None
+        decision = {
+            'model_version': state.version,
+            'model_age_hours': age.total_seconds() / 3600 if age is not None else None,
+            'samples': report['samples'] if report else 0.0,
+            'drifted_features': report['drifted_features'] if report else []
+        }
+        
+        if report and report['drifted_features']:
+            return {'retrain': True, 'reason': 'drift', **decision}
+        if age is not None and self.max_model_age.total_seconds() > 0 and age > self.max_model_age:
+            return {'retrain': True, 'reason': 'max_age', **decision}
+        if not report or not report['enough_samples']:
+            return {'retrain': False, 'reason': 'insufficient_samples', **decision}
+        return {'retrain': False, 'reason': 'stable', **decision}
+    
+    def retrain_decisions(self, names: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        return {name: self.retrain_decision(name) for name in names}
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                'model_version': state.version,
+                'observed': state.observed,
+                'last_check': state.last_report['checked_at'] if state.last_report else None,
+                'drifted_features': state.last_report['drifted_features'] if state.last_report else []
+            }
+            for name, state in list(self._models.items())
+        }
+
+drift_monitor = DriftMonitor()
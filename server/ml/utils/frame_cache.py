@@ -0,0 +1,195 @@
+"""
+Processed Frame Cache
+Memoizes parsed historical data so each history is processed once per request
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Request-scoped memo: {(namespace, fingerprint): frame}, set by FrameCache.request_scope()
+_request_frames: contextvars.ContextVar[Optional[Dict[Tuple[str, str], pd.DataFrame]]] = \
+    contextvars.ContextVar("request_frames", default=None)
+
+# Request-scoped fingerprint memo: {id(data): (data, fingerprint)}
+_request_fingerprints: contextvars.ContextVar[Optional[Dict[int, Tuple[Any, str]]]] = \
+    contextvars.ContextVar("request_fingerprints", default=None)
+
+class FrameCache:
+    """
+    Two-level memo for processed, typed DataFrames:
+    - request scope: every history seen during one request is parsed exactly once
+    - process scope: bounded LRU shared across requests (entries and bytes)
+    
+    Frames are handed out as shallow copies of a frame whose arrays are
+    marked read-only. Callers may add or replace columns freely; writing into
+    existing values in place (.loc assignment, fillna(inplace=True), ...)
+    raises instead of changing the frame every later request is served.
+    """
+    
+    def __init__(self, max_entries: int = 512, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._frames: "OrderedDict[Tuple[str, str], Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'request_hits': 0,
+            'process_hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+    
+    @staticmethod
+    def fingerprint(data: Any) -> str:
+        """
+        Cheap content fingerprint of raw request data
+        
+        Args:
+            data: JSON-like payload (list of records, dict, ...)
+        
+        Returns:
+            Hex digest identifying the content
+        """
+        
+        memo = _request_fingerprints.get()
+        if memo is not None:
+            cached = memo.get(id(data))
+            if cached is not None and cached[0] is data:
+                return cached[1]
+        
+        payload = json.dumps(data, sort_keys=True, default=str, separators=(',', ':'))
+        digest = hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+        
+        if memo is not None:
+            # Holding a reference keeps id(data) from being reused within the request
+            memo[id(data)] = (data, digest)
+        
+        return digest
+    
+    def get_or_compute(self, namespace: str, data: Any,
+                       builder: Callable[[Any], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Return the processed frame for data, building it only on a cache miss
+        
+        Args:
+            namespace: Identifies the processing applied by builder
+            data: Raw data to process
+            builder: Function turning data into a DataFrame
+        
+        Returns:
+            Shallow copy of the cached frame
+        """
+        
+        key = (namespace, self.fingerprint(data))
+        request_frames = _request_frames.get()
+        
+        if request_frames is not None and key in request_frames:
+            with self._lock:
+                self._stats['request_hits'] += 1
+            return request_frames[key].copy(deep=False)
+        
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is not None:
+                self._frames.move_to_end(key)
+                self._stats['process_hits'] += 1
+                frame = entry[0]
+            else:
+                self._stats['misses'] += 1
+                frame = None
+        
+        if frame is None:
+            frame = self._freeze(builder(data))
+            self._store(key, frame)
+        
+        if request_frames is not None:
+            request_frames[key] = frame
+        
+        return frame.copy(deep=False)
+    
+    @staticmethod
+    def _freeze(frame: pd.DataFrame) -> pd.DataFrame:
+        """Mark the NumPy arrays behind frame's columns read-only (in place)"""
+        
+        for column in range(frame.shape[1]):
+            values = frame.iloc[:, column].to_numpy(copy=False)
+            # Column views share the frame's 2-D block; freezing the block guards writes through it
+            while isinstance(values, np.ndarray):
+                values.flags.writeable = False
+                values = values.base
+        return frame
+    
+    def _store(self, key: Hashable, frame: pd.DataFrame):
+        """Insert frame into the process-level LRU, evicting to stay within bounds"""
+        
+        size = int(frame.memory_usage(deep=True).sum()) if not frame.empty else 0
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            
+            self._frames[key] = (frame, size)
+            self._bytes += size
+            
+            while self._frames and (len(self._frames) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._frames.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats['evictions'] += 1
+    
+    @contextmanager
+    def request_scope(self):
+        """Scope the request-level memo; nested scopes share the outer memo"""
+        
+        if _request_frames.get() is not None:
+            yield
+            return
+        
+        frames_token = _request_frames.set({})
+        fingerprints_token = _request_fingerprints.set({})
+        try:
+            yield
+        finally:
+            _request_frames.reset(frames_token)
+            _request_fingerprints.reset(fingerprints_token)
+    
+    def clear(self):
+        """Drop all process-level entries"""
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report cache occupancy and hit rates"""
+        
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._frames)
+            stats['bytes'] = self._bytes
+        
+        lookups = stats['request_hits'] + stats['process_hits'] + stats['misses']
+        hits = stats['request_hits'] + stats['process_hits']
+        stats['lookups'] = lookups
+        stats['hit_rate'] = hits / lookups if lookups > 0 else 0.0
+        
+        return stats
+
+frame_cache = FrameCache(
+    max_entries=Settings.FRAME_CACHE_MAX_ENTRIES,
+    max_bytes=Settings.FRAME_CACHE_MAX_MB * 1024 * 1024
+)
@@ -0,0 +1,57 @@
+"""
+Tuned Hyperparameters
+Per-model hyperparameter overrides written by the tuning subsystem
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+def _tuned_path(name: str) -> str:
+    return os.path.join(Settings.TUNING_RESULTS_PATH, f"{name}.json")
+
+def load_tuning_result(name: str) -> Optional[Dict[str, Any]]:
+    """Latest saved tuning result for a model, or None"""
+    try:
+        with open(_tuned_path(name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_tuning_result(name: str, result: Dict[str, Any]):
+    """Persist a tuning result; its best_params apply to the next train_model"""
+    
+    os.makedirs(Settings.TUNING_RESULTS_PATH, exist_ok=True)
+    path = _tuned_path(name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({**result, 'saved_at': datetime.now().isoformat()}, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+def get_hyperparameters(name: str, defaults: Dict[str, Any], model_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Hyperparameters for a model: tuned values override the predictor's defaults
+    
+    Args:
+        name: Model name (e.g. 'creative_fatigue')
+        defaults: The predictor's built-in hyperparameters
+        model_type: Estimator the parameters are for; results tuned for another type are ignored
+    
+    Returns:
+        Merged hyperparameters
+    """
+    
+    result = load_tuning_result(name)
+    if not result:
+        return dict(defaults)
+    
+    if model_type is not None and result.get('model_type') != model_type:
+        return dict(defaults)
+    
+    return {**defaults, **result.get('best_params', {})}
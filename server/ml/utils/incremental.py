@@ -0,0 +1,87 @@
+"""
+Incremental Model Updates
+Sliding-window forest growth so models can refresh on recent data daily
+"""
+
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+from sklearn.base import is_classifier
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+def load_fitted_scaler(scaler: StandardScaler, path: str) -> Optional[StandardScaler]:
+    """
+    Return the fitted scaler the current model was trained with
+    
+    Incremental updates must reuse the training-time scaling, so an unfitted
+    in-memory scaler is replaced by the one saved next to the model.
+    """
+    
+    if hasattr(scaler, 'mean_'):
+        return scaler
+    if os.path.exists(path):
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            logger.warning(f"Could not load scaler {path}: {e}")
+    return None
+
+def grow_sliding_forest(forest: Any, X: np.ndarray, y: np.ndarray,
+                        new_trees: int, max_trees: int) -> Dict[str, Any]:
+    """
+    Grow new trees on recent data and retire the oldest ones
+    
+    Uses warm_start so existing trees are kept as-is; only new_trees trees are
+    fitted on X, y. The ensemble is then trimmed to the newest max_trees trees,
+    giving a forest whose members cover a sliding window of updates.
+    
+    Args:
+        forest: Fitted RandomForestRegressor or RandomForestClassifier
+        X: Recent (already scaled) features
+        y: Recent targets
+        new_trees: Trees to grow on the recent data
+        max_trees: Maximum ensemble size after the update
+    
+    Returns:
+        Dict with trees_added, trees_retired and n_estimators, or skipped reason
+    """
+    
+    if not hasattr(forest, 'estimators_') or not hasattr(forest, 'set_params'):
+        raise TypeError(f"{type(forest).__name__} cannot be grown; load the full model (compact=False)")
+    
+    if X.shape[1] != forest.n_features_in_:
+        raise ValueError(f"Expected {forest.n_features_in_} features, got {X.shape[1]}")
+    
+    # New classifier trees must agree with the existing class layout
+    if is_classifier(forest) and not np.array_equal(np.unique(y), forest.classes_):
+        logger.warning("Recent data does not cover all classes; skipping forest update")
+        return {'trees_added': 0, 'trees_retired': 0,
+                'n_estimators': len(forest.estimators_), 'skipped': 'missing_classes'}
+    
+    # Fresh seed per update so new trees don't repeat the bootstraps of retired ones
+    update_round = getattr(forest, 'n_updates_', 0) + 1
+    base_seed = forest.random_state if isinstance(forest.random_state, int) else 0
+    
+    forest.set_params(
+        warm_start=True,
+        n_estimators=len(forest.estimators_) + new_trees,
+        random_state=base_seed + update_round
+    )
+    forest.fit(X, y)
+    forest.n_updates_ = update_round
+    
+    retired = max(0, len(forest.estimators_) - max_trees)
+    if retired:
+        forest.estimators_ = forest.estimators_[retired:]
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+    
+    return {
+        'trees_added': new_trees,
+        'trees_retired': retired,
+        'n_estimators': len(forest.estimators_)
+    }
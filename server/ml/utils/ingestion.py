@@ -0,0 +1,374 @@
+"""
+Chunked Export Ingestion
+Streams large order / metric exports into mergeable per-customer and per-day aggregates
+"""
+
+import gzip
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import time
+from itertools import islice
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+import joblib
+import orjson
+import pandas as pd
+
+from settings import Settings
+from utils.data_processor import DataProcessor
+
+logger = logging.getLogger(__name__)
+
+# Additive daily metrics; ratios (ctr, cpm, roas) are derived from the sums at the end
+DAILY_SUM_COLUMNS = ['revenue', 'spend', 'orders', 'impressions', 'clicks', 'amount']
+
+EXPORT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet',
+                  '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+def detect_format(path: str) -> str:
+    """Export format from the file extension (a trailing .gz is ignored)"""
+    
+    name = path[:-3] if path.endswith('.gz') else path
+    fmt = EXPORT_FORMATS.get(os.path.splitext(name)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported export format: {path}")
+    return fmt
+
+def _read_records(handle: BinaryIO, chunk_rows: int, quoted: bool) -> bytes:
+    """
+    Up to chunk_rows lines from handle, extended until no quoted field is left open
+    
+    CSV fields may contain newlines inside quotes; a record boundary is only
+    reached where the quotes seen so far balance (escaped quotes come in pairs).
+    """
+    
+    lines = list(islice(handle, chunk_rows))
+    if quoted:
+        open_quotes = sum(line.count(b'"') for line in lines) % 2
+        while open_quotes:
+            line = handle.readline()
+            if not line:
+                break
+            lines.append(line)
+            open_quotes = (open_quotes + line.count(b'"')) % 2
+    return b''.join(lines)
+
+def _read_ndjson(data: bytes, string_columns: Sequence[str]) -> pd.DataFrame:
+    """Parse NDJSON records, keeping string_columns as the str of each JSON value"""
+    
+    records = [orjson.loads(line) for line in data.splitlines() if line.strip()]
+    chunk = pd.DataFrame.from_records(records)
+    for column in string_columns:
+        if column in chunk.columns:
+            # Built from the parsed values: a null in the column must not turn 1000 into 1000.0
+            chunk[column] = pd.Series(
+                [None if record.get(column) is None else str(record[column]) for record in records],
+                index=chunk.index, dtype=object
+            )
+    return chunk
+
+def iter_export_chunks(path: str, chunk_rows: int, fmt: Optional[str] = None, skip_chunks: int = 0,
+                       offset: int = 0, string_columns: Sequence[str] = ()
+                       ) -> Iterator[Tuple[pd.DataFrame, Optional[float], Optional[int]]]:
+    """
+    Read an export as DataFrames of about chunk_rows rows
+    
+    CSV and NDJSON are cut into chunks on record boundaries and each chunk is
+    parsed on its own, so the position after every chunk is an exact byte
+    offset that a later call can seek to.
+    
+    Args:
+        path: CSV, Parquet or NDJSON file
+        chunk_rows: Rows per chunk (CSV records spanning lines may make a chunk longer)
+        fmt: 'csv', 'parquet' or 'ndjson' (default: from the extension)
+        skip_chunks: Leading Parquet batches to skip when resuming; they are
+                     not converted to pandas
+        offset: CSV/NDJSON position to resume from, as yielded with an
+                earlier chunk; nothing before it is parsed (gzipped files are
+                still decompressed up to it)
+        string_columns: Columns read as strings (nulls stay null) instead of
+                        having their type inferred per chunk, e.g. IDs
+    
+    Yields:
+        (chunk, fraction, offset): the chunk, the approximate share of the
+        file read so far and the CSV/NDJSON offset after the chunk (None
+        for Parquet)
+    """
+    
+    fmt = fmt or detect_format(path)
+    
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        parquet_file = pq.ParquetFile(path)
+        total_rows = parquet_file.metadata.num_rows or 1
+        rows_read = 0
+        for index, batch in enumerate(parquet_file.iter_batches(batch_size=chunk_rows)):
+            rows_read += batch.num_rows
+            if index >= skip_chunks:
+                table = pa.Table.from_batches([batch])
+                for column in string_columns:
+                    position = table.schema.get_field_index(column)
+                    if position >= 0:
+                        table = table.set_column(position, column, table.column(position).cast(pa.string()))
+                yield table.to_pandas(), rows_read / total_rows, None
+        return
+    
+    total_bytes = os.path.getsize(path) or 1
+    with open(path, 'rb') as raw:
+        handle = gzip.GzipFile(fileobj=raw) if path.endswith('.gz') else raw
+        
+        columns = None
+        dtypes = None
+        if fmt == 'csv':
+            header = _read_records(handle, 1, quoted=True)
+            if not header.strip():
+                return
+            columns = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+            dtypes = {column: str for column in string_columns if column in columns}
+        if offset:
+            handle.seek(offset)
+        
+        while True:
+            data = _read_records(handle, chunk_rows, quoted=fmt == 'csv')
+            if not data.strip():
+                break
+            if fmt == 'csv':
+                chunk = pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=dtypes)
+            else:
+                chunk = _read_ndjson(data, string_columns)
+            # Compressed position of the underlying file: good enough for progress reporting
+            yield chunk, min(1.0, raw.tell() / total_bytes), handle.tell()
+
+class ExportAggregates:
+    """
+    Mergeable aggregate state of an export
+    
+    - customers: orders, revenue, first_date, last_date per customer_id
+    - days: row count and DAILY_SUM_COLUMNS sums per calendar day
+    - missing_customer_ids: rows left out of customers for a null customer_id
+    
+    Chunk aggregates are buffered and compacted in batches, so folding in a
+    chunk costs time proportional to the chunk, not to the state. Two states
+    built from different files (or shards of one) combine with merge().
+    """
+    
+    def __init__(self, compact_rows: int = 1_000_000):
+        self.compact_rows = compact_rows
+        self.rows = 0
+        self.missing_customer_ids = 0
+        self.customers = pd.DataFrame()
+        self.days = pd.DataFrame()
+        self._pending_customers = []
+        self._pending_days = []
+        self._pending_rows = 0
+    
+    def add_chunk(self, df: pd.DataFrame, customer_column: str = 'customer_id',
+                  amount_column: str = 'amount'):
+        """Fold one cleaned chunk (with a datetime 'date' column) into the state"""
+        
+        self.rows += len(df)
+        if df.empty:
+            return
+        
+        if customer_column in df.columns:
+            known = df[customer_column].notna()
+            self.missing_customer_ids += int((~known).sum())
+            amount = df[amount_column] if amount_column in df.columns else pd.Series(0.0, index=df.index)
+            customers = pd.DataFrame({
+                'customer_id': df[customer_column][known].astype(str),
+                'amount': amount[known],
+                'date': df['date'][known]
+            }).groupby('customer_id', sort=False).agg(
+                orders=('date', 'size'),
+                revenue=('amount', 'sum'),
+                first_date=('date', 'min'),
+                last_date=('date', 'max')
+            )
+            self._pending_customers.append(customers)
+        
+        sum_columns = [col for col in DAILY_SUM_COLUMNS if col in df.columns]
+        days = df[sum_columns].groupby(df['date'].dt.normalize().rename('date'), sort=False).sum()
+        days.insert(0, 'rows', df.groupby(df['date'].dt.normalize(), sort=False).size())
+        self._pending_days.append(days)
+        
+        self._pending_rows += len(df)
+        if self._pending_rows >= self.compact_rows:
+            self.compact()
+    
+    def merge(self, other: 'ExportAggregates') -> 'ExportAggregates':
+        """Fold another state into this one"""
+        
+        other.compact()
+        self.rows += other.rows
+        self.missing_customer_ids += other.missing_customer_ids
+        self._pending_customers.append(other.customers)
+        self._pending_days.append(other.days)
+        self.compact()
+        return self
+    
+    def compact(self):
+        """Combine buffered chunk aggregates into the state"""
+        
+        if self._pending_customers:
+            combined = pd.concat([self.customers, *self._pending_customers])
+            self.customers = combined.groupby(level=0, sort=False).agg({
+                'orders': 'sum',
+                'revenue': 'sum',
+                'first_date': 'min',
+                'last_date': 'max'
+            })
+            self.customers.index.name = 'customer_id'
+        
+        if self._pending_days:
+            combined = pd.concat([self.days, *self._pending_days])
+            self.days = combined.groupby(level=0).sum().sort_index()
+            self.days.index.name = 'date'
+        
+        self._pending_customers = []
+        self._pending_days = []
+        self._pending_rows = 0
+    
+    def daily(self) -> pd.DataFrame:
+        """Per-day totals with the derived ratios process_historical_data adds"""
+        
+        self.compact()
+        df = self.days.reset_index()
+        if 'clicks' in df.columns and 'impressions' in df.columns:
+            df['ctr'] = df['clicks'] / df['impressions'].replace(0, 1)
+        if 'spend' in df.columns and 'impressions' in df.columns:
+            df['cpm'] = df['spend'] / df['impressions'].replace(0, 1) * 1000
+        if 'revenue' in df.columns and 'spend' in df.columns:
+            df['roas'] = df['revenue'] / df['spend'].replace(0, 1)
+        return df
+
+class ExportIngestor:
+    """
+    Streams an export through DataProcessor cleaning into ExportAggregates
+    
+    Peak memory is one chunk plus the aggregate state. Every
+    checkpoint_every chunks the state and read position are written
+    atomically; ingesting the same unchanged file again resumes after the
+    last checkpoint instead of starting over.
+    """
+    
+    def __init__(self, chunk_rows: Optional[int] = None, checkpoint_dir: Optional[str] = None,
+                 checkpoint_every: Optional[int] = None, customer_column: str = 'customer_id',
+                 amount_column: str = 'amount',
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        config = Settings.get_ingestion_config()
+        self.chunk_rows = chunk_rows or config['chunk_rows']
+        self.checkpoint_dir = checkpoint_dir or config['checkpoint_path']
+        self.checkpoint_every = max(1, checkpoint_every or config['checkpoint_every'])
+        self.customer_column = customer_column
+        self.amount_column = amount_column
+        self.progress = progress
+    
+    def _checkpoint_file(self, path: str) -> str:
+        digest = hashlib.blake2b(os.path.abspath(path).encode('utf-8'), digest_size=8).hexdigest()
+        return os.path.join(self.checkpoint_dir, f"{os.path.basename(path)}.{digest}.ckpt")
+    
+    def _source_identity(self, path: str) -> Dict[str, Any]:
+        stat = os.stat(path)
+        return {
+            'path': os.path.abspath(path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'chunk_rows': self.chunk_rows,
+            'customer_column': self.customer_column,
+            'amount_column': self.amount_column,
+            'resume': 'offset',
+            'customer_ids': 'str'
+        }
+    
+    def _load_checkpoint(self, path: str) -> Tuple[int, int, Optional[ExportAggregates]]:
+        checkpoint_file = self._checkpoint_file(path)
+        if not os.path.exists(checkpoint_file):
+            return 0, 0, None
+        
+        try:
+            checkpoint = joblib.load(checkpoint_file)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable checkpoint {checkpoint_file}: {e}")
+            return 0, 0, None
+        
+        if checkpoint.get('source') != self._source_identity(path):
+            logger.info(f"Export {path} changed since its checkpoint, starting over")
+            return 0, 0, None
+        
+        return checkpoint['chunks_done'], checkpoint['offset'] or 0, checkpoint['state']
+    
+    def _save_checkpoint(self, path: str, chunks_done: int, offset: Optional[int], state: ExportAggregates):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        state.compact()
+        
+        checkpoint_file = self._checkpoint_file(path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.ckpt-', dir=self.checkpoint_dir)
+        os.close(fd)
+        joblib.dump({
+            'source': self._source_identity(path),
+            'chunks_done': chunks_done,
+            'offset': offset,
+            'state': state
+        }, tmp_path)
+        os.replace(tmp_path, checkpoint_file)
+    
+    def clear_checkpoint(self, path: str):
+        try:
+            os.remove(self._checkpoint_file(path))
+        except FileNotFoundError:
+            pass
+    
+    def ingest(self, path: str, fmt: Optional[str] = None, resume: bool = True) -> ExportAggregates:
+        """
+        Ingest one export file
+        
+        Args:
+            path: CSV, Parquet or NDJSON export (CSV/NDJSON may be gzipped)
+            fmt: Format override (default: from the extension)
+            resume: Continue from a matching checkpoint if one exists
+        
+        Returns:
+            Aggregates over every row with a parseable date
+        """
+        
+        chunks_done, offset, state = self._load_checkpoint(path) if resume else (0, 0, None)
+        if state is not None:
+            logger.info(f"Resuming {path} after chunk {chunks_done} ({state.rows} rows)")
+        state = state or ExportAggregates()
+        
+        started = time.perf_counter()
+        chunks = iter_export_chunks(path, self.chunk_rows, fmt=fmt, skip_chunks=chunks_done, offset=offset,
+                                    string_columns=(self.customer_column,))
+        
+        for chunk, fraction, offset in chunks:
+            if 'date' in chunk.columns:
+                chunk = DataProcessor.clean_dated_frame(chunk, extra_numeric=(self.amount_column,))
+                state.add_chunk(chunk, self.customer_column, self.amount_column)
+            else:
+                logger.warning(f"Chunk {chunks_done} of {path} has no date column, skipped")
+            chunks_done += 1
+            
+            if chunks_done % self.checkpoint_every == 0:
+                self._save_checkpoint(path, chunks_done, offset, state)
+            
+            if self.progress:
+                self.progress({
+                    'path': path,
+                    'chunks': chunks_done,
+                    'rows': state.rows,
+                    'fraction': fraction,
+                    'elapsed_seconds': time.perf_counter() - started
+                })
+        
+        state.compact()
+        self.clear_checkpoint(path)
+        if state.missing_customer_ids:
+            logger.warning(f"{state.missing_customer_ids} rows of {path} have no {self.customer_column}; "
+                           f"they count towards daily totals only")
+        logger.info(f"Ingested {state.rows} rows from {path} in {chunks_done} chunks")
+        return state
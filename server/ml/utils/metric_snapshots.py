@@ -0,0 +1,222 @@
+"""
+Metric Snapshot Reader
+Bulk-reads the dashboard's metric_snapshots EAV table into per-shop historical frames
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
+
+import numpy as np
+import pandas as pd
+
+from settings import Settings
+from utils.data_processor import DERIVED_METRICS, DataProcessor
+
+logger = logging.getLogger(__name__)
+
+# Additive figures the sync jobs store in the dimensions JSON next to the main metric
+DIMENSION_METRICS = ('orders', 'impressions', 'clicks')
+
+DateBound = Optional[Union[str, date, datetime]]
+T = TypeVar('T')
+
+def _date_text(value: DateBound) -> Optional[str]:
+    """Bound in the table's YYYY-MM-DD text format"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime('%Y-%m-%d')
+
+class MetricSnapshotReader:
+    """
+    Reads metric_snapshots(shop_domain, date, source, metric, value, dimensions)
+    
+    Shops are read in shards with one query each, filtered on the
+    (shop_domain, date, source) index. The long rows are pivoted with pandas
+    into one frame per shop, typed and derived the way
+    DataProcessor.process_historical_data prepares histories sent as JSON.
+    Repeated snapshots of a (shop, date, source, metric) keep the latest
+    value; the same metric from several sources (e.g. Meta and Google spend)
+    is summed.
+    
+    The Node server owns the file: it keeps the database in memory and
+    rewrites the whole file with fs.writeFileSync on every save, which is
+    not atomic. A read that lands on a half-written file fails with
+    sqlite3.DatabaseError, so every query reopens the file and retries.
+    """
+    
+    def __init__(self, path: Optional[str] = None, shard_size: Optional[int] = None,
+                 retries: Optional[int] = None):
+        config = Settings.get_snapshot_config()
+        self.path = path or config['db_path']
+        self.shard_size = shard_size or config['shard_size']
+        self.retries = config['retries'] if retries is None else retries
+        self.retry_delay = config['retry_delay'].total_seconds()
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Metric snapshot database not found: {self.path}")
+        
+        conn = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True, timeout=30)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    def _read(self, query: Callable[[sqlite3.Connection], T]) -> T:
+        """Run a read on a fresh connection, retrying while Node is rewriting the file"""
+        
+        for attempt in range(self.retries + 1):
+            try:
+                with self._connect() as conn:
+                    return query(conn)
+            except sqlite3.DatabaseError as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Metric snapshot read failed ({e}), retrying")
+                time.sleep(self.retry_delay * (attempt + 1))
+    
+    def list_shops(self, sources: Optional[Sequence[str]] = None) -> List[str]:
+        """Shops with at least one snapshot (an index-only scan)"""
+        
+        query = "SELECT DISTINCT shop_domain FROM metric_snapshots"
+        params: List[str] = []
+        if sources:
+            query += f" WHERE source IN ({','.join('?' * len(sources))})"
+            params.extend(sources)
+        
+        return self._read(
+            lambda conn: [row[0] for row in conn.execute(query + " ORDER BY shop_domain", params)]
+        )
+    
+    def shop_version(self, shop: str) -> Optional[str]:
+        """Tag that changes whenever a snapshot is added for the shop (None when it has none)"""
+        
+        count, last_id = self._read(lambda conn: conn.execute(
+            "SELECT COUNT(*), MAX(id) FROM metric_snapshots WHERE shop_domain = ?", (shop,)
+        ).fetchone())
+        return f"{last_id}:{count}" if count else None
+    
+    def _read_shard(self, conn: sqlite3.Connection, shops: Sequence[str], start: Optional[str],
+                    end: Optional[str], sources: Optional[Sequence[str]],
+                    metrics: Optional[Sequence[str]]) -> pd.DataFrame:
+        """Long (shop_domain, date, source, metric, value) rows of one shard, latest snapshots only"""
+        
+        dimension_columns = ', '.join(
+            f"json_extract(dimensions, '$.{name}') AS dim_{name}" for name in DIMENSION_METRICS
+        )
+        query = (
+            f"SELECT id, shop_domain, date, source, metric, value, {dimension_columns} "
+            f"FROM metric_snapshots WHERE shop_domain IN ({','.join('?' * len(shops))})"
+        )
+        params: List[str] = list(shops)
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND date <= ?"
+            params.append(end)
+        if sources:
+            query += f" AND source IN ({','.join('?' * len(sources))})"
+            params.extend(sources)
+        
+        rows = pd.read_sql_query(query, conn, params=params)
+        if rows.empty:
+            return rows
+        
+        # Dimension figures become rows of their own, ranked below the stored metric
+        keys = ['id', 'shop_domain', 'date', 'source']
+        dimensions = rows.drop(columns=['metric', 'value']).melt(
+            id_vars=keys, value_vars=[f"dim_{name}" for name in DIMENSION_METRICS],
+            var_name='metric', value_name='value'
+        ).dropna(subset=['value'])
+        dimensions['metric'] = dimensions['metric'].str[len('dim_'):]
+        dimensions['rank'] = 0
+        rows = rows[keys + ['metric', 'value']].assign(rank=1)
+        
+        long = pd.concat([rows, dimensions], ignore_index=True)
+        if metrics is not None:
+            long = long[long['metric'].isin(metrics)]
+        
+        long = long.sort_values(['id', 'rank'], kind='stable')
+        long = long.drop_duplicates(['shop_domain', 'date', 'source', 'metric'], keep='last')
+        long['value'] = pd.to_numeric(long['value'], errors='coerce')
+        return long
+    
+    def _pivot(self, long: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """Per-shop frames with a column per metric, cleaned and derived in one pass"""
+        
+        wide = long.pivot_table(
+            index=['shop_domain', 'date'], columns='metric', values='value', aggfunc='sum'
+        )
+        wide.columns.name = None
+        
+        # Metrics a shop never reported stay absent from its frame, as with JSON histories
+        present = wide.notna().groupby(level='shop_domain').any()
+        
+        wide = DataProcessor.clean_dated_frame(wide.reset_index())
+        wide = DataProcessor.derive_metrics(wide.sort_values(['shop_domain', 'date'], kind='stable'))
+        
+        # Rows are contiguous per shop; shops reporting the same metrics share one column selection
+        shop_codes, shops = pd.factorize(wide['shop_domain'])
+        bounds = np.searchsorted(shop_codes, np.arange(len(shops) + 1))
+        reported = present.loc[shops].to_numpy()
+        
+        blocks: Dict[bytes, pd.DataFrame] = {}
+        histories = {}
+        for i, shop in enumerate(shops):
+            signature = reported[i].tobytes()
+            block = blocks.get(signature)
+            if block is None:
+                metrics = list(present.columns[reported[i]])
+                derived = [
+                    name for name, inputs in DERIVED_METRICS.items()
+                    if name not in metrics and all(column in metrics for column in inputs)
+                ]
+                block = blocks[signature] = wide[['date', *metrics, *derived]]
+            histories[shop] = block.iloc[bounds[i]:bounds[i + 1]].reset_index(drop=True)
+        return histories
+    
+    def iter_histories(self, shops: Optional[Sequence[str]] = None, start: DateBound = None,
+                       end: DateBound = None, sources: Optional[Sequence[str]] = None,
+                       metrics: Optional[Sequence[str]] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """
+        Yield (shop_domain, history) one shard at a time
+        
+        Args:
+            shops: Shops to read (default: every shop in the table)
+            start: First date to include
+            end: Last date to include
+            sources: Sources to include (default: all)
+            metrics: Metrics to include (default: all)
+        
+        Yields:
+            Shop domain and its daily history, sorted by date; shops without
+            rows in the range are skipped
+        """
+        
+        shops = list(shops) if shops is not None else self.list_shops(sources)
+        start, end = _date_text(start), _date_text(end)
+        
+        for offset in range(0, len(shops), self.shard_size):
+            shard = shops[offset:offset + self.shard_size]
+            long = self._read(lambda conn: self._read_shard(conn, shard, start, end, sources, metrics))
+            if long.empty:
+                continue
+            yield from self._pivot(long).items()
+    
+    def read_histories(self, shops: Optional[Sequence[str]] = None, start: DateBound = None,
+                       end: DateBound = None, sources: Optional[Sequence[str]] = None,
+                       metrics: Optional[Sequence[str]] = None) -> Dict[str, pd.DataFrame]:
+        """Every shop's history as a dict (see iter_histories)"""
+        return dict(self.iter_histories(shops, start, end, sources, metrics))
+    
+    def read_history(self, shop: str, start: DateBound = None, end: DateBound = None,
+                     sources: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """One shop's history (empty DataFrame when it has none)"""
+        return self.read_histories([shop], start, end, sources).get(shop, pd.DataFrame())
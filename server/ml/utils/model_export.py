@@ -0,0 +1,390 @@
+"""
+Compact Model Export
+Serve-only float32 tree ensembles with pruning, compressed or mmap layouts and parity reports
+"""
+
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+from sklearn.dummy import DummyRegressor
+from sklearn.ensemble import (ExtraTreesClassifier, ExtraTreesRegressor, GradientBoostingRegressor,
+                              RandomForestClassifier, RandomForestRegressor)
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+EXPORT_LAYOUTS = ('mmap', 'compressed')
+
+FOREST_REGRESSORS = (RandomForestRegressor, ExtraTreesRegressor)
+FOREST_CLASSIFIERS = (RandomForestClassifier, ExtraTreesClassifier)
+
+def is_exportable(estimator: Any) -> bool:
+    """Fitted single-output forests and squared-loss-style gradient boosting regressors"""
+    
+    if isinstance(estimator, FOREST_REGRESSORS + FOREST_CLASSIFIERS):
+        return hasattr(estimator, 'estimators_') and getattr(estimator, 'n_outputs_', 1) == 1
+    if isinstance(estimator, GradientBoostingRegressor):
+        init = getattr(estimator, 'init_', None)
+        return hasattr(estimator, 'estimators_') and (init == 'zero' or isinstance(init, DummyRegressor))
+    return False
+
+def _round_down_float32(threshold: np.ndarray) -> np.ndarray:
+    """
+    Largest float32 <= each float64 threshold
+    
+    sklearn compares float32 features against float64 thresholds; for a
+    float32 x, x <= t exactly when x <= the float32 rounded down from t.
+    """
+    
+    rounded = threshold.astype(np.float32)
+    too_high = rounded.astype(np.float64) > threshold
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+class _ForestBuilder:
+    """Accumulates pruned, deduplicated trees into flat node and leaf tables"""
+    
+    def __init__(self, leaf_dtype: np.dtype):
+        self.leaf_dtype = leaf_dtype
+        self.left, self.right, self.feature, self.threshold, self.missing_left = [], [], [], [], []
+        self.leaves = []
+        self._leaf_codes: Dict[bytes, int] = {}
+        self._node_codes: Dict[Tuple, int] = {}
+        self.stats = {'original_nodes': 0, 'dead_splits': 0, 'collapsed_splits': 0, 'shared_nodes': 0}
+    
+    def leaf(self, value: np.ndarray) -> int:
+        row = value.astype(self.leaf_dtype)
+        key = row.tobytes()
+        code = self._leaf_codes.get(key)
+        if code is None:
+            self.leaves.append(row)
+            code = self._leaf_codes[key] = -len(self.leaves)
+        return code
+    
+    def split(self, feature: int, threshold: np.float32, missing_left: bool, left: int, right: int) -> int:
+        if left == right:
+            # Both branches lead to the same subtree: the test decides nothing
+            self.stats['collapsed_splits'] += 1
+            return left
+        
+        key = (feature, threshold.tobytes(), missing_left, left, right)
+        code = self._node_codes.get(key)
+        if code is not None:
+            self.stats['shared_nodes'] += 1
+            return code
+        
+        self.left.append(left)
+        self.right.append(right)
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.missing_left.append(missing_left)
+        code = self._node_codes[key] = len(self.left) - 1
+        return code
+    
+    def add_tree(self, tree: Any, values: np.ndarray) -> int:
+        """Add one fitted sklearn tree; returns the code of its root"""
+        
+        left, right = tree.children_left, tree.children_right
+        feature = tree.feature
+        threshold = _round_down_float32(tree.threshold)
+        missing = getattr(tree, 'missing_go_to_left', None)
+        missing = np.zeros(tree.node_count, dtype=bool) if missing is None else missing.astype(bool)
+        self.stats['original_nodes'] += tree.node_count
+        
+        def visit(node: int, bounds: Dict[int, Tuple[float, float]]) -> int:
+            if left[node] == -1:
+                return self.leaf(values[node])
+            
+            f, t, missing_left = int(feature[node]), threshold[node], bool(missing[node])
+            lo, hi = bounds.get(f, (-np.inf, np.inf))
+            
+            # Earlier tests on f already decide this one (NaN must route the same way)
+            if t >= hi and missing_left:
+                self.stats['dead_splits'] += 1
+                return visit(left[node], bounds)
+            if t <= lo and not missing_left:
+                self.stats['dead_splits'] += 1
+                return visit(right[node], bounds)
+            
+            left_code = visit(left[node], {**bounds, f: (lo, min(hi, t))})
+            right_code = visit(right[node], {**bounds, f: (max(lo, t), hi)})
+            return self.split(f, t, missing_left, left_code, right_code)
+        
+        return visit(0, {})
+
+class CompactForest:
+    """
+    Serve-only tree ensemble stored as flat typed arrays
+    
+    Internal nodes hold int32 child codes (>= 0: node, < 0: leaf ~code),
+    int32 features and float32 thresholds; leaf values are float32 when that
+    keeps predictions within tolerance. Identical subtrees are stored once
+    across the whole ensemble. Prediction walks every tree for every sample
+    one level at a time with NumPy, so it needs no per-tree Python calls.
+    It cannot be refitted or grown; keep the original estimator for that.
+    """
+    
+    def __init__(self, kind: str, roots: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 feature: np.ndarray, threshold: np.ndarray, missing_left: np.ndarray,
+                 leaf_values: np.ndarray, n_features_in_: int, classes_: Optional[np.ndarray] = None,
+                 scale: float = 1.0, offset: float = 0.0):
+        self.kind = kind
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_left = missing_left
+        self.leaf_values = leaf_values
+        self.n_features_in_ = n_features_in_
+        self.classes_ = classes_
+        self.scale = scale
+        self.offset = offset
+    
+    @classmethod
+    def from_estimator(cls, estimator: Any, leaf_dtype: Any = np.float32) -> Tuple['CompactForest', Dict[str, int]]:
+        """
+        Convert a fitted ensemble (see is_exportable)
+        
+        Returns:
+            (compact forest, node statistics)
+        """
+        
+        if not is_exportable(estimator):
+            raise TypeError(f"Cannot export {type(estimator).__name__}")
+        
+        builder = _ForestBuilder(np.dtype(leaf_dtype))
+        classes, scale, offset = None, 1.0, 0.0
+        
+        if isinstance(estimator, GradientBoostingRegressor):
+            kind = 'boosting_regressor'
+            trees = [stage[0] for stage in estimator.estimators_]
+            scale = float(estimator.learning_rate)
+            if isinstance(estimator.init_, DummyRegressor):
+                offset = float(np.ravel(estimator.init_.constant_)[0])
+        else:
+            kind = 'forest_classifier' if isinstance(estimator, FOREST_CLASSIFIERS) else 'forest_regressor'
+            trees = estimator.estimators_
+            if kind == 'forest_classifier':
+                classes = np.asarray(estimator.classes_)
+        
+        roots = []
+        for tree in trees:
+            tree_ = tree.tree_
+            values = tree_.value.reshape(tree_.node_count, -1).astype(np.float64)
+            if kind == 'forest_classifier':
+                # Same normalization as DecisionTreeClassifier.predict_proba
+                normalizer = values.sum(axis=1, keepdims=True)
+                normalizer[normalizer == 0] = 1
+                values = values / normalizer
+            roots.append(builder.add_tree(tree_, values))
+        
+        forest = cls(
+            kind,
+            roots=np.asarray(roots, dtype=np.int32),
+            left=np.asarray(builder.left, dtype=np.int32),
+            right=np.asarray(builder.right, dtype=np.int32),
+            feature=np.asarray(builder.feature, dtype=np.int32),
+            threshold=np.asarray(builder.threshold, dtype=np.float32),
+            missing_left=np.asarray(builder.missing_left, dtype=bool),
+            leaf_values=np.vstack(builder.leaves),
+            n_features_in_=int(estimator.n_features_in_),
+            classes_=classes,
+            scale=scale,
+            offset=offset
+        )
+        
+        stats = dict(builder.stats)
+        stats['nodes'] = len(builder.left)
+        stats['unique_leaves'] = len(builder.leaves)
+        return forest, stats
+    
+    def _leaves(self, X: Any) -> np.ndarray:
+        """Leaf index reached in every tree, shape (n_samples, n_trees)"""
+        
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got {X.shape[-1]}")
+        
+        n_trees = len(self.roots)
+        codes = np.tile(self.roots, len(X))
+        rows = np.repeat(np.arange(len(X)), n_trees)
+        
+        active = np.flatnonzero(codes >= 0)
+        while active.size:
+            node = codes[active]
+            x = X[rows[active], self.feature[node]]
+            go_left = x <= self.threshold[node]
+            missing = np.isnan(x)
+            if missing.any():
+                go_left[missing] = self.missing_left[node[missing]]
+            codes[active] = np.where(go_left, self.left[node], self.right[node])
+            active = active[codes[active] >= 0]
+        
+        return (~codes).reshape(len(X), n_trees)
+    
+    def _tree_sum(self, X: Any) -> np.ndarray:
+        leaves = self._leaves(X)
+        return self.leaf_values[leaves].sum(axis=1, dtype=np.float64)
+    
+    def predict_proba(self, X: Any) -> np.ndarray:
+        if self.kind != 'forest_classifier':
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._tree_sum(X) / len(self.roots)
+    
+    def predict(self, X: Any) -> np.ndarray:
+        if self.kind == 'forest_classifier':
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        
+        total = self._tree_sum(X)[:, 0]
+        if self.kind == 'boosting_regressor':
+            return self.offset + self.scale * total
+        return total / len(self.roots)
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in
+                   ('roots', 'left', 'right', 'feature', 'threshold', 'missing_left', 'leaf_values'))
+
+def probe_inputs(estimator: Any, n_samples: int = 2000, random_state: int = 0) -> np.ndarray:
+    """
+    Inputs that exercise both sides of the ensemble's splits
+    
+    Each feature is drawn from its split thresholds and the float32 just
+    above them; features no tree uses stay 0.
+    """
+    
+    rng = np.random.default_rng(random_state)
+    trees = ([stage[0] for stage in estimator.estimators_]
+             if isinstance(estimator, GradientBoostingRegressor) else estimator.estimators_)
+    
+    n_features = int(estimator.n_features_in_)
+    candidates = [[] for _ in range(n_features)]
+    for tree in trees:
+        tree_ = tree.tree_
+        internal = tree_.children_left != -1
+        thresholds = _round_down_float32(tree_.threshold[internal])
+        for f, t in zip(tree_.feature[internal], thresholds):
+            candidates[f].append(t)
+    
+    X = np.zeros((n_samples, n_features), dtype=np.float32)
+    for f, values in enumerate(candidates):
+        if values:
+            values = np.unique(np.asarray(values, dtype=np.float32))
+            values = np.concatenate([values, np.nextafter(values, np.float32(np.inf))])
+            X[:, f] = rng.choice(values, n_samples)
+    return X
+
+def _parity(estimator: Any, compact: CompactForest, X: np.ndarray) -> Dict[str, float]:
+    if compact.kind == 'forest_classifier':
+        expected = estimator.predict_proba(X)
+        actual = compact.predict_proba(X)
+        return {
+            'samples': len(X),
+            'max_abs_diff': float(np.max(np.abs(actual - expected))) if len(X) else 0.0,
+            'label_agreement': float(np.mean(estimator.predict(X) == compact.predict(X))) if len(X) else 1.0
+        }
+    
+    expected = estimator.predict(X)
+    actual = compact.predict(X)
+    return {
+        'samples': len(X),
+        'max_abs_diff': float(np.max(np.abs(actual - expected))) if len(X) else 0.0,
+        'max_abs_expected': float(np.max(np.abs(expected))) if len(X) else 0.0
+    }
+
+def _within_tolerance(parity: Dict[str, float], rtol: float) -> bool:
+    if parity.get('label_agreement', 1.0) < 1.0:
+        return False
+    return parity['max_abs_diff'] <= rtol * max(1.0, parity.get('max_abs_expected', 1.0))
+
+def _timed_load(path: str, mmap_mode: Optional[str] = None) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    obj = joblib.load(path, mmap_mode=mmap_mode)
+    return obj, time.perf_counter() - started
+
+def save_exported(compact: CompactForest, path: str, layout: str):
+    """Write a compact forest: zlib-compressed, or raw arrays that load as read-only memmaps"""
+    
+    if layout not in EXPORT_LAYOUTS:
+        raise ValueError(f"Unknown export layout: {layout}")
+    joblib.dump(compact, path, compress=3 if layout == 'compressed' else 0)
+
+def load_exported(path: str, layout: str = 'mmap') -> CompactForest:
+    """
+    Load a compact forest
+    
+    With the mmap layout the arrays are mapped read-only, so every worker
+    process serving the model shares the same page-cache copy.
+    """
+    return joblib.load(path, mmap_mode='r' if layout == 'mmap' else None)
+
+def export_model(estimator: Any, path: str, layout: Optional[str] = None, leaf_dtype: str = 'auto',
+                 X_parity: Optional[np.ndarray] = None, rtol: Optional[float] = None,
+                 original_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Export a fitted ensemble as a CompactForest file and report on it
+    
+    Args:
+        estimator: Fitted ensemble (see is_exportable)
+        path: Destination file
+        layout: 'mmap' or 'compressed' (default: MODEL_EXPORT_LAYOUT)
+        leaf_dtype: 'float32', 'float64' or 'auto' (float32 unless parity
+                    exceeds rtol, then float64)
+        X_parity: Inputs to compare predictions on (default: probe_inputs)
+        rtol: Allowed max abs prediction difference, relative to max(1, |prediction|)
+        original_path: Existing joblib dump of the estimator, for size and load time
+    
+    Returns:
+        Report with layout, leaf dtype, node counts, file sizes, load times and parity
+    """
+    
+    config = Settings.get_model_config()['export']
+    layout = layout or config['layout']
+    rtol = config['parity_rtol'] if rtol is None else rtol
+    X_parity = probe_inputs(estimator) if X_parity is None else np.asarray(X_parity)
+    
+    dtypes = [np.float32, np.float64] if leaf_dtype == 'auto' else [np.dtype(leaf_dtype).type]
+    for dtype in dtypes:
+        compact, stats = CompactForest.from_estimator(estimator, leaf_dtype=dtype)
+        parity = _parity(estimator, compact, X_parity)
+        if _within_tolerance(parity, rtol):
+            break
+        logger.info(f"{np.dtype(dtype).name} leaves exceed parity tolerance ({parity['max_abs_diff']:.3g})")
+    
+    save_exported(compact, path, layout)
+    
+    report: Dict[str, Any] = {
+        'layout': layout,
+        'leaf_dtype': compact.leaf_values.dtype.name,
+        'parity_ok': _within_tolerance(parity, rtol),
+        'parity': parity,
+        'nodes': stats,
+        'size_bytes': {'exported': os.path.getsize(path)},
+        'load_seconds': {}
+    }
+    
+    _, report['load_seconds']['exported'] = _timed_load(path, 'r' if layout == 'mmap' else None)
+    
+    if original_path is None:
+        fd, tmp_path = tempfile.mkstemp(suffix='.joblib')
+        os.close(fd)
+        try:
+            joblib.dump(estimator, tmp_path)
+            report['size_bytes']['original'] = os.path.getsize(tmp_path)
+            _, report['load_seconds']['original'] = _timed_load(tmp_path)
+        finally:
+            os.remove(tmp_path)
+    else:
+        report['size_bytes']['original'] = os.path.getsize(original_path)
+        _, report['load_seconds']['original'] = _timed_load(original_path)
+    
+    if not report['parity_ok']:
+        logger.warning(f"Compact export {path} exceeds parity tolerance: {parity}")
+    return report
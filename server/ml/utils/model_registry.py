@@ -0,0 +1,220 @@
+"""
+Versioned Model Registry
+Immutable, checksummed model versions with an atomically switched current pointer
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import joblib
+
+from settings import Settings
+from utils.model_export import export_model, is_exportable, load_exported
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ModelBundle:
+    """A loaded model version: its artifacts plus the manifest describing them"""
+    
+    def __init__(self, name: str, version: str, artifacts: Dict[str, Any], manifest: Dict[str, Any]):
+        self.name = name
+        self.version = version
+        self.artifacts = artifacts
+        self.manifest = manifest
+
+class ModelRegistry:
+    """
+    Stores every trained model as an immutable version directory:
+        
+        <root>/<name>/<version>/<artifact>.joblib
+        <root>/<name>/<version>/<artifact>.compact.joblib   (serve-only export of tree ensembles)
+        <root>/<name>/<version>/manifest.json   (metrics, feature schema, checksums, export reports)
+        <root>/<name>/CURRENT                   (id of the version to serve)
+    
+    Versions are written to a temporary directory and renamed into place, and
+    CURRENT is replaced atomically, so readers never see a partial version.
+    """
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def _model_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+    
+    def publish(self, name: str, artifacts: Dict[str, Any], metrics: Optional[Dict[str, Any]] = None,
+                feature_schema: Optional[Dict[str, Any]] = None, activate: bool = True) -> str:
+        """
+        Write a new immutable model version
+        
+        Args:
+            name: Model name (e.g. 'creative_fatigue')
+            artifacts: Objects to persist, keyed by artifact name ('model', 'scaler', ...)
+            metrics: Training metrics to record in the manifest
+            feature_schema: Description of the expected feature vector
+            activate: Point CURRENT at the new version
+        
+        Returns:
+            The new version id
+        """
+        
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+        
+        created_at = datetime.now()
+        version = f"{created_at.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=model_dir)
+        
+        try:
+            export_config = Settings.get_model_config()['export']
+            checksums = {}
+            exports = {}
+            for artifact_name, obj in artifacts.items():
+                file_name = f"{artifact_name}.joblib"
+                path = os.path.join(staging_dir, file_name)
+                joblib.dump(obj, path)
+                checksums[file_name] = _sha256(path)
+                
+                if export_config['enabled'] and is_exportable(obj):
+                    export_name = f"{artifact_name}.compact.joblib"
+                    export_path = os.path.join(staging_dir, export_name)
+                    report = export_model(obj, export_path, layout=export_config['layout'], original_path=path)
+                    if report['parity_ok']:
+                        exports[artifact_name] = {
+                            'file': export_name,
+                            'checksum': _sha256(export_path),
+                            'report': report
+                        }
+                    else:
+                        os.remove(export_path)
+            
+            manifest = {
+                'name': name,
+                'version': version,
+                'created_at': created_at.isoformat(),
+                'app_version': Settings.APP_VERSION,
+                'metrics': metrics or {},
+                'feature_schema': feature_schema or {},
+                'artifacts': checksums,
+                'exports': exports
+            }
+            with open(os.path.join(staging_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2, default=str)
+            
+            os.rename(staging_dir, os.path.join(model_dir, version))
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        
+        if activate:
+            self.activate(name, version)
+        
+        logger.info(f"Published {name} model version {version}")
+        return version
+    
+    def activate(self, name: str, version: str):
+        """Atomically point CURRENT at an existing version (also used for rollbacks)"""
+        
+        model_dir = self._model_dir(name)
+        if not os.path.exists(os.path.join(model_dir, version, MANIFEST_FILE)):
+            raise ValueError(f"Unknown {name} model version {version}")
+        
+        fd, tmp_path = tempfile.mkstemp(prefix='.current-', dir=model_dir)
+        with os.fdopen(fd, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(model_dir, CURRENT_FILE))
+    
+    def current_version(self, name: str) -> Optional[str]:
+        """Version id CURRENT points at, or None if nothing was published"""
+        try:
+            with open(os.path.join(self._model_dir(name), CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+    
+    def list_versions(self, name: str) -> List[str]:
+        """All published versions, oldest first"""
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+        return sorted(
+            entry for entry in os.listdir(model_dir)
+            if os.path.exists(os.path.join(model_dir, entry, MANIFEST_FILE))
+        )
+    
+    def get_manifest(self, name: str, version: str) -> Dict[str, Any]:
+        with open(os.path.join(self._model_dir(name), version, MANIFEST_FILE)) as f:
+            return json.load(f)
+    
+    def load(self, name: str, version: Optional[str] = None,
+             compact: Optional[bool] = None) -> Optional[ModelBundle]:
+        """
+        Load a model version (default: current), verifying artifact checksums
+        
+        Args:
+            name: Model name
+            version: Version id (default: current)
+            compact: Load the serve-only compact export in place of artifacts
+                     that have one (default: MODEL_SERVE_COMPACT). Compact
+                     models predict but cannot be updated incrementally.
+        
+        Returns:
+            ModelBundle, or None if no version is published
+        """
+        
+        version = version or self.current_version(name)
+        if version is None:
+            return None
+        
+        version_dir = os.path.join(self._model_dir(name), version)
+        manifest = self.get_manifest(name, version)
+        
+        export_config = Settings.get_model_config()['export']
+        compact = export_config['serve_compact'] if compact is None else compact
+        exports = manifest.get('exports', {}) if compact else {}
+        
+        artifacts = {}
+        for file_name, checksum in manifest['artifacts'].items():
+            artifact_name = os.path.splitext(file_name)[0]
+            export = exports.get(artifact_name)
+            if export is not None:
+                path = os.path.join(version_dir, export['file'])
+                if _sha256(path) != export['checksum']:
+                    raise ValueError(f"Checksum mismatch for {name} {version}/{export['file']}")
+                artifacts[artifact_name] = load_exported(path, export['report']['layout'])
+                continue
+            
+            path = os.path.join(version_dir, file_name)
+            if _sha256(path) != checksum:
+                raise ValueError(f"Checksum mismatch for {name} {version}/{file_name}")
+            artifacts[artifact_name] = joblib.load(path)
+        
+        return ModelBundle(name, version, artifacts, manifest)
+    
+    def prune(self, name: str, keep: int = 5) -> List[str]:
+        """Delete the oldest versions, never touching the current one"""
+        
+        current = self.current_version(name)
+        versions = [v for v in self.list_versions(name) if v != current]
+        removed = versions[:max(0, len(versions) - (keep - 1))]
+        for version in removed:
+            shutil.rmtree(os.path.join(self._model_dir(name), version), ignore_errors=True)
+        return removed
+
+model_registry = ModelRegistry(Settings.MODEL_REGISTRY_PATH)
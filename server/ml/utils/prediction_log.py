@@ -0,0 +1,367 @@
+"""
+Prediction Log
+Append-only binary log of served predictions, written off the request path in rotating segments
+"""
+
+import glob
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b'PLOG\x01'
+SEGMENT_PATTERN = 'predictions-*.plog'
+
+# Record: u32 payload length, then timestamp (epoch seconds), latency ms, confidence,
+# predicted value, 16-byte input fingerprint, and u16-length-prefixed UTF-8 strings
+_LENGTH = struct.Struct('<I')
+_FIXED = struct.Struct('<dffd16s')
+_STRING_LENGTH = struct.Struct('<H')
+
+STRING_COLUMNS = ('endpoint', 'entity_id', 'model_version', 'tier')
+NUMERIC_COLUMNS = {
+    'timestamp': np.float64,
+    'latency_ms': np.float32,
+    'confidence': np.float32,
+    'value': np.float64
+}
+
+# Record fields in log() order
+_Record = Tuple[float, float, float, float, bytes, str, str, str, str]
+
+def _encode(record: _Record) -> bytes:
+    timestamp, latency_ms, confidence, value, fingerprint, *strings = record
+    parts = [_FIXED.pack(timestamp, latency_ms, confidence, value, fingerprint)]
+    for text in strings:
+        data = text.encode('utf-8')[:0xFFFF]
+        parts.append(_STRING_LENGTH.pack(len(data)))
+        parts.append(data)
+    payload = b''.join(parts)
+    return _LENGTH.pack(len(payload)) + payload
+
+class PredictionLogWriter:
+    """
+    Batched, asynchronous writer for the prediction log
+    
+    log() only puts a tuple on a bounded queue and never blocks: when the
+    queue is full the record is dropped and counted. A daemon thread drains
+    the queue in batches, encodes them and appends each batch with a single
+    write, rotating to a new segment file once the current one passes
+    segment_bytes. Segment names carry the process id, so every worker
+    process writes its own files into the shared directory.
+    """
+    
+    def __init__(self, directory: Optional[str] = None, max_queue: Optional[int] = None,
+                 batch_size: Optional[int] = None, flush_interval: Optional[float] = None,
+                 segment_bytes: Optional[int] = None):
+        config = Settings.get_prediction_log_config()
+        self.enabled = config['enabled']
+        self.directory = directory or config['path']
+        self.batch_size = batch_size or config['batch_size']
+        self.flush_interval = flush_interval or config['flush_interval'].total_seconds()
+        self.segment_bytes = segment_bytes or config['segment_bytes']
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue or config['max_queue'])
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._file = None
+        self._segment_size = 0
+        self._segment_index = 0
+        self._stats = {'logged': 0, 'dropped': 0, 'written': 0, 'write_errors': 0, 'segments': 0}
+    
+    def start(self):
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: float = 5.0):
+        """Flush what is queued and close the current segment"""
+        
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+    
+    def log(self, endpoint: str, entity_id: Optional[str], fingerprint: str, model_version: Optional[str],
+            tier: Optional[str], latency_ms: float, value: Optional[float] = None,
+            confidence: Optional[float] = None) -> bool:
+        """
+        Queue one prediction record
+        
+        Args:
+            endpoint: API endpoint that served the prediction
+            entity_id: Creative, customer or product id ('' when not applicable)
+            fingerprint: Hex digest of the request inputs
+            model_version: Model version that answered
+            tier: model | rule_based | fallback
+            latency_ms: Time to answer
+            value: Headline predicted value (NaN when the result has none)
+            confidence: Reported confidence
+        
+        Returns:
+            False if the record was dropped because the queue is full
+        """
+        
+        if not self.enabled:
+            return False
+        
+        record = (
+            time.time(), latency_ms,
+            np.nan if confidence is None else confidence,
+            np.nan if value is None else value,
+            fingerprint, endpoint, entity_id or '', model_version or '', tier or ''
+        )
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._stats['dropped'] += 1
+            return False
+        self._stats['logged'] += 1
+        return True
+    
+    def _run(self):
+        while True:
+            stopping = self._stop.is_set()
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=0 if stopping else self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            
+            if batch:
+                self._write(batch)
+            elif stopping:
+                break
+        
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        
+        self._segment_index += 1
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+        path = os.path.join(self.directory, f"predictions-{stamp}-{os.getpid()}-{self._segment_index:06d}.plog")
+        self._file = open(path, 'ab')
+        self._file.write(SEGMENT_MAGIC)
+        self._segment_size = len(SEGMENT_MAGIC)
+        self._stats['segments'] += 1
+    
+    def _write(self, batch: List[_Record]):
+        try:
+            data = b''.join(
+                _encode((ts, latency, confidence, value, bytes.fromhex(fingerprint)[:16], *strings))
+                for ts, latency, confidence, value, fingerprint, *strings in batch
+            )
+            
+            if self._file is None or self._segment_size >= self.segment_bytes:
+                self._open_segment()
+            self._file.write(data)
+            self._file.flush()
+            self._segment_size += len(data)
+            self._stats['written'] += len(batch)
+        except Exception as e:
+            self._stats['write_errors'] += 1
+            logger.error(f"Prediction log write failed, {len(batch)} records lost: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'queued': self._queue.qsize(), 'running': self._thread is not None}
+
+def segment_paths(directory: Optional[str] = None) -> List[str]:
+    """Segment files in write order (name order within each process)"""
+    directory = directory or Settings.get_prediction_log_config()['path']
+    return sorted(glob.glob(os.path.join(directory, SEGMENT_PATTERN)))
+
+def _read_segment(path: str) -> Dict[str, Any]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    
+    if not data.startswith(SEGMENT_MAGIC):
+        raise ValueError(f"Not a prediction log segment: {path}")
+    
+    fixed, strings = [], []
+    interned: Dict[bytes, str] = {}
+    pos, end = len(SEGMENT_MAGIC), len(data)
+    
+    while pos + _LENGTH.size <= end:
+        (length,) = _LENGTH.unpack_from(data, pos)
+        start = pos + _LENGTH.size
+        if start + length > end:
+            # The writer was cut off mid-record; everything before it is intact
+            logger.warning(f"Truncated record at byte {pos} of {path}")
+            break
+        
+        fixed.append(data[start:start + _FIXED.size])
+        cursor = start + _FIXED.size
+        row = []
+        for _ in STRING_COLUMNS:
+            (size,) = _STRING_LENGTH.unpack_from(data, cursor)
+            cursor += _STRING_LENGTH.size
+            raw = data[cursor:cursor + size]
+            cursor += size
+            text = interned.get(raw)
+            if text is None:
+                text = interned[raw] = raw.decode('utf-8')
+            row.append(text)
+        strings.append(row)
+        pos = start + length
+    
+    dtype = np.dtype([
+        ('timestamp', '<f8'), ('latency_ms', '<f4'), ('confidence', '<f4'),
+        ('value', '<f8'), ('fingerprint', 'S16')
+    ])
+    table = np.frombuffer(b''.join(fixed), dtype=dtype)
+    columns: Dict[str, Any] = {name: table[name].astype(dtype_) for name, dtype_ in NUMERIC_COLUMNS.items()}
+    columns['fingerprint'] = table['fingerprint'].copy()
+    text_columns = np.array(strings, dtype=object).reshape(len(strings), len(STRING_COLUMNS))
+    for i, name in enumerate(STRING_COLUMNS):
+        columns[name] = text_columns[:, i]
+    return columns
+
+def iter_segments(directory: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (path, columns) per segment; columns are NumPy arrays keyed by field"""
+    for path in segment_paths(directory):
+        yield path, _read_segment(path)
+
+def read_columns(directory: Optional[str] = None, start: Optional[Union[str, datetime]] = None,
+                 end: Optional[Union[str, datetime]] = None) -> Dict[str, np.ndarray]:
+    """
+    Every logged prediction as one set of columns
+    
+    Args:
+        directory: Log directory (default: PREDICTION_LOG_PATH)
+        start: Keep predictions at or after this time
+        end: Keep predictions before this time
+    
+    Returns:
+        {field: array}: timestamp, latency_ms, confidence, value (float),
+        fingerprint (16-byte strings) and endpoint, entity_id,
+        model_version, tier (object arrays), sorted by timestamp
+    """
+    
+    parts = [columns for _, columns in iter_segments(directory)]
+    if parts:
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    else:
+        columns = {name: np.array([], dtype=dtype_) for name, dtype_ in NUMERIC_COLUMNS.items()}
+        columns['fingerprint'] = np.array([], dtype='S16')
+        columns.update({name: np.array([], dtype=object) for name in STRING_COLUMNS})
+    
+    keep = np.ones(len(columns['timestamp']), dtype=bool)
+    if start is not None:
+        keep &= columns['timestamp'] >= pd.Timestamp(start).timestamp()
+    if end is not None:
+        keep &= columns['timestamp'] < pd.Timestamp(end).timestamp()
+    
+    order = np.argsort(columns['timestamp'][keep], kind='stable')
+    return {name: values[keep][order] for name, values in columns.items()}
+
+def read_frame(directory: Optional[str] = None, start: Optional[Union[str, datetime]] = None,
+               end: Optional[Union[str, datetime]] = None) -> pd.DataFrame:
+    """read_columns as a DataFrame with datetime timestamps and categorical labels"""
+    
+    columns = read_columns(directory, start, end)
+    frame = pd.DataFrame(columns)
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'], unit='s')
+    for name in ('endpoint', 'model_version', 'tier'):
+        frame[name] = frame[name].astype('category')
+    return frame
+
+# Headline value logged per endpoint, and whether it counts days ahead
+FORECAST_METRICS = {
+    '/creative-fatigue': ('days_to_fatigue', True),
+    '/creative-fatigue/account': ('days_to_fatigue', True),
+    '/customer-prediction': ('days_to_purchase', True),
+    '/product-velocity': ('velocity_change', False),
+    '/product-velocity/catalog': ('velocity_change', False),
+    '/budget-optimization': ('revenue_increase', False),
+    '/budget-optimization/portfolio': ('revenue_increase', False)
+}
+
+def forecast_accuracy_rows(columns: Mapping[str, np.ndarray],
+                           shop_domains: Union[str, Mapping[str, str]]) -> pd.DataFrame:
+    """
+    Logged predictions in the dashboard's forecast_accuracy layout (actual left empty)
+    
+    Args:
+        columns: read_columns output
+        shop_domains: Shop of every entity, or one shop for the whole log;
+                      entities without a shop are skipped
+    
+    Returns:
+        shop_domain, metric, forecast_date, horizon_days, predicted, method.
+        Day-count predictions are dated at the predicted day with the count
+        as horizon; other metrics at the prediction day with horizon 0.
+    """
+    
+    frame = pd.DataFrame({name: columns[name] for name in ('timestamp', 'value', 'endpoint',
+                                                           'entity_id', 'model_version', 'tier')})
+    frame = frame[frame['endpoint'].isin(list(FORECAST_METRICS)) & frame['value'].notna()]
+    
+    if isinstance(shop_domains, str):
+        frame['shop_domain'] = shop_domains
+    else:
+        frame['shop_domain'] = frame['entity_id'].map(shop_domains)
+        frame = frame.dropna(subset=['shop_domain'])
+    
+    metric = frame['endpoint'].map({endpoint: spec[0] for endpoint, spec in FORECAST_METRICS.items()})
+    in_days = frame['endpoint'].map({endpoint: spec[1] for endpoint, spec in FORECAST_METRICS.items()}).astype(bool)
+    horizon = np.where(in_days, np.round(frame['value']).clip(lower=0), 0).astype(int)
+    predicted_on = pd.to_datetime(frame['timestamp'], unit='s').dt.normalize()
+    
+    return pd.DataFrame({
+        'shop_domain': frame['shop_domain'],
+        'metric': metric,
+        'forecast_date': (predicted_on + pd.to_timedelta(horizon, unit='D')).dt.strftime('%Y-%m-%d'),
+        'horizon_days': horizon,
+        'predicted': frame['value'].astype(float),
+        'method': frame['tier'] + ':' + frame['model_version']
+    }).reset_index(drop=True)
+
+def export_forecast_accuracy(rows: pd.DataFrame, directory: Optional[str] = None) -> Optional[str]:
+    """
+    Write forecast_accuracy_rows output as an NDJSON file for the Node server to import
+    
+    The dashboard database lives in Node's memory and is rewritten to disk
+    on every autosave, so rows written to the file directly would be lost.
+    Node picks up *.ndjson files from this directory, inserts them through
+    its own handle and deletes them; files appear by atomic rename, so a
+    half-written export is never read.
+    
+    Returns:
+        Path of the written file, or None when there were no rows
+    """
+    
+    if rows.empty:
+        return None
+    
+    directory = directory or Settings.get_prediction_log_config()['forecast_export_path']
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"forecast-accuracy-{datetime.now():%Y%m%dT%H%M%S%f}-{os.getpid()}.ndjson")
+    
+    tmp_path = path + '.tmp'
+    rows[['shop_domain', 'metric', 'forecast_date', 'horizon_days', 'predicted', 'method']].to_json(
+        tmp_path, orient='records', lines=True
+    )
+    os.replace(tmp_path, path)
+    return path
+
+prediction_log = PredictionLogWriter()
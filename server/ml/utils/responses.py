@@ -0,0 +1,34 @@
+"""
+Fast JSON Responses
+orjson-rendered responses for large prediction payloads
+"""
+
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    return jsonable_encoder(obj)
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson
+    
+    Return it directly from an endpoint: FastAPI then skips jsonable_encoder,
+    which walks every nested value in Python. orjson serializes datetimes and
+    numpy values natively and dumps pydantic models on the fly. Routes with a
+    response_model should keep the default response class, which FastAPI
+    already serializes through pydantic.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
@@ -0,0 +1,140 @@
+"""
+Prediction Results Store
+Local SQLite store for precomputed merchant predictions
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def _json_default(value: Any) -> Any:
+    """Serialize numpy scalars/arrays and datetimes found in prediction payloads"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class ResultsStore:
+    """
+    Stores the latest prediction of each type per merchant together with the
+    model version that produced it, the source data version and a timestamp
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS prediction_results (
+                    merchant_id TEXT NOT NULL,
+                    prediction_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    model_version TEXT NOT NULL,
+                    data_version TEXT,
+                    computed_at TEXT NOT NULL,
+                    PRIMARY KEY (merchant_id, prediction_type)
+                )
+            """)
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def save_results(self, merchant_id: str, results: Dict[str, Any],
+                     model_versions: Dict[str, str], data_version: Optional[str] = None,
+                     computed_at: Optional[datetime] = None):
+        """
+        Replace a merchant's stored predictions
+        
+        Args:
+            merchant_id: Merchant identifier
+            results: Prediction payloads keyed by prediction type
+            model_versions: Model version per prediction type
+            data_version: Version of the source data the results were computed from
+            computed_at: Computation time (default: now)
+        """
+        
+        computed_at = (computed_at or datetime.now()).isoformat()
+        rows = [
+            (merchant_id, prediction_type, json.dumps(payload, default=_json_default),
+             model_versions.get(prediction_type, 'unknown'), data_version, computed_at)
+            for prediction_type, payload in results.items()
+        ]
+        
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM prediction_results WHERE merchant_id = ?", (merchant_id,))
+            conn.executemany(
+                "INSERT INTO prediction_results VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+    
+    def get_results(self, merchant_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a merchant's stored predictions
+        
+        Returns:
+            Dict with predictions, model_versions, data_version and computed_at
+            (the oldest computation time across types), or None if absent
+        """
+        
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT prediction_type, payload, model_version, data_version, computed_at "
+                "FROM prediction_results WHERE merchant_id = ?",
+                (merchant_id,)
+            ).fetchall()
+        
+        if not rows:
+            return None
+        
+        return {
+            'merchant_id': merchant_id,
+            'predictions': {row[0]: json.loads(row[1]) for row in rows},
+            'model_versions': {row[0]: row[2] for row in rows},
+            'data_version': rows[0][3],
+            'computed_at': min(datetime.fromisoformat(row[4]) for row in rows)
+        }
+    
+    @staticmethod
+    def is_stale(record: Dict[str, Any], ttl: timedelta,
+                 data_version: Optional[str] = None,
+                 model_versions: Optional[Dict[str, str]] = None) -> bool:
+        """Check whether a stored record is too old or built from outdated data/models"""
+        
+        if datetime.now() - record['computed_at'] > ttl:
+            return True
+        if data_version is not None and record.get('data_version') != data_version:
+            return True
+        if model_versions:
+            for prediction_type, version in record['model_versions'].items():
+                if prediction_type in model_versions and model_versions[prediction_type] != version:
+                    return True
+        return False
+    
+    def count(self) -> int:
+        """Number of merchants with stored predictions"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(DISTINCT merchant_id) FROM prediction_results"
+            ).fetchone()[0]
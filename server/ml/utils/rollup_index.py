@@ -0,0 +1,335 @@
+"""
+Rollup Index
+Per-merchant prefix sums of daily metrics for O(1) totals, means and ratios over any date range
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from utils.calendar_table import calendar_table
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_METRICS = ('revenue', 'spend', 'orders', 'impressions', 'clicks')
+
+# Ratio -> (numerator, denominator, scale); computed from range totals, not averaged daily
+ROLLUP_RATIOS = {
+    'roas': ('revenue', 'spend', 1.0),
+    'ctr': ('clicks', 'impressions', 1.0),
+    'cpc': ('spend', 'clicks', 1.0),
+    'cpm': ('spend', 'impressions', 1000.0),
+    'aov': ('revenue', 'orders', 1.0)
+}
+
+DateLike = Union[str, pd.Timestamp, np.datetime64]
+
+class _Series:
+    """
+    Prefix sums of one merchant's daily metrics
+    
+    cum[:, k] is the total of days [first_day, first_day + k); the buffer
+    grows by doubling so appending new days is amortized O(new days).
+    """
+    
+    def __init__(self, first_day: int, n_metrics: int, capacity: int = 64):
+        self.first_day = first_day
+        self.length = 0
+        self.cum = np.zeros((n_metrics, capacity + 1))
+    
+    @property
+    def last_day(self) -> int:
+        return self.first_day + self.length - 1
+    
+    def add_days(self, days: np.ndarray, values: np.ndarray):
+        """Add daily values (rows of values, one per entry of days) into the sums"""
+        
+        lo, hi = int(days.min()), int(days.max())
+        
+        if lo < self.first_day:
+            # Days before the first one shift everything; totals before them are 0
+            shift = self.first_day - lo
+            cum = np.zeros((self.cum.shape[0], max(self.cum.shape[1] - 1, self.length + shift) + 1))
+            cum[:, shift:shift + self.length + 1] = self.cum[:, :self.length + 1]
+            self.cum = cum
+            self.first_day = lo
+            self.length += shift
+        
+        new_length = max(self.length, hi - self.first_day + 1)
+        if new_length + 1 > self.cum.shape[1]:
+            cum = np.zeros((self.cum.shape[0], max(2 * self.cum.shape[1] - 1, new_length + 1)))
+            cum[:, :self.length + 1] = self.cum[:, :self.length + 1]
+            self.cum = cum
+        
+        # New days start flat at the running total
+        self.cum[:, self.length + 1:new_length + 1] = self.cum[:, self.length, None]
+        
+        # Only the suffix from the earliest touched day changes
+        start = lo - self.first_day
+        offsets = days - lo
+        span = new_length - start
+        delta = np.stack([
+            np.bincount(offsets, weights=values[:, i], minlength=span)
+            for i in range(values.shape[1])
+        ])
+        self.cum[:, start + 1:new_length + 1] += np.cumsum(delta, axis=1)
+        self.length = new_length
+    
+    def set_days(self, days: np.ndarray, values: np.ndarray, present: np.ndarray):
+        """Replace the daily values of days for the metrics in present (rows sharing a day are summed first)"""
+        
+        unique, inverse = np.unique(days, return_inverse=True)
+        totals = np.zeros((len(unique), values.shape[1]))
+        np.add.at(totals, inverse.ravel(), values)
+        
+        # Applied as the difference from what the sums hold for those days now
+        k = unique - self.first_day
+        inside = (k >= 0) & (k < self.length)
+        current = np.zeros_like(totals)
+        current[inside] = (self.cum[:, k[inside] + 1] - self.cum[:, k[inside]]).T
+        self.add_days(unique, np.where(present, totals, current) - current)
+
+class RollupIndex:
+    """
+    Answers range totals, daily means and ratios per merchant in O(1)
+    
+    Each merchant keeps cumulative sums of its daily metrics from its first
+    day on, so the total over [start, end] is cum[end + 1] - cum[start]. Days
+    without data count as zero. Means are per day over the part of the range
+    the merchant's history spans; ratios (ROAS, CTR, CPC, CPM, AOV) divide the
+    range totals. Appending new days only touches the new days; set replaces
+    re-synced days instead of adding to them.
+    """
+    
+    def __init__(self, metrics: Sequence[str] = ROLLUP_METRICS):
+        self.metrics = tuple(metrics)
+        self.ratios = {
+            name: spec for name, spec in ROLLUP_RATIOS.items()
+            if spec[0] in self.metrics and spec[1] in self.metrics
+        }
+        self._series: Dict[Hashable, _Series] = {}
+        self._packed: Optional[Tuple[pd.Index, np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+    
+    def __contains__(self, merchant_id: Hashable) -> bool:
+        return merchant_id in self._series
+    
+    def __len__(self) -> int:
+        return len(self._series)
+    
+    def _daily_values(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        days, valid = calendar_table.epoch_days(df['date'])
+        values = np.column_stack([
+            pd.to_numeric(df[metric], errors='coerce').fillna(0).to_numpy(dtype=float)
+            if metric in df.columns else np.zeros(len(df))
+            for metric in self.metrics
+        ])
+        return days[valid], values[valid]
+    
+    def add(self, merchant_id: Hashable, data: Union[pd.DataFrame, List[Dict[str, Any]]]):
+        """
+        Add one merchant's daily rows on top of what the index holds
+        
+        Additive only: a day that is already indexed gets the new values added
+        to it. Use set for re-synced days.
+        
+        Args:
+            merchant_id: Merchant the rows belong to
+            data: Rows with a date column and any of the index metrics;
+                  rows sharing a day are summed
+        """
+        self._update(merchant_id, data, replace=False)
+    
+    def set(self, merchant_id: Hashable, data: Union[pd.DataFrame, List[Dict[str, Any]]]):
+        """
+        Set one merchant's daily rows, replacing the values of days already indexed
+        
+        Args:
+            merchant_id: Merchant the rows belong to
+            data: Rows with a date column and any of the index metrics;
+                  rows sharing a day are summed into that day's new value,
+                  metrics without a column keep their current values
+        """
+        self._update(merchant_id, data, replace=True)
+    
+    def _update(self, merchant_id: Hashable, data: Union[pd.DataFrame, List[Dict[str, Any]]], replace: bool):
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        if df.empty or 'date' not in df.columns:
+            return
+        
+        days, values = self._daily_values(df)
+        if len(days) == 0:
+            return
+        
+        with self._lock:
+            series = self._series.get(merchant_id)
+            if series is None:
+                series = self._series[merchant_id] = _Series(int(days.min()), len(self.metrics))
+            if replace:
+                series.set_days(days, values, np.array([metric in df.columns for metric in self.metrics]))
+            else:
+                series.add_days(days, values)
+            self._packed = None
+    
+    def add_many(self, df: pd.DataFrame, series_column: str = 'merchant_id'):
+        """Add a long (merchant, date) table"""
+        
+        if df.empty or 'date' not in df.columns:
+            return
+        
+        for merchant_id, rows in df.groupby(series_column, sort=False):
+            self.add(merchant_id, rows)
+    
+    def set_many(self, df: pd.DataFrame, series_column: str = 'merchant_id'):
+        """Set a long (merchant, date) table, replacing days already indexed"""
+        
+        if df.empty or 'date' not in df.columns:
+            return
+        
+        for merchant_id, rows in df.groupby(series_column, sort=False):
+            self.set(merchant_id, rows)
+    
+    def _evaluate(self, sums: np.ndarray, days: np.ndarray, stat: str) -> Dict[str, np.ndarray]:
+        """Metric sums or daily means plus ratios from (metrics, queries) range totals"""
+        
+        if stat not in ('sum', 'mean'):
+            raise ValueError(f"Unknown statistic: {stat}")
+        
+        result = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i, metric in enumerate(self.metrics):
+                if stat == 'sum':
+                    result[metric] = sums[i]
+                else:
+                    result[metric] = np.where(days > 0, sums[i] / days, np.nan)
+            
+            for name, (numerator, denominator, scale) in self.ratios.items():
+                num = sums[self.metrics.index(numerator)]
+                den = sums[self.metrics.index(denominator)]
+                result[name] = np.where(den == 0, 0.0, num / den * scale)
+        
+        result['days'] = days
+        return result
+    
+    @staticmethod
+    def _day(date: DateLike) -> int:
+        timestamp = pd.Timestamp(date)
+        if timestamp is pd.NaT:
+            raise ValueError(f"Invalid date: {date}")
+        if timestamp.tz is not None:
+            timestamp = timestamp.tz_localize(None)
+        return int(timestamp.value // 86_400_000_000_000)
+    
+    def query(self, merchant_id: Hashable, start: DateLike, end: DateLike,
+              stat: str = 'sum') -> Dict[str, float]:
+        """
+        Totals (or daily means) and ratios over [start, end], both inclusive
+        
+        Args:
+            merchant_id: Merchant to query
+            start: First day of the range
+            end: Last day of the range
+            stat: 'sum' or 'mean' for the metrics; ratios always use totals
+        
+        Returns:
+            {metric: value, ratio: value, 'days': days of history in the range}
+        """
+        
+        series = self._series.get(merchant_id)
+        if series is None:
+            raise KeyError(merchant_id)
+        
+        cum, length = series.cum, series.length
+        lo = min(max(self._day(start) - series.first_day, 0), length)
+        hi = min(max(self._day(end) - series.first_day + 1, lo), length)
+        
+        sums = (cum[:, hi] - cum[:, lo])[:, None]
+        result = self._evaluate(sums, np.array([hi - lo]), stat)
+        return {name: float(values[0]) for name, values in result.items()}
+    
+    def trailing(self, merchant_id: Hashable, n_days: int, end: Optional[DateLike] = None,
+                 stat: str = 'sum') -> Dict[str, float]:
+        """Query the n_days ending at end (default: the merchant's last day)"""
+        
+        series = self._series.get(merchant_id)
+        if series is None:
+            raise KeyError(merchant_id)
+        
+        end_day = self._day(end) if end is not None else series.last_day
+        start = np.datetime64(end_day - n_days + 1, 'D')
+        return self.query(merchant_id, start, np.datetime64(end_day, 'D'), stat)
+    
+    def _pack(self) -> Tuple[pd.Index, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """All merchants' prefix sums side by side, for gathering batched queries"""
+        
+        packed = self._packed
+        if packed is not None:
+            return packed
+        
+        with self._lock:
+            if self._packed is None:
+                series = list(self._series.values())
+                lengths = np.array([s.length for s in series], dtype=np.int64)
+                offsets = np.concatenate([[0], np.cumsum(lengths + 1)[:-1]]).astype(np.int64)
+                first_days = np.array([s.first_day for s in series], dtype=np.int64)
+                cum = (np.concatenate([s.cum[:, :s.length + 1] for s in series], axis=1)
+                       if series else np.zeros((len(self.metrics), 0)))
+                positions = pd.Index(list(self._series))
+                self._packed = (positions, first_days, lengths, offsets, cum)
+            return self._packed
+    
+    def query_batch(self, merchant_ids: Iterable[Hashable], starts: Any, ends: Any,
+                    stat: str = 'sum') -> pd.DataFrame:
+        """
+        Many range queries at once, gathered with NumPy
+        
+        Args:
+            merchant_ids: Merchant of each query
+            starts: First day of each range (datetime-like array)
+            ends: Last day of each range (datetime-like array)
+            stat: 'sum' or 'mean' for the metrics
+        
+        Returns:
+            One row per query with the metrics, ratios and days; unknown
+            merchants and invalid dates give NaN metrics and 0 days
+        """
+        
+        positions, first_days, lengths, offsets, cum = self._pack()
+        
+        if not isinstance(merchant_ids, (np.ndarray, pd.Index, pd.Series)):
+            merchant_ids = list(merchant_ids)
+        merchant_ids = pd.Index(merchant_ids)
+        index = positions.get_indexer(merchant_ids) if len(positions) else np.full(len(merchant_ids), -1)
+        start_days, start_valid = calendar_table.epoch_days(starts)
+        end_days, end_valid = calendar_table.epoch_days(ends)
+        known = (index >= 0) & start_valid & end_valid
+        
+        safe = np.where(known, index, 0)
+        if len(first_days):
+            first, length, offset = first_days[safe], lengths[safe], offsets[safe]
+        else:
+            first = length = offset = np.zeros(len(index), dtype=np.int64)
+        
+        lo = np.clip(start_days - first, 0, length)
+        hi = np.clip(end_days - first + 1, lo, length)
+        lo, hi = np.where(known, lo, 0), np.where(known, hi, 0)
+        
+        if cum.shape[1]:
+            sums = cum[:, offset + hi] - cum[:, offset + lo]
+        else:
+            sums = np.zeros((len(self.metrics), len(index)))
+        sums[:, ~known] = np.nan
+        
+        result = pd.DataFrame(self._evaluate(sums, hi - lo, stat))
+        result.insert(0, 'merchant_id', merchant_ids.to_numpy())
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'merchants': len(self._series),
+            'days': int(sum(s.length for s in self._series.values())),
+            'bytes': int(sum(s.cum.nbytes for s in self._series.values()))
+        }
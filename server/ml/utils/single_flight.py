@@ -0,0 +1,109 @@
+"""
+Single-Flight Request Coalescing
+Concurrent identical predictions share one in-flight computation
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from utils.frame_cache import FrameCache
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests per endpoint
+    
+    The first request for a key (the leader) starts the computation in the
+    threadpool as its own task; identical requests arriving while it runs
+    (followers) await that task instead of recomputing. Callers wait through
+    asyncio.shield, so a disconnecting caller never cancels the shared work.
+    If the computation fails, every waiter receives the same exception and
+    the key is released, so the next request starts a fresh attempt.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+    
+    @staticmethod
+    def request_key(payload: Any) -> str:
+        """
+        Hash of a request payload
+        
+        Pydantic requests hash their model_dump_json (serialized in Rust, in
+        field order); other JSON-like payloads hash canonically. Blocking for
+        large requests, so call it from the threadpool.
+        """
+        if isinstance(payload, BaseModel):
+            return hashlib.blake2b(payload.model_dump_json().encode('utf-8'), digest_size=16).hexdigest()
+        return FrameCache.fingerprint(payload)
+    
+    def _count(self, endpoint: str, field: str):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {'requests': 0, 'executions': 0, 'coalesced': 0, 'failures': 0})
+            stats[field] += 1
+    
+    async def do(self, endpoint: str, payload: Any, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) in the threadpool, or join an identical in-flight run
+        
+        Args:
+            endpoint: Coalescing namespace (one per API endpoint)
+            payload: JSON-like request identity; include model versions so a
+                     hot-swapped model never serves a result computed by the old one
+            fn: Blocking function computing the result
+        
+        Returns:
+            fn's result, shared by all coalesced callers
+        """
+        return await self.run(endpoint, payload, lambda: run_in_threadpool(fn, *args, **kwargs))
+    
+    async def run(self, endpoint: str, payload: Any, start: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Like do(), but the leader awaits start() instead of a blocking function,
+        e.g. to pass the computation through admission control first
+        """
+        
+        key = (endpoint, self.request_key(payload))
+        self._count(endpoint, 'requests')
+        
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count(endpoint, 'coalesced')
+        else:
+            self._count(endpoint, 'executions')
+            task = asyncio.create_task(start())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+        
+        return await asyncio.shield(task)
+    
+    def _release(self, key: Tuple[str, str], task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self._count(key[0], 'failures')
+    
+    def stats(self) -> Dict[str, Any]:
+        """Per-endpoint request counts and coalescing ratio (share of requests served by another's run)"""
+        
+        with self._lock:
+            endpoints = {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+        
+        for stats in endpoints.values():
+            stats['coalescing_ratio'] = stats['coalesced'] / stats['requests'] if stats['requests'] else 0.0
+        
+        return {
+            'in_flight': len(self._inflight),
+            'endpoints': endpoints
+        }
+
+single_flight = SingleFlight()
@@ -0,0 +1,204 @@
+"""
+Latency-Budgeted Tier Selection
+Chooses between the model and rule-based engines per request, with a p95 circuit breaker
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+TIERS = ('model', 'rule_based', 'fallback')
+
+class LatencyWindow:
+    """Rolling window of the most recent latencies (seconds), dropping samples older than max_age"""
+    
+    def __init__(self, size: int, max_age: Optional[float] = None):
+        self.samples = deque(maxlen=size)
+        self.max_age = max_age
+    
+    def add(self, seconds: float):
+        self.samples.append((time.monotonic(), seconds))
+    
+    def clear(self):
+        self.samples.clear()
+    
+    def _expire(self):
+        if self.max_age is None:
+            return
+        cutoff = time.monotonic() - self.max_age
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+    
+    def percentile(self, q: float) -> Optional[float]:
+        self._expire()
+        if not self.samples:
+            return None
+        return float(np.percentile([seconds for _, seconds in self.samples], q))
+    
+    def __len__(self) -> int:
+        self._expire()
+        return len(self.samples)
+
+class CircuitBreaker:
+    """
+    Trips when the model tier's rolling p95 latency exceeds a threshold
+    
+    closed -> open when p95 over at least min_samples exceeds threshold; open
+    serves everything from the rule-based tier for cooldown seconds, then
+    half_open lets a single probe request try the model. A fast probe closes
+    the breaker with a fresh window, a slow one reopens it; a probe that never
+    reports back (shed or failed) is replaced after another cooldown.
+    """
+    
+    def __init__(self, threshold: float, cooldown: float, window: int, min_samples: int,
+                 max_age: Optional[float] = None):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.latencies = LatencyWindow(window, max_age)
+        self.state = 'closed'
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self._probe_started: Optional[float] = None
+    
+    def allow_model(self) -> bool:
+        """Whether the next request may use the model; claims the probe when half-open"""
+        
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = 'half_open'
+        
+        if self.state == 'closed':
+            return True
+        if self.state == 'half_open':
+            now = time.monotonic()
+            if self._probe_started is None or now - self._probe_started >= self.cooldown:
+                self._probe_started = now
+                return True
+        return False
+    
+    def record(self, seconds: float):
+        """Record one model-tier latency"""
+        
+        if self.state == 'half_open' and self._probe_started is not None:
+            self._probe_started = None
+            if seconds <= self.threshold:
+                self.state = 'closed'
+                self.latencies.clear()
+                logger.info("Model tier recovered, circuit breaker closed")
+            else:
+                self._open()
+            return
+        
+        self.latencies.add(seconds)
+        if self.state == 'closed' and len(self.latencies) >= self.min_samples:
+            p95 = self.latencies.percentile(95)
+            if p95 > self.threshold:
+                self._open()
+                logger.warning(f"Model tier p95 {p95 * 1000:.0f} ms exceeds "
+                               f"{self.threshold * 1000:.0f} ms, circuit breaker opened")
+    
+    def _open(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self._probe_started = None
+        self.trips += 1
+
+class _EndpointTiers:
+    def __init__(self, breaker: CircuitBreaker, window: int, max_age: Optional[float]):
+        self.breaker = breaker
+        self.rule_latencies = LatencyWindow(window, max_age)
+        self.served = dict.fromkeys(TIERS, 0)
+        self.probed_at: Optional[float] = None
+
+class TierSelector:
+    """
+    Picks the engine for each request from its remaining latency budget
+    
+    The model tier is used when its observed p95 fits the budget and the
+    circuit breaker is closed; otherwise the rule-based tier answers. Requests
+    with generous budgets (batch jobs) get the full model, tight ones
+    (interactive widgets) get rule-based answers in microseconds. While the
+    p95 is over budget, one request per cooldown (or the breaker's half-open
+    probe) still tries the model, and samples expire after max_age, so a past
+    slow spell does not pin the endpoint to the rule-based tier.
+    """
+    
+    def __init__(self, breaker_p95_ms: Optional[float] = None, cooldown_seconds: Optional[float] = None,
+                 window: Optional[int] = None, min_samples: Optional[int] = None,
+                 max_age_seconds: Optional[float] = None):
+        config = Settings.get_tiering_config()
+        self.breaker_threshold = (breaker_p95_ms or config['breaker_p95_ms']) / 1000
+        self.cooldown = cooldown_seconds or config['breaker_cooldown'].total_seconds()
+        self.window = window or config['latency_window']
+        self.min_samples = min_samples or config['min_samples']
+        self.max_age = max_age_seconds or config['latency_max_age'].total_seconds()
+        self._endpoints: Dict[str, _EndpointTiers] = {}
+    
+    def _state(self, endpoint: str) -> _EndpointTiers:
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            breaker = CircuitBreaker(self.breaker_threshold, self.cooldown, self.window,
+                                     self.min_samples, self.max_age)
+            state = self._endpoints[endpoint] = _EndpointTiers(breaker, self.window, self.max_age)
+        return state
+    
+    def select(self, endpoint: str, budget: float) -> str:
+        """
+        Choose 'model' or 'rule_based' for a request
+        
+        Args:
+            endpoint: API endpoint the request is for
+            budget: Seconds left until the request's deadline
+        """
+        
+        state = self._state(endpoint)
+        breaker = state.breaker
+        model_p95 = breaker.latencies.percentile(95)
+        if model_p95 is not None and model_p95 > budget:
+            if breaker.state != 'closed':
+                return 'model' if breaker.allow_model() else 'rule_based'
+            now = time.monotonic()
+            if state.probed_at is not None and now - state.probed_at < self.cooldown:
+                return 'rule_based'
+            state.probed_at = now
+        return 'model' if breaker.allow_model() else 'rule_based'
+    
+    def record(self, endpoint: str, tier: str, seconds: float):
+        """Record the latency of an engine run (queue wait excluded)"""
+        
+        state = self._state(endpoint)
+        if tier == 'model':
+            state.breaker.record(seconds)
+        else:
+            state.rule_latencies.add(seconds)
+    
+    def served(self, endpoint: str, tier: Optional[str]):
+        """Count the tier that actually produced a response"""
+        if tier in TIERS:
+            self._state(endpoint).served[tier] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Per-endpoint served tiers, tier latencies and breaker state"""
+        
+        def ms(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 2) if seconds is not None else None
+        
+        return {
+            endpoint: {
+                'served': dict(state.served),
+                'model_p95_ms': ms(state.breaker.latencies.percentile(95)),
+                'rule_based_p95_ms': ms(state.rule_latencies.percentile(95)),
+                'breaker': state.breaker.state,
+                'breaker_trips': state.breaker.trips
+            }
+            for endpoint, state in self._endpoints.items()
+        }
+
+tier_selector = TierSelector()
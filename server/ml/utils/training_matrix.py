@@ -0,0 +1,226 @@
+"""
+Out-of-Core Training Matrices
+Streams extracted features into disk-backed float32 memmaps and scales them in chunks
+"""
+
+import functools
+import logging
+import resource
+import sys
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from settings import Settings
+
+logger = logging.getLogger(__name__)
+
+class FeatureMatrix:
+    """
+    Append-only float32 feature matrix backed by an anonymous temporary file
+    
+    Rows are written straight into the memmap as samples are extracted, so the
+    training set never exists as a list of arrays or as a float64 copy. The
+    backing file is unlinked on creation and disappears with the last mapping.
+    """
+    
+    def __init__(self, capacity: int = 1024, scratch_dir: Optional[str] = None):
+        self.capacity = max(1, capacity)
+        self.scratch_dir = scratch_dir or Settings.TRAINING_SCRATCH_PATH or None
+        self.n_features: Optional[int] = None
+        self.n_rows = 0
+        self._file = None
+        self._X: Optional[np.memmap] = None
+        self._targets = []
+    
+    def _map(self, rows: int):
+        if self._X is not None:
+            self._X.flush()
+        self._file.truncate(rows * self.n_features * np.dtype(np.float32).itemsize)
+        self._X = np.memmap(self._file, dtype=np.float32, mode='r+', shape=(rows, self.n_features))
+        self.capacity = rows
+    
+    def append(self, features: np.ndarray, targets: Sequence[float]):
+        """Write one sample's features and targets"""
+        
+        features = np.asarray(features, dtype=np.float32).ravel()
+        
+        if self._file is None:
+            self.n_features = len(features)
+            self._file = tempfile.TemporaryFile(dir=self.scratch_dir)
+            self._map(self.capacity)
+        elif len(features) != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {len(features)}")
+        
+        if self.n_rows == self.capacity:
+            self._map(self.capacity * 2)
+        
+        self._X[self.n_rows] = features
+        self._targets.append(targets)
+        self.n_rows += 1
+    
+    def finalize(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            (X, Y): float32 memmap view of the written rows and an (n, k) float64 target array
+        """
+        
+        if self._X is None:
+            return np.empty((0, 0), dtype=np.float32), np.empty((0, 0))
+        
+        self._X.flush()
+        return self._X[:self.n_rows], np.asarray(self._targets, dtype=np.float64).reshape(self.n_rows, -1)
+
+def build_feature_matrix(training_data: Iterable[Dict[str, Any]],
+                         extract: Callable[[Dict[str, Any]], Tuple[np.ndarray, Sequence[float]]]
+                         ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Extract features sample by sample into a FeatureMatrix
+    
+    Args:
+        training_data: Training samples (any iterable; a sized one pre-allocates)
+        extract: Maps a sample to (features, targets); samples that raise are skipped
+    
+    Returns:
+        (X, Y) as returned by FeatureMatrix.finalize()
+    """
+    
+    capacity = len(training_data) if hasattr(training_data, '__len__') else 1024
+    matrix = FeatureMatrix(capacity=capacity)
+    
+    for item in training_data:
+        try:
+            features, targets = extract(item)
+            matrix.append(features, targets)
+        except Exception as e:
+            logger.warning(f"Skipping training sample: {e}")
+            continue
+    
+    return matrix.finalize()
+
+def scale_in_place(scaler: StandardScaler, X: np.ndarray, fit: bool = True,
+                   chunk_rows: Optional[int] = None) -> np.ndarray:
+    """
+    Fit the scaler with partial_fit and standardize X chunk by chunk, in place
+    
+    Args:
+        scaler: Scaler to fit (when fit=True) and apply
+        X: Feature matrix, typically a FeatureMatrix memmap
+        fit: Fit the scaler first; False reuses its current statistics
+        chunk_rows: Rows per chunk (default: Settings.TRAINING_CHUNK_ROWS)
+    
+    Returns:
+        X, now holding scaled values
+    """
+    
+    chunk_rows = chunk_rows or Settings.TRAINING_CHUNK_ROWS
+    
+    if fit:
+        for start in range(0, len(X), chunk_rows):
+            scaler.partial_fit(X[start:start + chunk_rows])
+    
+    for start in range(0, len(X), chunk_rows):
+        X[start:start + chunk_rows] = scaler.transform(X[start:start + chunk_rows])
+    
+    if isinstance(X, np.memmap):
+        X.flush()
+    return X
+
+def _anonymous_rss() -> Optional[int]:
+    """Resident anonymous (heap) memory in bytes; file-backed memmap pages are excluded"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+class PeakMemorySampler:
+    """
+    Samples anonymous RSS on a background thread and keeps the high-water mark
+    
+    Sampling costs nothing on the training thread, unlike tracemalloc, which
+    slows the Python-heavy feature extraction several times over.
+    """
+    
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.baseline = _anonymous_rss()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+    
+    def _sample(self):
+        current = _anonymous_rss()
+        if current is not None and (self.peak is None or current > self.peak):
+            self.peak = current
+    
+    def __enter__(self) -> 'PeakMemorySampler':
+        if self.baseline is not None:
+            self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        if self.baseline is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+    
+    def report(self) -> Dict[str, float]:
+        """Peak heap size and its growth over the baseline, in MB"""
+        if self.baseline is None:
+            # No /proc (non-Linux): fall back to the process-lifetime high-water mark
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = peak if sys.platform == 'darwin' else peak * 1024
+            return {'peak_memory_mb': round(peak / (1024 * 1024), 1)}
+        
+        return {
+            'peak_memory_mb': round(self.peak / (1024 * 1024), 1),
+            'training_memory_mb': round((self.peak - self.baseline) / (1024 * 1024), 1)
+        }
+
+_sampling = threading.local()
+
+def reports_peak_memory(train: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+    """
+    Decorator adding peak memory (MB) to a training method's result
+    
+    Memory-mapped feature pages are not counted: they are backed by the scratch
+    file, not by the heap. Runs whose growth exceeds Settings.TRAINING_MEMORY_BUDGET_MB
+    are flagged.
+    """
+    
+    @functools.wraps(train)
+    def wrapper(*args, **kwargs):
+        # Nested calls (update_model falling back to train_model) report via the outer call
+        if getattr(_sampling, 'active', False):
+            return train(*args, **kwargs)
+        
+        _sampling.active = True
+        try:
+            with PeakMemorySampler() as sampler:
+                result = train(*args, **kwargs)
+        finally:
+            _sampling.active = False
+        
+        if isinstance(result, dict) and 'error' not in result:
+            memory = sampler.report()
+            result.update(memory)
+            used_mb = memory.get('training_memory_mb', memory['peak_memory_mb'])
+            if used_mb > Settings.TRAINING_MEMORY_BUDGET_MB:
+                result['memory_budget_exceeded'] = True
+                logger.warning(f"{train.__qualname__} used {used_mb:.0f} MB, "
+                               f"above the {Settings.TRAINING_MEMORY_BUDGET_MB} MB training budget")
+        
+        return result
+    
+    return wrapper